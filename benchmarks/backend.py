@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare the podman CLI backend with the REST API backend
+
+Needs podman and a listening API socket (systemctl --user start podman.socket):
+
+    python benchmarks/backend.py --image docker.io/library/alpine -n 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from undockit.backend import PodmanApiBackend, PodmanBackend, get_connection, get_socket_path
+
+
+def timed(fn, *args) -> float:
+    """Run fn and return how long it took in milliseconds"""
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(backend, dockerfile: Path, runs: int) -> dict[str, list[float]]:
+    """Time each backend operation over a number of runs"""
+    image_id = backend.build(dockerfile, quiet=True)
+    name = f"{backend.name(image_id)}-bench"
+    backend.start(name, image_id, timeout=60)
+
+    # Let the startup script write its exec script
+    while not Path(f"/tmp/undockit/{name}/exec").exists():
+        time.sleep(0.05)
+
+    results = {"build": [], "image_exists": [], "inspect": [], "is_running": [], "exec": []}
+    try:
+        for _ in range(runs):
+            results["build"].append(timed(backend.build, dockerfile, True))
+            results["image_exists"].append(timed(backend.image_exists, image_id))
+            results["inspect"].append(timed(backend.inspect, image_id))
+            results["is_running"].append(timed(backend.is_running, name))
+            results["exec"].append(timed(backend.exec, name, ["true"]))
+    finally:
+        backend.stop(name)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="docker.io/library/alpine", help="Base image to benchmark with")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Runs per operation")
+    args = parser.parse_args()
+
+    connection = get_connection(get_socket_path(os.environ, os.getuid()))
+    if not connection.is_reachable():
+        print(f"Podman API socket not reachable at {connection.socket_path}", file=sys.stderr)
+        return 1
+
+    # exec passes our stdin through, so don't let it wait on a terminal
+    sys.stdin = open(os.devnull)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dockerfile = Path(tmpdir) / "Dockerfile"
+        dockerfile.write_text(f"FROM {args.image}\n")
+
+        cli = bench(PodmanBackend(), dockerfile, args.runs)
+        api = bench(PodmanApiBackend(connection), dockerfile, args.runs)
+
+    print(f"{'operation':<14}{'cli p50 ms':>12}{'api p50 ms':>12}{'speedup':>10}")
+    for operation in cli:
+        cli_ms = statistics.median(cli[operation])
+        api_ms = statistics.median(api[operation])
+        print(f"{operation:<14}{cli_ms:>12.1f}{api_ms:>12.1f}{cli_ms / api_ms:>9.1f}x")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
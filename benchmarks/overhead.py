@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Measure undockit's own overhead on the run path, against a fake podman
+
+Each scenario runs `python -m undockit` the way a tool's shebang does, with
+tests/fake_podman.py on PATH so that podman's latency is fixed and every
+podman call can be counted. Results are compared with baseline.json, and any
+scenario that makes more podman calls or got much slower fails the run:
+
+    python benchmarks/overhead.py                  # compare with the baseline
+    python benchmarks/overhead.py --save-baseline  # accept the current numbers
+    python benchmarks/overhead.py --daemon         # the same, through undockitd
+
+Scenarios:
+    cold: first run of a new dockerfile - build, start and exec
+    warm: a run with the container already up
+    storm: many runs of a new dockerfile starting at once
+    batch: xargs over many inputs, timed per input
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_PODMAN = ROOT / "tests" / "fake_podman.py"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Roughly what a local podman takes for each, on top of its own startup
+DEFAULT_LATENCY = "build=0.2,run=0.1,exec=0.01"
+
+# How much slower than the baseline counts as a regression, and a floor for
+# scenarios so fast that noise is most of the difference
+TOLERANCE = 0.5
+SLACK_MS = 20.0
+
+# Racing runs don't make exactly the same calls every time, but one more
+# call per run is always more than this
+CALLS_TOLERANCE = 0.1
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples_ms: list[float], podman_calls: int, runs: int) -> dict:
+    """Latency percentiles and podman calls per run for a scenario"""
+    return {
+        "runs": runs,
+        "p50": round(percentile(samples_ms, 50), 1),
+        "p95": round(percentile(samples_ms, 95), 1),
+        "p99": round(percentile(samples_ms, 99), 1),
+        "calls_per_run": round(podman_calls / runs, 2),
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float = TOLERANCE, slack_ms: float = SLACK_MS) -> list[str]:
+    """Describe every way the results are worse than the baseline"""
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["calls_per_run"] > before["calls_per_run"] * (1 + CALLS_TOLERANCE):
+            found.append(f"{name}: {result['calls_per_run']} podman calls per run, was {before['calls_per_run']}")
+        for stat in ("p50", "p95"):
+            limit = max(before[stat] * (1 + tolerance), before[stat] + slack_ms)
+            if result[stat] > limit:
+                found.append(f"{name}: {stat} {result[stat]}ms, was {before[stat]}ms")
+    return found
+
+
+def format_table(results: dict) -> str:
+    lines = [f"{'scenario':<16}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'podman/run':>12}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<16}{result['runs']:>6}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}"
+            f"{result['calls_per_run']:>12.2f}"
+        )
+    return "\n".join(lines)
+
+
+# --- System Interface Functions ---
+
+
+class Bench:
+    """A sandbox with the fake podman on PATH and undockit's state in a temp dir"""
+
+    def __init__(self, root: Path, latency: str, daemon: bool):
+        self.root = root
+        self.state_dir = root / "podman"
+        (self.state_dir / "containers").mkdir(parents=True)
+        bin_dir = root / "bin"
+        bin_dir.mkdir()
+        podman = bin_dir / "podman"
+        podman.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PODMAN}" "$@"\n')
+        podman.chmod(0o755)
+
+        self.env = dict(
+            os.environ,
+            PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+            FAKE_PODMAN_DIR=str(self.state_dir),
+            FAKE_PODMAN_LATENCY=latency,
+            UNDOCKIT_BACKEND="cli",
+            UNDOCKIT_NO_EXEC_SERVER="1",
+            XDG_CACHE_HOME=str(root / "cache"),
+            XDG_DATA_HOME=str(root / "data"),
+            XDG_RUNTIME_DIR=str(root / "run"),
+            PYTHONPATH=str(ROOT / "src"),
+        )
+        for name in ("UNDOCKIT_TRACE", "UNDOCKIT_DAEMON"):
+            self.env.pop(name, None)
+        self.daemon = None
+        if daemon:
+            self.daemon = subprocess.Popen(
+                [sys.executable, "-m", "undockit", "daemon", "--idle-timeout=0"], env=self.env, start_new_session=True
+            )
+            socket_path = root / "run" / "undockit" / "daemon.sock"
+            while not socket_path.exists():
+                time.sleep(0.01)
+
+    def dockerfile(self) -> Path:
+        """A dockerfile no run has seen before"""
+        path = self.root / f"tool-{uuid.uuid4().hex[:8]}"
+        path.write_text(f'FROM scratch\nLABEL bench="{path.name}"\nENTRYPOINT ["true"]\n')
+        return path
+
+    def podman_calls(self) -> int:
+        """Podman calls so far, not counting the daemon's event stream"""
+        try:
+            calls = [json.loads(line) for line in (self.state_dir / "calls.log").read_text().splitlines()]
+        except FileNotFoundError:
+            return 0
+        return sum(1 for call in calls if call[0] != "events")
+
+    def undockit(self, *args: str, input: bytes | None = None) -> float:
+        """Run undockit, returning how long it took in milliseconds"""
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-m", "undockit", *args], env=self.env, input=input, capture_output=True, check=False
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"undockit {' '.join(args)} failed: {result.stderr.decode(errors='replace')}")
+        return elapsed
+
+    def close(self) -> None:
+        if self.daemon:
+            os.killpg(self.daemon.pid, signal.SIGTERM)
+            self.daemon.wait()
+        for path in (self.state_dir / "containers").glob("*.json"):
+            try:
+                os.killpg(json.loads(path.read_text())["pid"], signal.SIGTERM)
+            except (OSError, ValueError, KeyError):
+                pass
+            shutil.rmtree(Path("/tmp/undockit") / path.stem, ignore_errors=True)
+
+
+def measure(bench: Bench, scenario, runs: int) -> dict:
+    """Run a scenario, counting the podman calls made by what it measures"""
+    samples, calls = scenario(bench, runs)
+    return summarize(samples, calls, len(samples))
+
+
+def cold(bench: Bench, runs: int) -> tuple[list[float], int]:
+    before = bench.podman_calls()
+    samples = [bench.undockit("run", str(bench.dockerfile())) for _ in range(runs)]
+    return samples, bench.podman_calls() - before
+
+
+def warm(bench: Bench, runs: int) -> tuple[list[float], int]:
+    dockerfile = str(bench.dockerfile())
+    bench.undockit("run", dockerfile)
+    before = bench.podman_calls()
+    samples = [bench.undockit("run", dockerfile) for _ in range(runs)]
+    return samples, bench.podman_calls() - before
+
+
+def storm(bench: Bench, runs: int, width: int = 8) -> tuple[list[float], int]:
+    """Cold starts, width of them at once for each new dockerfile"""
+    before = bench.podman_calls()
+    samples = []
+    for _ in range(-(-runs // width)):
+        dockerfile = str(bench.dockerfile())
+        with ThreadPoolExecutor(max_workers=width) as pool:
+            samples += pool.map(lambda _: bench.undockit("run", dockerfile), range(width))
+    return samples, bench.podman_calls() - before
+
+
+def batch(bench: Bench, runs: int, items: int = 50) -> tuple[list[float], int]:
+    """Milliseconds per input, with podman calls counted per input too"""
+    dockerfile = str(bench.dockerfile())
+    bench.undockit("run", dockerfile)
+    inputs = "".join(f"{n}\n" for n in range(items)).encode()
+    before = bench.podman_calls()
+    batches = [bench.undockit("xargs", "-j", "8", dockerfile, input=inputs) for _ in range(runs)]
+    return [elapsed / items for elapsed in batches for _ in range(items)], bench.podman_calls() - before
+
+
+SCENARIOS = {"cold": cold, "warm": warm, "storm": storm, "batch": batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Runs per scenario")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="Fake podman latency per subcommand, in seconds")
+    parser.add_argument("--daemon", action="store_true", help="Run through undockitd")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Only run these scenarios")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="Baseline file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Save these results as the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="undockit-bench-") as tmpdir:
+        bench = Bench(Path(tmpdir), args.latency, args.daemon)
+        try:
+            for name in args.scenario or SCENARIOS:
+                key = f"{name}+daemon" if args.daemon else name
+                results[key] = measure(bench, SCENARIOS[name], args.runs)
+        finally:
+            bench.close()
+
+    print(format_table(results))
+
+    try:
+        baseline = json.loads(args.baseline.read_text())
+    except FileNotFoundError:
+        baseline = {}
+
+    # Baselines only make sense for the latency they were measured with
+    baseline_results = baseline.get(args.latency, {})
+    if args.save_baseline:
+        baseline[args.latency] = {**baseline_results, **results}
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not baseline_results:
+        print(f"No baseline for latency {args.latency}, use --save-baseline to make one", file=sys.stderr)
+
+    found = regressions(results, baseline_results)
+    for regression in found:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
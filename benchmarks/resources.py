@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure what a resource profile does for a pool of replicas running at once
+
+Starts the same pool twice, once with no profile and once with --cpus and
+--cpuset=auto, and runs a cache-hungry workload in every replica at the same
+time. Needs podman and an image with python3:
+
+    python benchmarks/resources.py -j 4 -n 10 --cpus 2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from undockit.backend import PodmanBackend
+from undockit.pool import replica_name
+from undockit.resources import make_labels, numa_nodes
+
+# Walks a buffer a few times bigger than a core's L2, so neighbours sharing
+# cores keep evicting each other
+WORKLOAD = """
+import array
+data = array.array("q", range({size} // 8))
+total = 0
+for _ in range({passes}):
+    total += sum(data[::8])
+"""
+
+
+def timed(fn, *args) -> float:
+    """Run fn and return how long it took in milliseconds"""
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(backend, dockerfile: Path, replicas: int, runs: int, workload: str) -> dict:
+    """Run the workload in every replica at once, returning throughput and latencies"""
+    image_id = backend.get_image(dockerfile)
+    names = [replica_name(backend.name(image_id), index) for index in range(replicas)]
+    for name in names:
+        backend.start(name, image_id, timeout=120)
+    for name in names:
+        backend.wait_ready(name)
+
+    def one(name: str) -> list[float]:
+        return [timed(backend.clone().exec, name, ["python3", "-c", workload]) for _ in range(runs)]
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=replicas) as pool:
+            latencies = [ms for result in pool.map(one, names) for ms in result]
+        elapsed = time.perf_counter() - start
+    finally:
+        for name in names:
+            backend.stop(name)
+
+    return {"throughput": len(latencies) / elapsed, "p50": statistics.median(latencies), "max": max(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default="docker.io/library/python:3-alpine", help="Image with python3")
+    parser.add_argument("-j", "--replicas", type=int, default=4, help="Replicas running at once")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per replica")
+    parser.add_argument("--cpus", default="1", help="CPUs per replica in the profiled pool")
+    parser.add_argument("--size", type=int, default=8 * 1024 * 1024, help="Workload buffer size in bytes")
+    parser.add_argument("--passes", type=int, default=20, help="Passes over the buffer per run")
+    args = parser.parse_args()
+
+    # exec passes our stdin through, so don't let it wait on a terminal
+    sys.stdin = open(os.devnull)
+
+    nodes = numa_nodes()
+    print(f"{len(nodes)} NUMA node(s), {sum(len(cpus) for _, cpus in nodes)} CPUs")
+
+    profile = make_labels({"cpus": args.cpus, "cpuset": "auto"})
+    workload = WORKLOAD.format(size=args.size, passes=args.passes)
+    backend = PodmanBackend()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for label, labels in (("none", {}), (f"cpus={args.cpus},auto", profile)):
+            dockerfile = Path(tmpdir) / "Dockerfile"
+            lines = [f"FROM {args.image}"] + [f'LABEL {key}="{value}"' for key, value in labels.items()]
+            dockerfile.write_text("\n".join(lines) + "\n")
+            results[label] = bench(backend, dockerfile, args.replicas, args.runs, workload)
+
+    print(f"{'profile':<20}{'runs/s':>10}{'p50 ms':>10}{'max ms':>10}")
+    for label, result in results.items():
+        print(f"{label:<20}{result['throughput']:>10.2f}{result['p50']:>10.1f}{result['max']:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,3 @@
-from importlib.metadata import version, PackageNotFoundError
-
-try:
-    __version__ = version("undockit")
-except PackageNotFoundError:
-    __version__ = "unknown"
+# Kept in step with pyproject.toml (checked by the tests), so that getting the
+# version doesn't cost an importlib.metadata lookup on every run
+__version__ = "0.0.6"
@@ -3,20 +3,49 @@ Argument parsing for undockit CLI
 """
 
 import argparse
+import os
 from pathlib import Path
 
 from . import __version__
 
 
+def add_host_path_arguments(parser):
+    """Add the options for translating host paths in a tool's arguments"""
+    parser.add_argument(
+        "--host-paths", action="store_true", help="Rewrite absolute paths in arguments to where the container sees them"
+    )
+    parser.add_argument(
+        "--path-option",
+        action="append",
+        default=[],
+        metavar="KEY",
+        help="Also rewrite the paths in KEY=value arguments (repeatable)",
+    )
+
+
+def add_resource_arguments(parser):
+    """Add the options for a tool's resource profile"""
+    parser.add_argument("--cpus", help="CPUs each of the tool's containers may use, like 4 or 1.5")
+    parser.add_argument("--cpuset", help="CPUs to pin to, like 0-3,8, or auto to spread replicas across NUMA nodes")
+    parser.add_argument("--memory", help="Memory limit for each container, like 8G")
+    parser.add_argument("--shm-size", help="Size of /dev/shm in each container, like 2G")
+
+
 def add_install_parser(subparsers):
     """Add the install subcommand parser"""
     install = subparsers.add_parser("install", help="Install a Docker image as a CLI tool")
-    install.add_argument("image", help="Image name (repo/name:tag)")
+    install.add_argument("image", nargs="?", help="Image name (repo/name:tag)")
+    install.add_argument("-f", "--file", type=Path, help="Install every tool in a toolset.toml manifest")
     install.add_argument("--name", help="Custom tool name (default: derived from image)")
     install.add_argument("--to", choices=["env", "user", "sys"], default="user", help="Installation target")
     install.add_argument("--prefix", type=Path, help="Override installation prefix")
     install.add_argument("--timeout", type=int, default=600, help="Container timeout in seconds")
+    install.add_argument("--replicas", type=int, default=1, help="Number of warm containers to keep for the tool")
+    add_host_path_arguments(install)
+    add_resource_arguments(install)
     install.add_argument("--no-undockit", action="store_true", help="Skip deploying undockit binary to target")
+    install.add_argument("-j", "--jobs", type=int, default=4, help="Image downloads at a time, with --file")
+    install.add_argument("--update", action="store_true", help="Resolve tags again instead of using the lockfile")
     return install
 
 
@@ -31,11 +60,115 @@ def add_run_parser(subparsers):
     """Add the run subcommand parser"""
     run = subparsers.add_parser("run", help="Run a command in a Docker container")
     run.add_argument("--timeout", type=int, default=600, help="Container timeout in seconds")
+    run.add_argument("--rebuild", action="store_true", help="Ignore the build cache and rebuild the image")
+    run.add_argument("--replicas", type=int, default=1, help="Number of warm containers to spread runs across")
+    add_host_path_arguments(run)
     run.add_argument("dockerfile", type=Path, help="Path to Dockerfile to run")
     run.add_argument("args", nargs=argparse.REMAINDER, help="Arguments to pass to the image's default command")
     return run
 
 
+def add_xargs_parser(subparsers):
+    """Add the xargs subcommand parser"""
+    xargs = subparsers.add_parser("xargs", help="Run a Dockerfile's command once for each line of input")
+    xargs.add_argument("--timeout", type=int, default=600, help="Container timeout in seconds")
+    xargs.add_argument("--rebuild", action="store_true", help="Ignore the build cache and rebuild the image")
+    xargs.add_argument("--replicas", type=int, default=1, help="Number of warm containers to spread runs across")
+    xargs.add_argument("-0", "--null", action="store_true", help="Inputs are separated by NUL, not newlines")
+    xargs.add_argument("-a", "--arg-file", help="Read inputs from a file instead of stdin")
+    xargs.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Runs at a time")
+    xargs.add_argument("-k", "--keep-order", action="store_true", help="Write outputs in input order")
+    xargs.add_argument("--fail-fast", action="store_true", help="Start no more runs once one has failed")
+    xargs.add_argument("--joblog", type=Path, help="Write each run's exit code and time to a file")
+    add_host_path_arguments(xargs)
+    xargs.add_argument("dockerfile", type=Path, help="Path to Dockerfile to run")
+    xargs.add_argument(
+        "args", nargs=argparse.REMAINDER, help="Arguments to pass before each input, or with {} replaced by it"
+    )
+    return xargs
+
+
+def add_pipe_parser(subparsers):
+    """Add the pipe subcommand parser"""
+    pipe = subparsers.add_parser("pipe", help="Run a pipeline of tools from a spec, overlapping their startup")
+    pipe.add_argument("spec", type=Path, help="Pipeline spec, a TOML file of stages")
+    pipe.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the stages, as {1}, {2}...")
+    return pipe
+
+
+def add_warm_parser(subparsers):
+    """Add the warm subcommand parser"""
+    warm = subparsers.add_parser("warm", help="Build and start installed tools' containers ahead of use")
+    warm.add_argument("tools", nargs="*", help="Tool names or paths (default: every tool in the install target)")
+    warm.add_argument("--to", choices=["env", "user", "sys"], default="user", help="Install target to look in")
+    warm.add_argument("--prefix", type=Path, help="Override installation prefix")
+    warm.add_argument("-j", "--jobs", type=int, default=4, help="Tools to build or start at a time")
+    warm.add_argument("--keep", type=int, help="Idle timeout in seconds, instead of each tool's own")
+    return warm
+
+
+def add_status_parser(subparsers):
+    """Add the status subcommand parser"""
+    status = subparsers.add_parser("status", help="Show warm containers, their load and resource use")
+    status.add_argument("--json", action="store_true", help="Output JSON, for monitoring")
+    status.add_argument("-w", "--watch", type=float, metavar="SECONDS", help="Refresh every so many seconds")
+    return status
+
+
+def add_history_parser(subparsers):
+    """Add the history subcommand parser"""
+    history = subparsers.add_parser("history", help="Compare fixed and adaptive keep-warm timeouts from tools' runs")
+    history.add_argument("--json", action="store_true", help="Output JSON")
+    return history
+
+
+def add_stop_parser(subparsers):
+    """Add the stop subcommand parser"""
+    stop = subparsers.add_parser("stop", help="Stop tools' warm containers")
+    stop.add_argument("tools", nargs="*", help="Tool names or paths whose containers to stop")
+    stop.add_argument("--all", action="store_true", help="Stop every undockit container")
+    stop.add_argument("-j", "--jobs", type=int, default=32, help="Containers to stop at a time")
+    return stop
+
+
+def add_gc_parser(subparsers):
+    """Add the gc subcommand parser"""
+    gc = subparsers.add_parser("gc", help="Remove superseded images and abandoned containers")
+    gc.add_argument("--keep", type=int, default=0, help="Superseded images to keep per tool, newest first")
+    gc.add_argument("--max-size", help="Remove kept superseded images, oldest first, until images fit (e.g. 20G)")
+    gc.add_argument("-n", "--dry-run", action="store_true", help="Only show what would be removed")
+    return gc
+
+
+def add_models_parser(subparsers):
+    """Add the models subcommand parser, with its own subcommands"""
+    models = subparsers.add_parser("models", help="Store tools' model files once, however many tools use them")
+    commands = models.add_subparsers(dest="models_command", required=True)
+
+    ls = commands.add_parser("ls", help="List stored model files and the paths linked to them")
+    ls.add_argument("--verify", action="store_true", help="Hash every stored file to check it's intact")
+    ls.add_argument("--json", action="store_true", help="Output JSON")
+
+    gc = commands.add_parser("gc", help="Remove stored files no tool links to any more")
+    gc.add_argument("-n", "--dry-run", action="store_true", help="Only show what would be removed")
+
+    dedupe = commands.add_parser("dedupe", help="Link identical model files to one stored copy")
+    dedupe.add_argument("paths", nargs="*", type=Path, help="Directories to look in (default: the models dir)")
+    dedupe.add_argument("--min-size", default="1M", help="Smallest file to bother with (default: 1M)")
+    dedupe.add_argument("-n", "--dry-run", action="store_true", help="Only show how much would be saved")
+    return models
+
+
+def add_daemon_parser(subparsers):
+    """Add the daemon subcommand parser"""
+    daemon = subparsers.add_parser("daemon", help="Run undockitd, which keeps container state hot for tool runs")
+    daemon.add_argument(
+        "--idle-timeout", type=int, default=3600, help="Exit after this many idle seconds, 0 to never exit"
+    )
+    daemon.add_argument("--socket", type=Path, help="Socket to listen on (default: in XDG_RUNTIME_DIR)")
+    return daemon
+
+
 def get_parser():
     """Create the argument parser for undockit"""
     parser = argparse.ArgumentParser(
@@ -44,6 +177,7 @@ def get_parser():
     )
 
     parser.add_argument("--version", "-V", action="version", version=f"undockit {__version__}")
+    parser.add_argument("--trace", metavar="PATH", help="Record where time goes, as a Chrome trace or .jsonl file")
 
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
@@ -51,5 +185,14 @@ def get_parser():
     add_install_parser(subparsers)
     add_build_parser(subparsers)
     add_run_parser(subparsers)
+    add_xargs_parser(subparsers)
+    add_pipe_parser(subparsers)
+    add_warm_parser(subparsers)
+    add_status_parser(subparsers)
+    add_stop_parser(subparsers)
+    add_history_parser(subparsers)
+    add_models_parser(subparsers)
+    add_gc_parser(subparsers)
+    add_daemon_parser(subparsers)
 
     return parser
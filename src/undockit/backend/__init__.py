@@ -2,14 +2,30 @@
 Backend system for undockit - manages container runtimes
 """
 
-import shutil
+import os
 from .base import Backend
 from .podman import PodmanBackend
+from .api import PodmanApiBackend, get_connection, get_socket_path
 
 
 def get_backend() -> Backend:
-    """Auto-detect and return the best available backend"""
-    # Check for podman first (preferred)
+    """Auto-detect and return the best available backend
+
+    Set UNDOCKIT_BACKEND to "api" or "cli" to force a choice.
+    """
+    choice = os.environ.get("UNDOCKIT_BACKEND", "")
+
+    # The podman API socket avoids a podman process per operation
+    if choice in ("", "api"):
+        connection = get_connection(get_socket_path(os.environ, os.getuid()))
+        if connection.is_reachable():
+            return PodmanApiBackend(connection)
+        if choice == "api":
+            raise RuntimeError(f"Podman API socket not reachable at {connection.socket_path}")
+
+    # Fall back to running the podman CLI
+    import shutil
+
     if shutil.which("podman"):
         return PodmanBackend()
 
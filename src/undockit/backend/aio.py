@@ -0,0 +1,230 @@
+"""
+Asyncio backend - backend operations as coroutines, so independent ones overlap
+
+The sync Backend does one thing at a time, which is fine for a warm run that
+never asks podman anything, but on a cold start the check for a running
+container and the image inspect wait on podman one after the other, and
+stopping a few hundred containers needs a thread for each at once.
+AsyncPodmanBackend runs podman as asyncio subprocesses instead; other
+backends are wrapped by ThreadedBackend, which runs their sync calls in
+worker threads. map_bounded() runs an operation over many items with a cap
+on how many are in flight.
+
+Only the calls that are overlapped are here. Building and starting, with
+their locks, stay with the sync Backend, so a cold run uses this to look for
+its container while fetching the image's config, then starts it the usual
+way.
+"""
+
+import asyncio
+import json
+import sys
+from abc import ABC, abstractmethod
+
+from .. import cache, trace
+from . import state
+from .base import Backend, thread_backend
+from .podman import PodmanBackend, get_container_name, parse_image_config
+
+# Operations in flight at once in bulk commands
+DEFAULT_JOBS = 32
+
+
+class AsyncBackend(ABC):
+    """Container runtime operations as coroutines"""
+
+    @abstractmethod
+    async def inspect(self, image_id: str) -> dict:
+        """Fetch image config, with entrypoint, cmd, workdir, env and labels keys
+
+        Raises:
+            RuntimeError: If the image can't be inspected
+        """
+
+    @abstractmethod
+    async def stop(self, container_name: str) -> None:
+        """Stop and remove a container
+
+        Raises:
+            RuntimeError: If it can't be stopped
+        """
+
+    @abstractmethod
+    async def is_running(self, container_name: str) -> bool:
+        """Check if a container is currently running"""
+
+    @abstractmethod
+    def name(self, image_id: str) -> str:
+        """Get container name for an image ID"""
+
+    async def metadata(self, image_id: str) -> dict:
+        """Get image config, from the metadata cache if possible"""
+        cached = cache.read("metadata", image_id)
+        if cached:
+            try:
+                return json.loads(cached)
+            except ValueError:
+                pass  # Corrupt entry, fetch it again
+
+        metadata = await self.inspect(image_id)
+        cache.write("metadata", image_id, json.dumps(metadata))
+        return metadata
+
+    async def command(self, image_id: str) -> list[str]:
+        """Get the image's ENTRYPOINT + CMD"""
+        metadata = await self.metadata(image_id)
+        return list(metadata["entrypoint"]) + list(metadata["cmd"])
+
+
+async def podman(*args: str) -> tuple[int, str, str]:
+    """Run podman without blocking the event loop
+
+    Returns:
+        Its exit status, stdout and stderr
+    """
+    # Traced like subprocess.run, which this doesn't go through
+    with trace.span("subprocess", argv=trace.describe(["podman", *args])) as current:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "podman",
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            raise RuntimeError(f"Can't run podman: {e}")
+        stdout, stderr = await process.communicate()
+        current.set(returncode=process.returncode)
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+class AsyncPodmanBackend(AsyncBackend):
+    """AsyncBackend that runs the podman CLI as asyncio subprocesses"""
+
+    async def inspect(self, image_id: str) -> dict:
+        """Fetch image config with a single podman inspect"""
+        returncode, stdout, stderr = await podman("image", "inspect", image_id, "--format", "{{json .Config}}")
+        if returncode != 0:
+            raise RuntimeError(f"Inspect of {image_id} failed: {stderr.strip()}")
+        try:
+            return parse_image_config(json.loads(stdout.strip()))
+        except ValueError:
+            raise RuntimeError(f"Inspect of {image_id} was malformed")
+
+    async def stop(self, container_name: str) -> None:
+        """Stop and remove container"""
+        state.clear_state(container_name)
+        for action in ("stop", "rm"):
+            returncode, _, stderr = await podman(action, container_name)
+            if returncode != 0:
+                raise RuntimeError(f"podman {action} {container_name} failed: {stderr.strip()}")
+
+    async def is_running(self, container_name: str) -> bool:
+        """Check the state record, then podman ps"""
+        if state.is_known_running(container_name):
+            return True
+
+        returncode, stdout, _ = await podman("ps", "--filter", f"name={container_name}", "--format", "{{.Names}}")
+        return returncode == 0 and container_name in stdout.strip().split("\n")
+
+    def name(self, image_id: str) -> str:
+        return get_container_name(image_id)
+
+
+class ThreadedBackend(AsyncBackend):
+    """AsyncBackend over a sync Backend, running each call in a worker thread"""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        # Each thread gets a backend of its own, as connections can't be shared
+        self.thread_backend = thread_backend(backend)
+
+    def _call(self, method: str, *args):
+        return getattr(self.thread_backend(), method)(*args)
+
+    async def _run(self, method: str, *args):
+        return await asyncio.to_thread(self._call, method, *args)
+
+    async def inspect(self, image_id: str) -> dict:
+        return await self._run("inspect", image_id)
+
+    async def stop(self, container_name: str) -> None:
+        await self._run("stop", container_name)
+
+    async def is_running(self, container_name: str) -> bool:
+        return await self._run("is_running", container_name)
+
+    def name(self, image_id: str) -> str:
+        return self.backend.name(image_id)
+
+
+def from_sync(backend: Backend) -> AsyncBackend:
+    """Get the async equivalent of a sync backend"""
+    if type(backend) is PodmanBackend:
+        return AsyncPodmanBackend()
+    return ThreadedBackend(backend)
+
+
+async def map_bounded(fn, items: list, jobs: int = DEFAULT_JOBS) -> list:
+    """Await fn(item) for every item, with at most jobs in flight
+
+    Returns:
+        Results in the order of items, or the exception each one raised
+    """
+    semaphore = asyncio.Semaphore(max(1, jobs))
+
+    async def one(item):
+        async with semaphore:
+            return await fn(item)
+
+    return await asyncio.gather(*(one(item) for item in items), return_exceptions=True)
+
+
+async def probe(backend: AsyncBackend, container_name: str, image_id: str) -> bool:
+    """Check whether a container is running while fetching its image's config
+
+    Returns:
+        True if it's running
+    """
+    running, _ = await asyncio.gather(backend.is_running(container_name), backend.metadata(image_id))
+    return running
+
+
+def ensure_running(backend: Backend, container_name: str, image_id: str, timeout: int = 600) -> bool:
+    """Backend.ensure_running() for a cold start, with the first check and the inspect overlapped
+
+    Starting needs the image's config for its resource profile, and the run
+    needs it for its command, so it's fetched while podman is asked about the
+    container rather than after.
+
+    Returns:
+        True if this call started the container
+
+    Raises:
+        RuntimeError: If inspecting or starting fails
+    """
+    if asyncio.run(probe(from_sync(backend), container_name, image_id)):
+        return False
+    return backend.ensure_running(container_name, image_id, timeout, checked=True)
+
+
+def stop_containers(backend: Backend, names: list[str], jobs: int = DEFAULT_JOBS) -> dict[str, str | None]:
+    """Stop containers, jobs at a time
+
+    Returns:
+        Each container's error, or None if it stopped
+    """
+    results = asyncio.run(map_bounded(from_sync(backend).stop, names, jobs))
+    errors = {}
+    for name, result in zip(names, results):
+        if isinstance(result, RuntimeError):
+            errors[name] = str(result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            errors[name] = None
+    return errors
+
+
+trace.instrument(sys.modules[__name__], "ensure_running", "stop_containers")
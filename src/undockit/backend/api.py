@@ -0,0 +1,747 @@
+"""
+Podman REST API backend - talks to the libpod service over its unix socket
+"""
+
+import codecs
+import io
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+from collections.abc import Iterator
+
+from .. import resources, trace
+from . import exec_client, state
+from .base import Backend
+from .podman import (
+    container_labels,
+    get_container_name,
+    get_gpu_devices,
+    get_storage_root,
+    image_in_storage,
+    parse_container_list,
+    parse_event,
+    parse_image_config,
+    parse_image_list,
+    pinned_reference,
+    render_startup_script,
+)
+
+# Any podman 4+ service understands this API version
+API_PREFIX = "/v4.0.0/libpod"
+
+# Stream IDs used in multiplexed attach streams
+STDOUT = 1
+STDERR = 2
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def get_socket_path(env: dict[str, str], uid: int) -> Path:
+    """Return the path of the podman API socket for this user"""
+    if socket_path := env.get("UNDOCKIT_PODMAN_SOCKET"):
+        return Path(socket_path)
+
+    # Honour podman's own remote setting if it points at a unix socket
+    container_host = env.get("CONTAINER_HOST", "")
+    if container_host.startswith("unix://"):
+        return Path(container_host.removeprefix("unix://"))
+
+    if uid == 0:
+        return Path("/run/podman/podman.sock")
+
+    runtime_dir = env.get("XDG_RUNTIME_DIR") or f"/run/user/{uid}"
+    return Path(runtime_dir) / "podman" / "podman.sock"
+
+
+def api_path(endpoint: str, params: dict | list | None = None) -> str:
+    """Build a request path for a libpod endpoint, with params as a dict or list of pairs"""
+    path = API_PREFIX + endpoint
+    if params:
+        path += "?" + urllib.parse.urlencode(params)
+    return path
+
+
+def encode_request(method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None) -> bytes:
+    """Encode an HTTP/1.1 request"""
+    lines = [f"{method} {path} HTTP/1.1", "Host: podman", f"Content-Length: {len(body)}"]
+    for key, value in (headers or {}).items():
+        lines.append(f"{key}: {value}")
+
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def parse_head(head: bytes) -> tuple[int, dict[str, str]]:
+    """Parse an HTTP response status line and headers"""
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise RuntimeError(f"Malformed response from podman API: {lines[0]!r}")
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+    return int(parts[1]), headers
+
+
+def parse_json_stream(data: str) -> Iterator[dict]:
+    """Parse a stream of concatenated JSON objects, as returned by build"""
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        # Skip whitespace between objects
+        while pos < len(data) and data[pos].isspace():
+            pos += 1
+        if pos >= len(data):
+            return
+        message, pos = decoder.raw_decode(data, pos)
+        yield message
+
+
+def split_json_stream(data: str) -> tuple[list[dict], str]:
+    """Parse the complete JSON objects at the start of a stream
+
+    Returns:
+        The objects, and the rest of the data which is still incomplete
+    """
+    decoder = json.JSONDecoder()
+    messages = []
+    pos = 0
+    while True:
+        while pos < len(data) and data[pos].isspace():
+            pos += 1
+        try:
+            message, pos = decoder.raw_decode(data, pos)
+        except ValueError:
+            return messages, data[pos:]
+        messages.append(message)
+
+
+def image_id_from_build(messages: list[dict]) -> str:
+    """Find the built image ID in build output messages"""
+    for message in reversed(messages):
+        aux_id = (message.get("aux") or {}).get("ID")
+        if aux_id:
+            return aux_id.removeprefix("sha256:")
+
+    # Older services only report it as the last line of output
+    for message in reversed(messages):
+        line = (message.get("stream") or "").strip()
+        if line.startswith("Successfully built "):
+            return line.split()[-1]
+        if len(line) == 64 and all(c in "0123456789abcdef" for c in line):
+            return line
+
+    return ""
+
+
+def make_build_context(dockerfile: bytes) -> bytes:
+    """Make a tar build context containing only the dockerfile"""
+    import tarfile
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("Dockerfile")
+        info.size = len(dockerfile)
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(dockerfile))
+
+    return buffer.getvalue()
+
+
+def container_spec(
+    container_name: str, image_id: str, startup_script: str, devices: list[str], labels: dict | None = None
+) -> dict:
+    """Make the libpod create spec equivalent to PodmanBackend.start()'s flags"""
+    return {
+        "name": container_name,
+        "image": image_id,
+        "user": f"{os.getuid()}:{os.getgid()}",  # run as current user
+        "userns": {"nsmode": "keep-id"},
+        "mounts": [
+            # mount host filesystem
+            {"type": "bind", "source": "/", "destination": "/host", "options": ["rbind"]},
+            # mount host /tmp
+            {"type": "bind", "source": "/tmp", "destination": "/tmp", "options": ["rbind"]},
+            # exec server sockets
+            {
+                "type": "bind",
+                "source": str(exec_client.socket_dir()),
+                "destination": exec_client.CONTAINER_SOCKET_DIR,
+                "options": ["rbind"],
+            },
+        ],
+        "devices": [{"path": device} for device in devices],
+        "entrypoint": ["/bin/sh"],  # use shell to run our script
+        "command": ["-c", startup_script],
+        "labels": labels or {},
+    }
+
+
+class StreamDemuxer:
+    """Split a multiplexed attach stream into (stream, data) frames
+
+    Each frame has an 8 byte header: the stream ID, three bytes of padding
+    and a big-endian 32 bit payload length.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+        """Add data from the socket and return any complete frames"""
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= 8:
+            stream, size = struct.unpack(">BxxxL", self.buffer[:8])
+            if len(self.buffer) < 8 + size:
+                break
+            frames.append((stream, self.buffer[8 : 8 + size]))
+            self.buffer = self.buffer[8 + size :]
+
+        return frames
+
+
+# --- System Interface Functions ---
+
+
+def write_all(fd: int, data: bytes) -> None:
+    """Write all of data to a file descriptor"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+class Connection:
+    """HTTP/1.1 client for the podman socket, kept alive between requests"""
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+        self.sock: socket.socket | None = None
+        self.buffer = b""
+
+    def open_socket(self) -> socket.socket:
+        """Open a new socket to the service"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def is_reachable(self) -> bool:
+        """Check that the service is listening, keeping the connection for reuse"""
+        if self.sock is not None:
+            return True
+        try:
+            self.sock = self.open_socket()
+            self.buffer = b""
+            return True
+        except OSError:
+            return False
+
+    def close(self) -> None:
+        """Close the connection; the next request will reconnect"""
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.buffer = b""
+
+    def _recv(self) -> bytes:
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("Podman API closed the connection")
+        return data
+
+    def _read_until(self, marker: bytes) -> bytes:
+        while marker not in self.buffer:
+            self.buffer += self._recv()
+        data, _, self.buffer = self.buffer.partition(marker)
+        return data
+
+    def _read_exact(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            self.buffer += self._recv()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _read_body(self, headers: dict[str, str]) -> Iterator[bytes]:
+        if "chunked" in headers.get("transfer-encoding", ""):
+            while True:
+                size = int(self._read_until(b"\r\n").split(b";")[0], 16)
+                if size == 0:
+                    self._read_until(b"\r\n")
+                    return
+                yield self._read_exact(size)
+                self._read_exact(2)
+        elif "content-length" in headers:
+            yield self._read_exact(int(headers["content-length"]))
+        else:
+            # Body runs until the server hangs up
+            yield self.buffer
+            while data := self.sock.recv(65536):
+                yield data
+            self.close()
+            return
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+
+    def stream(
+        self, method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None
+    ) -> tuple[int, Iterator[bytes]]:
+        """Send a request and return its status and an iterator over the body
+
+        The body must be consumed before the next request is made.
+        """
+        request = encode_request(method, path, body, headers)
+
+        # A kept-alive connection may have been dropped by the service while
+        # we weren't looking, so retry once on a fresh one
+        reused = self.sock is not None
+        for attempt in range(2):
+            if self.sock is None:
+                self.sock = self.open_socket()
+                self.buffer = b""
+            try:
+                self.sock.sendall(request)
+                status, response_headers = parse_head(self._read_until(b"\r\n\r\n"))
+                break
+            except (ConnectionError, OSError):
+                self.close()
+                if attempt or not reused:
+                    raise
+
+        return status, self._read_body(response_headers)
+
+    def request(
+        self, method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None
+    ) -> tuple[int, bytes]:
+        """Send a request and return its status and body"""
+        status, chunks = self.stream(method, path, body, headers)
+        return status, b"".join(chunks)
+
+    def upgrade(self, path: str, body: bytes) -> tuple[socket.socket, bytes]:
+        """Send a request on a new socket and hijack it for raw streaming
+
+        Returns:
+            The raw socket and any stream data that arrived with the headers
+        """
+        sock = self.open_socket()
+        try:
+            headers = {"Content-Type": "application/json", "Connection": "Upgrade", "Upgrade": "tcp"}
+            sock.sendall(encode_request("POST", path, body, headers))
+
+            buffer = b""
+            while b"\r\n\r\n" not in buffer:
+                data = sock.recv(65536)
+                if not data:
+                    raise RuntimeError("Podman API closed the connection during attach")
+                buffer += data
+
+            head, _, leftover = buffer.partition(b"\r\n\r\n")
+            status, _ = parse_head(head)
+            if status not in (101, 200):
+                raise RuntimeError(f"Attach failed with status {status}: {leftover.decode(errors='replace')}")
+            return sock, leftover
+        except Exception:
+            sock.close()
+            raise
+
+
+class ApiEventStream:
+    """Events from the API's event stream, on a connection of its own so another thread can close it"""
+
+    def __init__(self, socket_path: Path):
+        self.connection = Connection(socket_path)
+
+    def __iter__(self):
+        filters = json.dumps({"type": ["container", "image"]})
+        status, chunks = self.connection.stream("GET", api_path("/events", {"stream": "true", "filters": filters}))
+        if status != 200:
+            raise RuntimeError(f"Events failed with status {status}")
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        try:
+            for chunk in chunks:
+                messages, buffer = split_json_stream(buffer + decoder.decode(chunk))
+                for message in messages:
+                    yield parse_event(message)
+        except OSError:
+            return  # Closed
+
+    def close(self) -> None:
+        sock = self.connection.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# One connection per process, shared by every backend instance
+_connections: dict[Path, Connection] = {}
+
+
+def get_connection(socket_path: Path) -> Connection:
+    """Get the shared connection to a podman socket"""
+    if socket_path not in _connections:
+        _connections[socket_path] = Connection(socket_path)
+    return _connections[socket_path]
+
+
+class PodmanApiBackend(Backend):
+    """Backend that uses the libpod REST API instead of running the podman CLI"""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def _request(self, method: str, endpoint: str, params: dict | list | None = None, data=None) -> tuple[int, bytes]:
+        """Make a JSON request to a libpod endpoint"""
+        body = b"" if data is None else json.dumps(data).encode()
+        headers = {"Content-Type": "application/json"} if data is not None else None
+        try:
+            return self.connection.request(method, api_path(endpoint, params), body, headers)
+        except OSError as e:
+            raise RuntimeError(f"Podman API request failed: {e}")
+
+    def _error(self, action: str, status: int, body: bytes) -> RuntimeError:
+        """Make an error from a failed response"""
+        try:
+            message = json.loads(body).get("message", "")
+        except (ValueError, AttributeError):
+            message = body.decode(errors="replace")
+        return RuntimeError(f"{action} failed with status {status}: {message}")
+
+    def build(self, dockerfile_path: Path, quiet: bool = False) -> str:
+        """Build image from dockerfile using the build endpoint"""
+        if not dockerfile_path.exists():
+            raise RuntimeError(f"Dockerfile not found: {dockerfile_path}")
+
+        context = make_build_context(dockerfile_path.read_bytes())
+        path = api_path("/build", {"dockerfile": "Dockerfile", "q": "true" if quiet else "false"})
+
+        try:
+            status, chunks = self.connection.stream("POST", path, context, {"Content-Type": "application/x-tar"})
+            output = pending = b""
+            for chunk in chunks:
+                output += chunk
+                if not quiet:
+                    # Show progress as it arrives, one message per line
+                    *lines, pending = (pending + chunk).split(b"\n")
+                    for line in lines:
+                        for message in parse_json_stream(line.decode(errors="replace")):
+                            sys.stdout.write(message.get("stream", ""))
+                    sys.stdout.flush()
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Build failed: {e}")
+
+        if status != 200:
+            raise self._error("Build", status, output)
+
+        messages = list(parse_json_stream(output.decode(errors="replace")))
+        for message in messages:
+            if message.get("error"):
+                raise RuntimeError(f"Build failed: {message['error']}")
+
+        image_id = image_id_from_build(messages)
+        if not image_id:
+            raise RuntimeError("Could not determine image ID from build output")
+
+        return image_id
+
+    def image_exists(self, image_id: str) -> bool:
+        """Check local image storage directly, asking the service if it's not found there"""
+        if image_in_storage(get_storage_root(), image_id):
+            return True
+
+        status, _ = self._request("GET", f"/images/{image_id}/exists")
+        return status == 204
+
+    def inspect(self, image_id: str) -> dict:
+        """Fetch image config with a single inspect request"""
+        status, body = self._request("GET", f"/images/{image_id}/json")
+        if status != 200:
+            raise self._error("Inspect", status, body)
+
+        return parse_image_config(json.loads(body).get("Config"))
+
+    def start(self, container_name: str, image_id: str, timeout: int = 600) -> None:
+        """Start a warm container with host integration and timeout management"""
+        startup_script = render_startup_script(container_name, timeout)
+
+        # Replace existing container with same name, forgetting the old one
+        state.reset_control_dir(container_name)
+        exec_client.make_socket_dir()
+        self._request("DELETE", f"/containers/{container_name}", {"force": "true", "ignore": "true"})
+
+        spec = container_spec(container_name, image_id, startup_script, get_gpu_devices(), container_labels(timeout))
+        limits = resources.container_limits(self.metadata(image_id)["labels"], container_name, self.name(image_id))
+        spec.update(resources.api_spec(limits))
+        status, body = self._request("POST", "/containers/create", data=spec)
+        if status != 201:
+            raise self._error("Create", status, body)
+
+        status, body = self._request("POST", f"/containers/{container_name}/start")
+        if status not in (204, 304):
+            raise self._error("Start", status, body)
+
+        self._record_state(container_name, image_id)
+
+    def _record_state(self, container_name: str, image_id: str) -> None:
+        """Record the container's processes so later runs can check liveness locally"""
+        status, body = self._request("GET", f"/containers/{container_name}/json")
+        try:
+            info = json.loads(body)
+            record = state.make_state(
+                container_name, image_id, info["Id"], int(info["State"]["Pid"]), int(info["State"]["ConmonPid"])
+            )
+        except (ValueError, KeyError, TypeError):
+            # Not fatal, later runs will just ask the service
+            state.clear_state(container_name)
+            return
+
+        state.write_state(record)
+
+    def stop(self, container_name: str) -> None:
+        """Stop and remove container"""
+        state.clear_state(container_name)
+        status, body = self._request("POST", f"/containers/{container_name}/stop")
+        if status not in (204, 304):
+            raise self._error("Stop", status, body)
+
+        status, body = self._request("DELETE", f"/containers/{container_name}")
+        if status not in (200, 204):
+            raise self._error("Remove", status, body)
+
+    def list_containers(self, stopped: bool = False) -> list[dict]:
+        """List undockit containers with a single request"""
+        params = {"filters": json.dumps({"name": ["^undockit-"]})}
+        if stopped:
+            params["all"] = "true"
+        status, body = self._request("GET", "/containers/json", params)
+        if status != 200:
+            raise self._error("List", status, body)
+        try:
+            return parse_container_list(json.loads(body))
+        except ValueError:
+            raise RuntimeError("Container list was malformed")
+
+    def list_images(self) -> list[dict]:
+        """List local images with a single request"""
+        status, body = self._request("GET", "/images/json")
+        if status != 200:
+            raise self._error("List", status, body)
+        try:
+            return parse_image_list(json.loads(body))
+        except ValueError:
+            raise RuntimeError("Image list was malformed")
+
+    def remove_containers(self, container_names: list[str]) -> None:
+        """Force-remove containers, over the one connection"""
+        for name in container_names:
+            state.clear_state(name)
+            status, body = self._request("DELETE", f"/containers/{name}", {"force": "true", "ignore": "true"})
+            if status not in (200, 204):
+                raise self._error("Remove", status, body)
+
+    def remove_images(self, image_ids: list[str]) -> None:
+        """Remove images with a single bulk request"""
+        if not image_ids:
+            return
+        params = [("images", image_id) for image_id in image_ids] + [("ignore", "true")]
+        status, body = self._request("DELETE", "/images/remove", params)
+        if status != 200:
+            raise self._error("Remove", status, body)
+
+    def is_running(self, container_name: str) -> bool:
+        """Check if container is currently running"""
+        # Fast path: the state record from start() and /proc
+        if state.is_known_running(container_name):
+            return True
+
+        try:
+            status, body = self._request("GET", f"/containers/{container_name}/json")
+            if status != 200:
+                return False
+            return bool(json.loads(body)["State"]["Running"])
+        except (RuntimeError, ValueError, KeyError, TypeError):
+            # If the service can't tell us, assume not running
+            return False
+
+    def exec(self, container_name: str, argv: list[str], stdio: tuple[int, int, int] | None = None) -> int:
+        """Execute command in container with proper workdir"""
+        # Only our own terminal gets a TTY
+        tty = stdio is None and sys.stdin.isatty()
+        stdin_fd, stdout_fd, stderr_fd = stdio or (sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno())
+
+        # Hand our stdio straight to the container's exec server if it has one
+        env = exec_client.run_env(dict(os.environ), tty)
+        returncode = exec_client.run(
+            exec_client.socket_path(container_name), argv, f"/host{os.getcwd()}", env, (stdin_fd, stdout_fd, stderr_fd)
+        )
+        if returncode is not None:
+            return returncode
+
+        if not tty:
+            return self._attach(container_name, argv, stdin_fd, stdout_fd, stderr_fd, tty)
+
+        import termios
+        import tty as ttymode
+
+        # Raw mode so keystrokes go straight to the container's terminal
+        saved = termios.tcgetattr(stdin_fd)
+        try:
+            ttymode.setraw(stdin_fd)
+            return self._attach(container_name, argv, stdin_fd, stdout_fd, stderr_fd, tty)
+        finally:
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, saved)
+
+    def _attach(self, container_name: str, argv: list[str], stdin_fd: int, stdout_fd: int, stderr_fd: int, tty: bool):
+        """Create an exec session and stream stdio through it until it finishes"""
+        # Get current working directory and map to container path
+        container_workdir = f"/host{os.getcwd()}"
+
+        config = {
+            "AttachStdin": True,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": tty,
+            "Cmd": [f"/tmp/undockit/{container_name}/exec", container_workdir] + argv,
+        }
+        status, body = self._request("POST", f"/containers/{container_name}/exec", data=config)
+        if status != 201:
+            raise self._error("Exec", status, body)
+        exec_id = json.loads(body)["Id"]
+
+        start = json.dumps({"Detach": False, "Tty": tty}).encode()
+        sock, leftover = self.connection.upgrade(api_path(f"/exec/{exec_id}/start"), start)
+        try:
+            if tty:
+                self._resize(exec_id, stdout_fd)
+            pump(sock, leftover, stdin_fd, stdout_fd, stderr_fd, tty)
+        finally:
+            sock.close()
+
+        return self._exit_code(exec_id)
+
+    def _resize(self, exec_id: str, fd: int) -> None:
+        """Match the exec session's terminal size to ours"""
+        try:
+            size = os.get_terminal_size(fd)
+        except OSError:
+            return
+        self._request("POST", f"/exec/{exec_id}/resize", {"h": size.lines, "w": size.columns})
+
+    def _exit_code(self, exec_id: str) -> int:
+        """Get the exit code of a finished exec session"""
+        # The session can still be reported as running for a moment after
+        # its streams close
+        for _ in range(100):
+            status, body = self._request("GET", f"/exec/{exec_id}/json")
+            if status != 200:
+                raise self._error("Exec inspect", status, body)
+            info = json.loads(body)
+            if not info.get("Running"):
+                return int(info.get("ExitCode", 1))
+            time.sleep(0.01)
+
+        raise RuntimeError(f"Exec session {exec_id} did not finish")
+
+    def clone(self) -> "PodmanApiBackend":
+        """Get a backend on a connection of its own, since one can't carry two requests at once"""
+        return PodmanApiBackend(Connection(self.connection.socket_path))
+
+    def pull(self, image: str) -> str:
+        """Pull with the pull endpoint, then look up the digest it resolved to"""
+        status, body = self._request("POST", "/images/pull", {"reference": image, "quiet": "true"})
+        if status != 200:
+            raise self._error("Pull", status, body)
+        for message in parse_json_stream(body.decode(errors="replace")):
+            if message.get("error"):
+                raise RuntimeError(f"Pull of {image} failed: {message['error']}")
+
+        status, body = self._request("GET", f"/images/{urllib.parse.quote(image, safe='')}/json")
+        if status != 200:
+            raise self._error("Inspect", status, body)
+        try:
+            repo_digests = json.loads(body).get("RepoDigests") or []
+        except (ValueError, AttributeError):
+            raise RuntimeError(f"Inspect of {image} was malformed")
+
+        return pinned_reference(image, repo_digests)
+
+    def events(self) -> ApiEventStream:
+        """Follow container and image events from the API"""
+        return ApiEventStream(self.connection.socket_path)
+
+    def name(self, image_id: str) -> str:
+        """Get container name for an image ID"""
+        return get_container_name(image_id)
+
+
+def pump(sock: socket.socket, leftover: bytes, stdin_fd: int | None, stdout_fd: int, stderr_fd: int, tty: bool):
+    """Copy stdin to an attached socket and its output to stdout/stderr until it closes"""
+    demuxer = None if tty else StreamDemuxer()
+    outputs = {STDOUT: stdout_fd, STDERR: stderr_fd}
+
+    def deliver(data: bytes):
+        if demuxer is None:
+            write_all(stdout_fd, data)
+            return
+        for stream, payload in demuxer.feed(data):
+            write_all(outputs.get(stream, stdout_fd), payload)
+
+    deliver(leftover)
+
+    # poll() copes with regular files on stdin, unlike epoll
+    selector = selectors.PollSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    if stdin_fd is not None:
+        selector.register(stdin_fd, selectors.EVENT_READ)
+
+    try:
+        while True:
+            for key, _ in selector.select():
+                if key.fileobj is sock:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    deliver(data)
+                    continue
+
+                data = os.read(stdin_fd, 65536)
+                if data:
+                    sock.sendall(data)
+                else:
+                    # Pass EOF on to the command
+                    selector.unregister(stdin_fd)
+                    sock.shutdown(socket.SHUT_WR)
+    finally:
+        selector.close()
+
+
+trace.instrument(Connection, "request", "stream", "upgrade")
+trace.instrument(
+    PodmanApiBackend,
+    "build",
+    "image_exists",
+    "inspect",
+    "start",
+    "stop",
+    "is_running",
+    "exec",
+    "pull",
+    "list_containers",
+)
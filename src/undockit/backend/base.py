@@ -2,9 +2,22 @@
 Abstract base class for container backends
 """
 
+import json
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
 from pathlib import Path
 
+from .. import cache, trace
+from ..lock import FileLock, lock_name
+from . import state
+
+# How long to wait for another process's build or start before giving up
+BUILD_LOCK_TIMEOUT = 3600
+START_LOCK_TIMEOUT = 300
+READY_TIMEOUT = 60
+
 
 class Backend(ABC):
     """Abstract base class for container runtime backends"""
@@ -26,6 +39,92 @@ class Backend(ABC):
         pass
 
     @abstractmethod
+    def image_exists(self, image_id: str) -> bool:
+        """Check if an image is present in local image storage
+
+        Args:
+            image_id: Image ID returned from build()
+
+        Returns:
+            True if the image can be run without rebuilding
+        """
+        pass
+
+    def get_image(self, dockerfile_path: Path, rebuild: bool = False, quiet: bool = True) -> str:
+        """Get image ID for a dockerfile, only building on a cache miss
+
+        The image ID is cached against a hash of the dockerfile's content, so
+        an unchanged dockerfile maps straight to its image without a build.
+
+        Args:
+            dockerfile_path: Path to the dockerfile
+            rebuild: If True, ignore the cache and always build
+            quiet: If True, suppress build output (default: True)
+
+        Returns:
+            Image ID/hash that can be used to reference the built image
+
+        Raises:
+            RuntimeError: If build fails
+        """
+        try:
+            key = cache.content_hash(dockerfile_path.read_bytes())
+        except OSError:
+            raise RuntimeError(f"Dockerfile not found: {dockerfile_path}")
+
+        if not rebuild:
+            image_id = cache.read("images", key)
+            if image_id and self.image_exists(image_id):
+                return image_id
+
+        # Only one process builds a given dockerfile, the rest use its result
+        with FileLock(lock_name("build", key), timeout=BUILD_LOCK_TIMEOUT):
+            if not rebuild:
+                image_id = cache.read("images", key)
+                if image_id and self.image_exists(image_id):
+                    return image_id
+
+            image_id = self.build(dockerfile_path, quiet=quiet)
+            cache.write("images", key, image_id)
+            # So status can say which tool a container is for
+            cache.write("tools", image_id, str(dockerfile_path.absolute()))
+            return image_id
+
+    @abstractmethod
+    def inspect(self, image_id: str) -> dict:
+        """Fetch image config from the container runtime
+
+        Args:
+            image_id: Image ID returned from build()
+
+        Returns:
+            Dict with entrypoint, cmd, workdir, env and labels keys
+        """
+        pass
+
+    def metadata(self, image_id: str) -> dict:
+        """Get image config, from the metadata cache if possible
+
+        Image config is immutable for a given image ID, so it's only ever
+        inspected once and then served from disk.
+
+        Args:
+            image_id: Image ID returned from build()
+
+        Returns:
+            Dict with entrypoint, cmd, workdir, env and labels keys
+        """
+        cached = cache.read("metadata", image_id)
+        if cached:
+            try:
+                return json.loads(cached)
+            except ValueError:
+                pass  # Corrupt entry, fetch it again
+
+        metadata = self.inspect(image_id)
+        cache.write("metadata", image_id, json.dumps(metadata))
+        return metadata
+
     def command(self, image_id: str) -> list[str]:
         """Extract default command from image
 
@@ -35,7 +134,10 @@ class Backend(ABC):
         Returns:
             List of command arguments (ENTRYPOINT + CMD combined)
         """
-        pass
+        metadata = self.metadata(image_id)
+
+        # Combine per Docker semantics
+        return list(metadata["entrypoint"]) + list(metadata["cmd"])
 
     @abstractmethod
     def start(self, container_name: str, image_id: str, timeout: int = 600) -> None:
@@ -48,6 +150,69 @@ class Backend(ABC):
         """
         pass
 
+    def wait_ready(self, container_name: str, timeout: float = READY_TIMEOUT) -> None:
+        """Wait for a freshly started container to deploy its exec script
+
+        Args:
+            container_name: Name of the started container
+            timeout: Seconds to wait
+
+        Raises:
+            RuntimeError: If the container exits or isn't ready in time
+        """
+        deadline = time.monotonic() + timeout
+        checked = time.monotonic()
+        while not state.is_ready(container_name):
+            now = time.monotonic()
+            if now >= deadline:
+                raise RuntimeError(f"Container {container_name} not ready after {timeout}s")
+
+            # Don't wait the whole timeout on a container that's died
+            if now - checked >= 1:
+                if not self.is_running(container_name):
+                    raise RuntimeError(f"Container {container_name} exited during startup")
+                checked = now
+
+            time.sleep(0.01)
+
+    def ensure_running(self, container_name: str, image_id: str, timeout: int = 600, checked: bool = False) -> bool:
+        """Start a container unless it's already running
+
+        Concurrent callers share a single start: one process starts the
+        container, and the others wait for it to be ready and then use it,
+        rather than each replacing the container the last one started.
+        With a memory budget set, idle containers are stopped first to make
+        room for it.
+
+        Args:
+            container_name: Unique name for the container
+            image_id: Image ID to run
+            timeout: Seconds of inactivity before container shuts down
+            checked: The caller has just found it not running
+
+        Returns:
+            True if this call started the container
+
+        Raises:
+            RuntimeError: If starting fails or takes too long
+        """
+        if not checked and self.is_running(container_name):
+            return False
+
+        with FileLock(lock_name("start", container_name), timeout=START_LOCK_TIMEOUT):
+            # Another process may have started it while we waited
+            if self.is_running(container_name):
+                return False
+
+            if os.environ.get("UNDOCKIT_MEMORY_BUDGET"):
+                from ..budget import make_room
+
+                make_room(self, container_name, image_id)
+
+            self.start(container_name, image_id, timeout)
+            self.wait_ready(container_name)
+            return True
+
     @abstractmethod
     def stop(self, container_name: str) -> None:
         """Stop and remove a container
@@ -70,18 +235,94 @@ class Backend(ABC):
         pass
 
     @abstractmethod
-    def exec(self, container_name: str, argv: list[str]) -> int:
+    def exec(self, container_name: str, argv: list[str], stdio: tuple[int, int, int] | None = None) -> int:
         """Execute a command in the container
 
         Args:
             container_name: Name of running container
             argv: Command and arguments to execute
+            stdio: File descriptors for stdin, stdout and stderr (default: our own)
 
         Returns:
             Exit code from the executed command
         """
         pass
 
+    def clone(self) -> "Backend":
+        """Get a backend that can be used from another thread at the same time
+
+        Returns:
+            This backend if it has no per-connection state, or a fresh one
+        """
+        return self
+
+    def list_containers(self, stopped: bool = False) -> list[dict]:
+        """List the running undockit containers in one query
+
+        Args:
+            stopped: Include containers that have stopped but not been removed
+
+        Returns:
+            Dicts with name, id, image_id, pid, labels, started and running keys
+
+        Raises:
+            RuntimeError: If the runtime can't be asked
+        """
+        raise RuntimeError(f"{type(self).__name__} can't list containers")
+
+    def list_images(self) -> list[dict]:
+        """List local images in one query
+
+        Returns:
+            Dicts with id, size and created keys
+
+        Raises:
+            RuntimeError: If the runtime can't be asked
+        """
+        raise RuntimeError(f"{type(self).__name__} can't list images")
+
+    def remove_containers(self, container_names: list[str]) -> None:
+        """Force-remove containers, running or not, in bulk
+
+        Raises:
+            RuntimeError: If any of them couldn't be removed
+        """
+        raise RuntimeError(f"{type(self).__name__} can't remove containers")
+
+    def remove_images(self, image_ids: list[str]) -> None:
+        """Remove images in bulk
+
+        Raises:
+            RuntimeError: If any of them couldn't be removed
+        """
+        raise RuntimeError(f"{type(self).__name__} can't remove images")
+
+    def pull(self, image: str) -> str:
+        """Pull an image and pin it to the digest its tag points at
+
+        Args:
+            image: Image reference, by tag or digest
+
+        Returns:
+            Fully qualified repo@digest reference that needs no tag lookup
+
+        Raises:
+            RuntimeError: If the pull fails or the backend can't pull
+        """
+        raise RuntimeError(f"{type(self).__name__} can't pull images")
+
+    def events(self):
+        """Follow the runtime's container and image events
+
+        Returns:
+            Iterable of dicts with type, action, id and name keys, with a
+            close() method that stops it from another thread
+
+        Raises:
+            RuntimeError: If the backend can't report events
+        """
+        raise RuntimeError(f"{type(self).__name__} doesn't report events")
+
     @abstractmethod
     def name(self, image_id: str) -> str:
         """Get container name for an image ID
@@ -93,3 +334,22 @@ class Backend(ABC):
             Container name to use for this image
         """
         pass
+
+
+def thread_backend(backend: Backend):
+    """Make a function that gets each thread its own clone of a backend
+
+    Returns:
+        Function returning the calling thread's backend, cloned on first use
+    """
+    local = threading.local()
+
+    def get() -> Backend:
+        if not hasattr(local, "backend"):
+            local.backend = backend.clone()
+        return local.backend
+
+    return get
+
+
+trace.instrument(Backend, "get_image", "metadata", "command", "wait_ready", "ensure_running")
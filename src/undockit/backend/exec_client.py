@@ -0,0 +1,167 @@
+"""
+Client for the in-container exec server, which runs commands without a podman exec
+
+The server gets our terminal's fds, so its socket lives in a directory only
+we can get into, under the runtime dir rather than the shared /tmp, which is
+mounted into containers at CONTAINER_SOCKET_DIR. Before sending anything the
+directory's owner and mode, and the uid of whoever's listening, are checked.
+"""
+
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+from pathlib import Path
+
+from .. import cache, trace
+
+# Passed on to the command, which has no terminal of its own to get them from
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT, signal.SIGWINCH)
+
+# Where the socket directory is mounted in containers
+CONTAINER_SOCKET_DIR = "/run/undockit"
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def container_socket_path(container_name: str) -> str:
+    """Return where a container's exec server listens, as the container sees it"""
+    return f"{CONTAINER_SOCKET_DIR}/{container_name}.sock"
+
+
+def encode_request(argv: list[str], cwd: str, env: dict[str, str]) -> bytes:
+    """Encode a run request"""
+    return json.dumps({"argv": argv, "cwd": cwd, "env": env}).encode() + b"\n"
+
+
+def decode_response(line: bytes) -> int:
+    """Decode the server's reply into an exit code, shell style for signals
+
+    Raises:
+        RuntimeError: If the server couldn't run the command
+    """
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise RuntimeError("Exec server went away")
+
+    if "error" in response:
+        raise RuntimeError(f"Exec server failed: {response['error']}")
+
+    returncode = response["returncode"]
+    return 128 - returncode if returncode < 0 else returncode
+
+
+def run_env(env: dict[str, str], tty: bool) -> dict[str, str]:
+    """Pick the environment to send, like podman exec only passing TERM with a tty"""
+    return {"TERM": env["TERM"]} if tty and "TERM" in env else {}
+
+
+# --- System Interface Functions ---
+
+
+def socket_dir() -> Path:
+    """Return the host directory exec server sockets are in"""
+    return cache.get_runtime_dir() / "exec"
+
+
+def socket_path(container_name: str) -> Path:
+    """Return the path of a container's exec server socket"""
+    return socket_dir() / f"{container_name}.sock"
+
+
+def make_socket_dir() -> Path:
+    """Create the socket directory, for mounting into a container about to start
+
+    Raises:
+        PermissionError: If someone else got there first
+    """
+    return cache.make_private_dir(socket_dir())
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Get the uid of the process on the other end of a unix socket"""
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def connect(path: Path) -> socket.socket | None:
+    """Connect to an exec server, or None if there isn't one we can trust"""
+    if os.environ.get("UNDOCKIT_NO_EXEC_SERVER"):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Anyone else's socket could be handed our terminal
+        if not cache.is_private(os.stat(path.parent), os.getuid()):
+            raise PermissionError(f"{path.parent} isn't private")
+        sock.connect(str(path))
+        if peer_uid(sock) != os.getuid():
+            raise PermissionError(f"{path} belongs to another user")
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def run(
+    path: Path, argv: list[str], cwd: str, env: dict[str, str], fds: tuple[int, int, int] = (0, 1, 2)
+) -> int | None:
+    """Run a command through an exec server with our own stdio
+
+    Args:
+        path: The server's socket
+        argv: Command and arguments to execute
+        cwd: Working directory inside the container
+        env: Extra environment for the command
+        fds: stdin, stdout and stderr to hand over
+
+    Returns:
+        Exit code, or None if there's no server and nothing was run
+
+    Raises:
+        RuntimeError: If the server fails after taking the command
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    with sock:
+        try:
+            sock.sendmsg(
+                [encode_request(argv, cwd, env)],
+                [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))],
+            )
+        except OSError:
+            return None  # Nothing was sent, so podman exec can still take it
+
+        def forward(signum, frame):
+            try:
+                sock.sendall(f"signal {signum}\n".encode())
+            except OSError:
+                pass
+
+        try:
+            previous = {signum: signal.signal(signum, forward) for signum in FORWARDED_SIGNALS}
+        except ValueError:
+            previous = {}  # Not the main thread, so signals aren't ours to take
+
+        try:
+            response = b""
+            while not response.endswith(b"\n"):
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    return decode_response(response)
+
+
+trace.instrument(sys.modules[__name__], "connect", "run")
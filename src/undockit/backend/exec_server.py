@@ -0,0 +1,141 @@
+"""
+Exec server, run inside a warm container by its startup script
+
+Listens on the socket path it's given, in a directory mounted from the
+host's runtime dir, and runs commands with the exec script in the
+container's control directory. Each connection
+is one run: a JSON request line with argv, cwd and env, sent along with the
+caller's stdin, stdout and stderr over SCM_RIGHTS. The command runs through
+the exec script on those very fds, so its output goes straight to the
+caller, and the exit status goes back as a JSON line. While it runs, the
+caller can send "signal N" lines to forward signals to it.
+
+This file is copied into the container and run by the image's python3, so
+it only uses the standard library and syntax that old pythons understand.
+"""
+
+import array
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+# stdin, stdout and stderr
+FD_COUNT = 3
+
+
+class LineReader:
+    """Read newline terminated messages from a socket"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = b""
+
+    def recv_fds(self):
+        """Receive the first chunk, along with any file descriptors sent with it"""
+        fds = array.array("i")
+        data, ancdata, _, _ = self.conn.recvmsg(65536, socket.CMSG_SPACE(FD_COUNT * fds.itemsize))
+        for level, kind, cdata in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(cdata[: len(cdata) - len(cdata) % fds.itemsize])
+        self.buffer += data
+        return list(fds)
+
+    def readline(self):
+        """Return the next line without its newline, or None at EOF"""
+        while b"\n" not in self.buffer:
+            try:
+                data = self.conn.recv(65536)
+            except OSError:
+                return None
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line
+
+
+def send(conn, message):
+    try:
+        conn.sendall(json.dumps(message).encode() + b"\n")
+    except OSError:
+        pass  # Caller's gone
+
+
+def forward_signals(reader, process):
+    """Pass the caller's signals on, and hang up on the command if it goes away"""
+    while True:
+        line = reader.readline()
+        if line is None:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, 1)  # SIGHUP
+                except OSError:
+                    pass
+            return
+        try:
+            kind, number = line.decode().split()
+            if kind == "signal":
+                os.killpg(process.pid, int(number))
+        except (ValueError, OSError):
+            pass
+
+
+def handle(conn, control_dir):
+    reader = LineReader(conn)
+    fds = []
+    try:
+        fds = reader.recv_fds()
+        request = json.loads(reader.readline() or b"")
+        if len(fds) != FD_COUNT:
+            raise ValueError("expected stdin, stdout and stderr")
+
+        env = dict(os.environ)
+        env.update(request.get("env") or {})
+
+        # Own session, so signals can go to the whole job
+        process = subprocess.Popen(
+            [os.path.join(control_dir, "exec"), request["cwd"]] + list(request["argv"]),
+            stdin=fds[0],
+            stdout=fds[1],
+            stderr=fds[2],
+            env=env,
+            start_new_session=True,
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        send(conn, {"error": str(e)})
+        conn.close()
+        return
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    watcher = threading.Thread(target=forward_signals, args=(reader, process))
+    watcher.daemon = True
+    watcher.start()
+
+    send(conn, {"returncode": process.wait()})
+    conn.close()
+
+
+def main():
+    control_dir, path = sys.argv[1:3]
+    tmp_path = "{}.{}".format(path, os.getpid())
+
+    # Only appear once listening, so callers never find a dead socket
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(tmp_path)
+    server.listen(64)
+    os.rename(tmp_path, path)
+
+    while True:
+        conn, _ = server.accept()
+        thread = threading.Thread(target=handle, args=(conn, control_dir))
+        thread.daemon = True
+        thread.start()
+
+
+if __name__ == "__main__":
+    main()
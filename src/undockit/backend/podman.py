@@ -6,9 +6,10 @@ import json
 import os
 import subprocess
 import sys
-import tempfile
 from pathlib import Path
 
+from .. import resources, trace
+from . import exec_client, state
 from .base import Backend
 
 
@@ -20,6 +21,113 @@ def get_empty_build_context() -> Path:
     return empty_context
 
 
+# Storage drivers whose image directories we know how to find
+STORAGE_DRIVERS = ("overlay", "vfs", "btrfs", "zfs")
+
+
+def get_storage_root() -> Path:
+    """Get the default podman image storage directory for this user"""
+    if os.getuid() == 0:
+        return Path("/var/lib/containers/storage")
+
+    data_home = os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share")
+    return Path(data_home) / "containers" / "storage"
+
+
+def image_in_storage(storage_root: Path, image_id: str) -> bool:
+    """Check if an image's metadata directory exists under a storage root"""
+    return any((storage_root / f"{driver}-images" / image_id).is_dir() for driver in STORAGE_DRIVERS)
+
+
+def parse_image_config(config: dict) -> dict:
+    """Normalize an image's .Config section into undockit's metadata format"""
+    config = config or {}
+    return {
+        "entrypoint": config.get("Entrypoint") or [],
+        "cmd": config.get("Cmd") or [],
+        "workdir": config.get("WorkingDir") or "",
+        "env": config.get("Env") or [],
+        "labels": config.get("Labels") or {},
+    }
+
+
+def repository(image: str) -> str:
+    """Strip the tag and digest off an image reference"""
+    name = image.split("@", 1)[0]
+    # A colon after the last slash is a tag, before it a registry port
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    return name
+
+
+def pinned_reference(image: str, repo_digests: list[str]) -> str:
+    """Pick the repo@digest reference a pulled image was pulled as
+
+    Args:
+        image: The reference it was pulled by, which may be a short name
+        repo_digests: The image's RepoDigests, which are fully qualified
+
+    Returns:
+        The matching repo@digest, or the first one if none match
+    """
+    if not repo_digests:
+        raise RuntimeError(f"No digest for {image}, was it pulled from a registry?")
+
+    # Short names are qualified by a registry, and maybe Docker Hub's library/
+    repo = repository(image)
+    for matches in (lambda name: name == repo, lambda name: name.endswith(f"/{repo}")):
+        for reference in repo_digests:
+            if matches(repository(reference)):
+                return reference
+    return repo_digests[0]
+
+
+def container_labels(timeout: int) -> dict[str, str]:
+    """Labels for a warm container, so status can tell how long it's kept"""
+    return {"undockit.timeout": str(timeout)}
+
+
+def parse_container_list(entries: list[dict]) -> list[dict]:
+    """Normalize podman ps --format json, or the API's container list
+
+    Returns:
+        Dicts with name, id, image_id, pid, labels, started and running keys
+    """
+    containers = []
+    for entry in entries or []:
+        names = entry.get("Names") or []
+        containers.append(
+            {
+                "name": names[0] if isinstance(names, list) and names else str(names),
+                "id": entry.get("Id") or "",
+                "image_id": (entry.get("ImageID") or "").removeprefix("sha256:"),
+                "pid": int(entry.get("Pid") or 0),
+                "labels": entry.get("Labels") or {},
+                "started": int(entry.get("StartedAt") or 0),
+                "running": entry.get("State", "running") == "running",
+            }
+        )
+    return containers
+
+
+def parse_image_list(entries: list[dict]) -> list[dict]:
+    """Normalize podman images --format json, or the API's image list
+
+    Returns:
+        Dicts with id, size, shared and created keys, where shared is the
+        part of size in layers other images use too
+    """
+    return [
+        {
+            "id": (entry.get("Id") or "").removeprefix("sha256:"),
+            "size": int(entry.get("Size") or 0),
+            "shared": max(0, int(entry.get("SharedSize") or 0)),
+            "created": int(entry.get("Created") or 0),
+        }
+        for entry in entries or []
+    ]
+
+
 # Startup script template for containers
 STARTUP_SCRIPT = """#!/bin/sh
 # Create directories with image-specific namespace
@@ -28,13 +136,32 @@ mkdir -p /tmp/undockit/{image_name}/pid /tmp/undockit/{image_name}/bin
 # Update directory timestamp to mark container as active
 touch /tmp/undockit/{image_name}/pid/
 
-# Deploy exec script
-cat > /tmp/undockit/{image_name}/exec << EXEC_EOF
+# Control channel: exec sessions say when they start and end, so the idle
+# timer can be armed exactly rather than polled for
+rm -f /tmp/undockit/{image_name}/ctl
+mkfifo /tmp/undockit/{image_name}/ctl 2>/dev/null
+
+# Exec server, so runs don't each need a podman exec; images without python3
+# or that set UNDOCKIT_NO_EXEC_SERVER just go without
+rm -f {exec_socket}
+if [ -z "$UNDOCKIT_NO_EXEC_SERVER" ] && command -v python3 >/dev/null 2>&1; then
+    cat > /tmp/undockit/{image_name}/server.py << 'SERVER_EOF'
+{exec_server}
+SERVER_EOF
+    python3 /tmp/undockit/{image_name}/server.py /tmp/undockit/{image_name} {exec_socket} &
+    server=$!
+    trap 'kill $server 2>/dev/null' EXIT
+fi
+
+# Deploy exec script, atomically since its appearance means we're ready
+cat > /tmp/undockit/{image_name}/exec.new << EXEC_EOF
 #!/bin/sh
 pidfile="/tmp/undockit/{image_name}/pid/\\$$"
+ctl="/tmp/undockit/{image_name}/ctl"
 workdir="\\$1"
 shift
 touch "\\$pidfile"
+[ -p "\\$ctl" ] && echo start > "\\$ctl"
 cd "\\$workdir" || exit 1
 
 # Set up XDG directories to use host filesystem
@@ -48,45 +175,238 @@ mkdir -p "\\$XDG_CACHE_HOME" "\\$XDG_CONFIG_HOME" "\\$XDG_DATA_HOME" "\\$MODEL_P
 "\\$@"
 exitcode=\\$?
 rm -f "\\$pidfile"
+[ -p "\\$ctl" ] && echo end > "\\$ctl"
 exit \\$exitcode
 EXEC_EOF
-chmod +x /tmp/undockit/{image_name}/exec
+chmod +x /tmp/undockit/{image_name}/exec.new
+mv -f /tmp/undockit/{image_name}/exec.new /tmp/undockit/{image_name}/exec
 
-# Wait loop with timeout
 timeout_seconds={timeout}
+
+# How often live sessions are checked on, as one killed outright never says
+# it's ended
+sweep_seconds=${{UNDOCKIT_SWEEP_SECONDS:-10}}
+
+log() {{
+    [ -z "$UNDOCKIT_SUPERVISOR_LOG" ] || echo "$*" >> "$UNDOCKIT_SUPERVISOR_LOG"
+}}
+
+# True if no exec sessions are live, clearing out pid files left by killed ones
+idle() {{
+    for pidfile in /tmp/undockit/{image_name}/pid/*; do
+        [ -e "$pidfile" ] || continue
+        kill -0 "${{pidfile##*/}}" 2>/dev/null && return 1
+        rm -f "$pidfile"
+    done
+    return 0
+}}
+
+if [ -p /tmp/undockit/{image_name}/ctl ]; then
+    # Held open for reading and writing, so it never blocks or hits EOF
+    exec 3<> /tmp/undockit/{image_name}/ctl
+    generation=0
+    timer=
+    while true; do
+        # Re-arm the idle timer, tagged so a stale one can't stop us
+        [ -n "$timer" ] && kill "$timer" 2>/dev/null
+        timer=
+        generation=$((generation + 1))
+        if idle; then
+            (
+                trap 'kill $sleeper 2>/dev/null; exit 0' TERM
+                sleep "$timeout_seconds" &
+                sleeper=$!
+                wait "$sleeper" && echo "timeout $generation" >&3
+            ) &
+            timer=$!
+        else
+            # Sessions are live, so sweep for dead ones until they've all gone
+            (
+                trap 'kill $sleeper 2>/dev/null; exit 0' TERM
+                while true; do
+                    sleep "$sweep_seconds" &
+                    sleeper=$!
+                    wait "$sleeper" || exit 0
+                    echo "sweep $generation" >&3
+                done
+            ) &
+            timer=$!
+        fi
+
+        # Block until an exec session starts or ends, or the timer fires
+        while read -r event armed <&3; do
+            log "wake $event"
+            case "$event" in
+                timeout)
+                    if [ "$armed" = "$generation" ] && idle; then
+                        rm -f /tmp/undockit/{image_name}/ctl
+                        exit 0  # Timeout reached, shut down
+                    fi
+                    ;;
+                sweep)
+                    # The last session died without an end, so arm the timer
+                    [ "$armed" = "$generation" ] && idle && break
+                    ;;
+                *)
+                    break
+                    ;;
+            esac
+        done
+    done
+fi
+
+# No mkfifo in this image, so poll, but sleep right up to the deadline when idle
 while true; do
-    count=$(ls /tmp/undockit/{image_name}/pid/ 2>/dev/null | wc -l)
-    if [ "$count" -eq 0 ]; then
+    if idle; then
         mtime=$(stat -c %Y /tmp/undockit/{image_name}/pid/ 2>/dev/null || echo 0)
-        now=$(date +%s)
-        if [ $((now - mtime)) -gt $timeout_seconds ]; then
+        remaining=$((mtime + timeout_seconds - $(date +%s)))
+        if [ "$remaining" -le 0 ]; then
             exit 0  # Timeout reached, shut down
         fi
+    else
+        remaining=30
     fi
-    sleep 30
+    sleep "$remaining"
+    log "wake poll"
 done
 """
 
 
+def has_nvidia_cdi() -> bool:
+    """Check if NVIDIA CDI devices are available"""
+    try:
+        # Check if CDI config exists
+        cdi_paths = ["/etc/cdi/nvidia.yaml", "/var/run/cdi/nvidia.yaml"]
+        return any(os.path.exists(path) for path in cdi_paths)
+    except Exception:
+        return False
+
+
+def get_gpu_devices() -> list[str]:
+    """Detect and return the CDI devices to pass through to containers"""
+    devices = []
+
+    # NVIDIA GPU support via Container Toolkit CDI
+    if has_nvidia_cdi():
+        devices.append("nvidia.com/gpu=all")
+
+    return devices
+
+
+def render_startup_script(container_name: str, timeout: int, exec_socket: str | None = None) -> str:
+    """Format the startup script for a container
+
+    Args:
+        container_name: Name of the container, which names its control directory
+        timeout: Seconds to stay up while idle
+        exec_socket: Where the exec server listens, if not the socket directory mount
+    """
+    # Get host username
+    import getpass
+
+    import pkgutil
+
+    host_user = getpass.getuser()
+    exec_server = pkgutil.get_data(__package__, "exec_server.py").decode()
+
+    # Format the startup script with timeout value, container name, host user and exec server
+    return STARTUP_SCRIPT.format(
+        timeout=timeout,
+        image_name=container_name,
+        host_user=host_user,
+        exec_server=exec_server,
+        exec_socket=exec_socket or exec_client.container_socket_path(container_name),
+    )
+
+
+def run_command(container_name: str, image_id: str, startup_script: str, labels: dict, flags: list[str]) -> list[str]:
+    """Make the podman run command for a warm container
+
+    Args:
+        container_name: Name for the container
+        image_id: Image to run
+        startup_script: Script from render_startup_script()
+        labels: Container labels
+        flags: Device and resource flags
+    """
+    cmd = [
+        "podman",
+        "run",
+        "-d",  # detached
+        "--replace",  # replace existing container with same name
+        "--name",
+        container_name,
+        "--userns=keep-id",  # run as current user
+        "--mount",
+        "type=bind,source=/,target=/host",  # mount host filesystem
+        "--mount",
+        "type=bind,source=/tmp,target=/tmp",  # mount host /tmp
+        "--mount",
+        f"type=bind,source={exec_client.socket_dir()},target={exec_client.CONTAINER_SOCKET_DIR}",  # exec sockets
+        "--entrypoint",
+        "/bin/sh",  # use shell to run our script
+    ]
+    for key, value in labels.items():
+        cmd.extend(["--label", f"{key}={value}"])
+
+    cmd.extend(flags)
+    cmd.extend([image_id, "-c", startup_script])
+    return cmd
+
+
+def get_container_name(image_id: str) -> str:
+    """Get container name for an image ID"""
+    return f"undockit-{os.getuid()}-{image_id[:12]}"
+
+
+def parse_event(event: dict) -> dict:
+    """Normalize a podman event from the CLI or the API
+
+    Returns:
+        Dict with type, action, id and name keys
+    """
+    actor = event.get("Actor") or {}
+    attributes = actor.get("Attributes") or {}
+    return {
+        "type": (event.get("Type") or event.get("type") or "").lower(),
+        "action": event.get("Action") or event.get("Status") or event.get("status") or "",
+        "id": (actor.get("ID") or event.get("ID") or event.get("id") or "").removeprefix("sha256:"),
+        "name": attributes.get("name") or event.get("Name") or "",
+    }
+
+
+class EventStream:
+    """Events from a podman events process, which another thread can close"""
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+
+    def __iter__(self):
+        for line in self.process.stdout:
+            try:
+                yield parse_event(json.loads(line))
+            except ValueError:
+                continue
+        self.process.wait()
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+
+
 class PodmanBackend(Backend):
     def _get_gpu_flags(self) -> list[str]:
         """Detect and return appropriate GPU device flags"""
         flags = []
-
-        # NVIDIA GPU support via Container Toolkit CDI
-        if self._has_nvidia_cdi():
-            flags.extend(["--device", "nvidia.com/gpu=all"])
+        for device in get_gpu_devices():
+            flags.extend(["--device", device])
 
         return flags
 
-    def _has_nvidia_cdi(self) -> bool:
-        """Check if NVIDIA CDI devices are available"""
-        try:
-            # Check if CDI config exists
-            cdi_paths = ["/etc/cdi/nvidia.yaml", "/var/run/cdi/nvidia.yaml"]
-            return any(os.path.exists(path) for path in cdi_paths)
-        except Exception:
-            return False
+    def _get_resource_flags(self, container_name: str, image_id: str) -> list[str]:
+        """Get flags for the resource profile in the image's labels"""
+        limits = resources.container_limits(self.metadata(image_id)["labels"], container_name, self.name(image_id))
+        return resources.podman_flags(limits)
 
     def build(self, dockerfile_path: Path, quiet: bool = False) -> str:
         """Build image from dockerfile using podman build"""
@@ -111,6 +431,8 @@ class PodmanBackend(Backend):
                 )
         else:
             # Verbose mode - show output and get ID from file
+            import tempfile
+
             with tempfile.NamedTemporaryFile(delete=False) as iidfile:
                 try:
                     cmd = ["podman", "build", "--iidfile", iidfile.name, "-f", str(dockerfile_path), str(empty_context)]
@@ -129,79 +451,119 @@ class PodmanBackend(Backend):
 
         return image_id
 
-    def command(self, image_id: str) -> list[str]:
-        """Extract default command from image using podman inspect"""
-        # Get entrypoint - fail hard on any error
-        entrypoint_result = subprocess.run(
-            ["podman", "inspect", image_id, "--format", "{{json .Config.Entrypoint}}"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
+    def image_exists(self, image_id: str) -> bool:
+        """Check local image storage directly, asking podman if it's not found there"""
+        if image_in_storage(get_storage_root(), image_id):
+            return True
+
+        # Storage may be configured elsewhere, so this isn't proof it's missing
+        result = subprocess.run(["podman", "image", "exists", image_id], capture_output=True, check=False)
+        return result.returncode == 0
 
-        # Get cmd - fail hard on any error
-        cmd_result = subprocess.run(
-            ["podman", "inspect", image_id, "--format", "{{json .Config.Cmd}}"],
+    def inspect(self, image_id: str) -> dict:
+        """Fetch image config with a single podman inspect"""
+        # Fail hard on any error
+        result = subprocess.run(
+            ["podman", "image", "inspect", image_id, "--format", "{{json .Config}}"],
             capture_output=True,
             text=True,
             check=True,
         )
 
         # Parse JSON - fail hard on malformed JSON
-        entrypoint = json.loads(entrypoint_result.stdout.strip())
-        cmd = json.loads(cmd_result.stdout.strip())
-
-        # Combine per Docker semantics
-        return (entrypoint or []) + (cmd or [])
+        return parse_image_config(json.loads(result.stdout.strip()))
 
     def start(self, container_name: str, image_id: str, timeout: int = 600) -> None:
         """Start a warm container with host integration and timeout management"""
-        # Get host username
-        import getpass
-
-        host_user = getpass.getuser()
+        startup_script = render_startup_script(container_name, timeout)
 
-        # Format the startup script with timeout value, container name, and host user
-        startup_script = STARTUP_SCRIPT.format(timeout=timeout, image_name=container_name, host_user=host_user)
+        # Forget the container being replaced, so readiness means this one
+        state.reset_control_dir(container_name)
+        exec_client.make_socket_dir()
 
-        cmd = [
-            "podman",
-            "run",
-            "-d",  # detached
-            "--replace",  # replace existing container with same name
-            "--name",
-            container_name,
-            "--userns=keep-id",  # run as current user
-            "--mount",
-            "type=bind,source=/,target=/host",  # mount host filesystem
-            "--mount",
-            "type=bind,source=/tmp,target=/tmp",  # mount host /tmp
-            "--entrypoint",
-            "/bin/sh",  # use shell to run our script
-        ]
+        # GPU devices, and the tool's CPU, memory and shm limits
+        flags = self._get_gpu_flags() + self._get_resource_flags(container_name, image_id)
+        cmd = run_command(container_name, image_id, startup_script, container_labels(timeout), flags)
 
-        # Add GPU device flags
-        cmd.extend(self._get_gpu_flags())
+        # Capture the container ID so it doesn't end up in the tool's output
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, text=True, check=True)
+        self._record_state(container_name, image_id, result.stdout.strip())
 
-        cmd.extend(
-            [
-                image_id,
-                "-c",
-                startup_script,
-            ]
+    def _record_state(self, container_name: str, image_id: str, container_id: str) -> None:
+        """Record the container's processes so later runs can check liveness without podman"""
+        result = subprocess.run(
+            ["podman", "inspect", container_name, "--format", "{{.State.Pid}} {{.State.ConmonPid}}"],
+            capture_output=True,
+            text=True,
+            check=False,
         )
+        try:
+            pid, conmon_pid = (int(field) for field in result.stdout.split())
+        except ValueError:
+            # Not fatal, later runs will just take the slow path
+            state.clear_state(container_name)
+            return
 
-        subprocess.run(cmd, check=True)
+        state.write_state(state.make_state(container_name, image_id, container_id, pid, conmon_pid))
 
     def stop(self, container_name: str) -> None:
         """Stop and remove container"""
-        # Stop the container - fail hard if it doesn't exist
-        subprocess.run(["podman", "stop", container_name], check=True)
-        # Remove the container - fail hard if it doesn't exist
-        subprocess.run(["podman", "rm", container_name], check=True)
+        state.clear_state(container_name)
+        # Fail hard if it doesn't exist
+        for action in ("stop", "rm"):
+            result = subprocess.run(["podman", action, container_name], capture_output=True, text=True, check=False)
+            if result.returncode != 0:
+                raise RuntimeError(f"podman {action} {container_name} failed: {result.stderr.strip()}")
+
+    def list_containers(self, stopped: bool = False) -> list[dict]:
+        """List undockit containers with a single podman ps"""
+        cmd = ["podman", "ps", "--filter", "name=^undockit-", "--format", "json"]
+        if stopped:
+            cmd.insert(2, "--all")
+        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"podman ps failed: {result.stderr.strip()}")
+        try:
+            return parse_container_list(json.loads(result.stdout or "[]"))
+        except ValueError:
+            raise RuntimeError("podman ps gave malformed output")
+
+    def list_images(self) -> list[dict]:
+        """List local images with a single podman images"""
+        result = subprocess.run(["podman", "images", "--format", "json"], capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"podman images failed: {result.stderr.strip()}")
+        try:
+            return parse_image_list(json.loads(result.stdout or "[]"))
+        except ValueError:
+            raise RuntimeError("podman images gave malformed output")
+
+    def remove_containers(self, container_names: list[str]) -> None:
+        """Force-remove containers with a single podman rm"""
+        if not container_names:
+            return
+        for name in container_names:
+            state.clear_state(name)
+        result = subprocess.run(
+            ["podman", "rm", "--force", "--ignore", *container_names], capture_output=True, text=True, check=False
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"podman rm failed: {result.stderr.strip()}")
+
+    def remove_images(self, image_ids: list[str]) -> None:
+        """Remove images with a single podman rmi"""
+        if not image_ids:
+            return
+        result = subprocess.run(["podman", "rmi", "--ignore", *image_ids], capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"podman rmi failed: {result.stderr.strip()}")
 
     def is_running(self, container_name: str) -> bool:
         """Check if container is currently running"""
+        # Fast path: the state record from start() and /proc
+        if state.is_known_running(container_name):
+            return True
+
         try:
             result = subprocess.run(
                 ["podman", "ps", "--filter", f"name={container_name}", "--format", "{{.Names}}"],
@@ -216,12 +578,22 @@ class PodmanBackend(Backend):
             # If podman command fails, assume not running
             return False
 
-    def exec(self, container_name: str, argv: list[str]) -> int:
+    def exec(self, container_name: str, argv: list[str], stdio: tuple[int, int, int] | None = None) -> int:
         """Execute command in container with proper workdir"""
         # Get current working directory and map to container path
         host_cwd = os.getcwd()
         container_workdir = f"/host{host_cwd}"
 
+        # Only our own terminal gets a TTY
+        tty = stdio is None and sys.stdin.isatty()
+        fds = stdio or (sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno())
+
+        # Hand our stdio straight to the container's exec server if it has one
+        env = exec_client.run_env(dict(os.environ), tty)
+        returncode = exec_client.run(exec_client.socket_path(container_name), argv, container_workdir, env, fds)
+        if returncode is not None:
+            return returncode
+
         # Build exec command - call our exec script with workdir and user command
         cmd = [
             "podman",
@@ -230,15 +602,51 @@ class PodmanBackend(Backend):
         ]
 
         # Add TTY flag if stdin is a terminal
-        if sys.stdin.isatty():
+        if tty:
             cmd.append("-t")
 
         cmd.extend([container_name, f"/tmp/undockit/{container_name}/exec", container_workdir] + argv)
 
         # Run with full stdin/stdout/stderr passthrough
-        result = subprocess.run(cmd, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, check=False)
+        result = subprocess.run(cmd, stdin=fds[0], stdout=fds[1], stderr=fds[2], check=False)
         return result.returncode
 
+    def pull(self, image: str) -> str:
+        """Pull with the podman CLI, then look up the digest it resolved to"""
+        result = subprocess.run(["podman", "pull", "-q", image], capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"Pull of {image} failed: {result.stderr.strip()}")
+
+        result = subprocess.run(
+            ["podman", "image", "inspect", image, "--format", "{{json .RepoDigests}}"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Inspect of {image} failed: {result.stderr.strip()}")
+        try:
+            repo_digests = json.loads(result.stdout) or []
+        except ValueError:
+            raise RuntimeError(f"Inspect of {image} gave malformed output")
+
+        return pinned_reference(image, repo_digests)
+
+    def events(self) -> EventStream:
+        """Follow container and image events with podman events"""
+        process = subprocess.Popen(
+            ["podman", "events", "--format", "json", "--filter", "type=container", "--filter", "type=image"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        return EventStream(process)
+
     def name(self, image_id: str) -> str:
         """Get container name for an image ID"""
-        return f"undockit-{os.getuid()}-{image_id[:12]}"
+        return get_container_name(image_id)
+
+
+trace.instrument(
+    PodmanBackend, "build", "image_exists", "inspect", "start", "stop", "is_running", "exec", "pull", "list_containers"
+)
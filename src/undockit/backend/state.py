@@ -0,0 +1,132 @@
+"""
+Per-container state records, so liveness can be checked without asking podman
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Shared with the container via the /tmp bind mount
+CONTROL_ROOT = Path("/tmp/undockit")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def control_dir(container_name: str) -> Path:
+    """Return the control directory shared with a container"""
+    return CONTROL_ROOT / container_name
+
+
+def make_state(container_name: str, image_id: str, container_id: str, pid: int, conmon_pid: int) -> dict:
+    """Make a state record for a freshly started container"""
+    return {
+        "name": container_name,
+        "image_id": image_id,
+        "container_id": container_id,
+        "pid": pid,
+        "conmon_pid": conmon_pid,
+        "control_dir": str(control_dir(container_name)),
+    }
+
+
+def process_matches(proc_root: Path, pid: int, marker: str) -> bool:
+    """Check a pid is a live process whose cgroup or command line mentions marker
+
+    The marker guards against the pid having been reused by something else.
+    """
+    if pid <= 0:
+        return False
+
+    process = proc_root / str(pid)
+    try:
+        # State is the field after the command name, which may contain spaces
+        stat = (process / "stat").read_text()
+        if stat.rpartition(")")[2].split()[0] in ("Z", "X"):
+            return False
+
+        if marker in (process / "cgroup").read_text():
+            return True
+        return marker in (process / "cmdline").read_bytes().decode(errors="replace")
+    except (OSError, IndexError):
+        return False
+
+
+def is_alive(state: dict, container_name: str, proc_root: Path = Path("/proc")) -> bool:
+    """Check whether a state record describes a container that's still running
+
+    Any doubt means False, so the caller can fall back to asking podman.
+    """
+    try:
+        if state["name"] != container_name or state["image_id"][:12] not in container_name:
+            return False
+
+        # The startup script is running and has deployed its exec script
+        if not (Path(state["control_dir"]) / "exec").exists():
+            return False
+
+        # The container's main process is in the container's cgroup, or at
+        # least has the container name in its startup script
+        if not (
+            process_matches(proc_root, state["pid"], state["container_id"])
+            or process_matches(proc_root, state["pid"], container_name)
+        ):
+            return False
+
+        # conmon is told the container ID on its command line
+        return process_matches(proc_root, state["conmon_pid"], state["container_id"])
+    except (KeyError, TypeError):
+        return False
+
+
+# --- System Interface Functions ---
+
+
+def read_state(container_name: str) -> dict | None:
+    """Read a container's state record, or None if there isn't a valid one"""
+    try:
+        return json.loads((control_dir(container_name) / "state.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_state(state: dict) -> None:
+    """Write a container's state record atomically"""
+    path = Path(state["control_dir"]) / "state.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".state.json.{os.getpid()}")
+    tmp_path.write_text(json.dumps(state))
+    os.replace(tmp_path, path)
+
+
+def clear_state(container_name: str) -> None:
+    """Remove a container's state record"""
+    try:
+        (control_dir(container_name) / "state.json").unlink()
+    except FileNotFoundError:
+        pass
+
+
+def reset_control_dir(container_name: str) -> None:
+    """Forget a container that's about to be replaced
+
+    The new container's startup script redeploys the exec script, so until
+    then its absence means the container isn't ready.
+    """
+    for name in ("state.json", "exec"):
+        try:
+            (control_dir(container_name) / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def is_ready(container_name: str) -> bool:
+    """Check whether a container's startup script has deployed its exec script"""
+    return (control_dir(container_name) / "exec").exists()
+
+
+def is_known_running(container_name: str) -> bool:
+    """Check from the state record alone whether a container is running"""
+    state = read_state(container_name)
+    return state is not None and is_alive(state, container_name)
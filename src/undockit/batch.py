@@ -0,0 +1,150 @@
+"""
+Batch mode - run a tool over many inputs through its warm containers, like xargs
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from undockit.backend import Backend
+from undockit.backend.base import thread_backend
+
+# Replaced by each input, like xargs -I{}; otherwise inputs are appended
+PLACEHOLDER = "{}"
+
+# xargs' exit status when any invocation failed
+FAILED_STATUS = 123
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def split_records(data: bytes, null: bool = False) -> list[str]:
+    """Split input into records, one per line or NUL separated
+
+    Blank lines are skipped, as xargs does; NUL separated records are taken
+    as they are, since they're usually file names.
+    """
+    if null:
+        records = data.split(b"\0")
+        if records and records[-1] == b"":
+            records.pop()
+    else:
+        records = [line.removesuffix(b"\r") for line in data.split(b"\n")]
+        records = [record for record in records if record.strip()]
+
+    return [os.fsdecode(record) for record in records]
+
+
+def build_argv(command: list[str], args: list[str], item: str) -> list[str]:
+    """Make the command line for one input"""
+    if any(PLACEHOLDER in arg for arg in args):
+        return command + [arg.replace(PLACEHOLDER, item) for arg in args]
+    return command + args + [item]
+
+
+def exit_status(returncodes: list[int | None]) -> int:
+    """Overall exit status: 0 if everything ran and passed, else 123"""
+    return 0 if all(code == 0 for code in returncodes) else FAILED_STATUS
+
+
+def summarize(returncodes: list[int | None], seconds: float) -> str:
+    """One line summary of a batch"""
+    ok = sum(1 for code in returncodes if code == 0)
+    skipped = sum(1 for code in returncodes if code is None)
+    failed = len(returncodes) - ok - skipped
+    return f"{len(returncodes)} items: {ok} ok, {failed} failed, {skipped} skipped in {seconds:.2f}s"
+
+
+# --- System Interface Functions ---
+
+
+def read_input(path: str | None) -> bytes:
+    """Read the batch's input from a file, or stdin if there's no path"""
+    if path is None or path == "-":
+        return sys.stdin.buffer.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class Batch:
+    """Runs a list of invocations across a worker pool
+
+    Each invocation's output is captured and written out whole, so outputs
+    never interleave; either in input order, or as soon as each finishes.
+    """
+
+    def __init__(self, backend: Backend, containers: list[str], jobs: int, fail_fast: bool = False):
+        self.backend = backend
+        self.containers = containers
+        self.jobs = max(1, jobs)
+        self.fail_fast = fail_fast
+        self.failed = threading.Event()
+        # Each worker gets a backend it doesn't have to share
+        self._backend = thread_backend(backend)
+
+    def run_one(self, index: int, argv: list[str]) -> tuple[int | None, bytes, bytes, float]:
+        """Run one invocation, capturing its output
+
+        Returns:
+            Exit code (None if skipped), stdout, stderr and how long it took
+        """
+        if self.fail_fast and self.failed.is_set():
+            return None, b"", b"", 0.0
+
+        container_name = self.containers[index % len(self.containers)]
+        start = time.monotonic()
+        with (
+            open(os.devnull, "rb") as stdin,
+            tempfile.TemporaryFile() as stdout,
+            tempfile.TemporaryFile() as stderr,
+        ):
+            try:
+                returncode = self._backend().exec(
+                    container_name, argv, (stdin.fileno(), stdout.fileno(), stderr.fileno())
+                )
+            except RuntimeError as e:
+                stderr.write(f"Error: {e}\n".encode())
+                returncode = 1
+            stdout.seek(0)
+            stderr.seek(0)
+            output, errors = stdout.read(), stderr.read()
+
+        if returncode != 0:
+            self.failed.set()
+        return returncode, output, errors, time.monotonic() - start
+
+    def run(self, argvs: list[list[str]], ordered: bool = True, on_result=None) -> list[int | None]:
+        """Run every invocation
+
+        Args:
+            argvs: Command lines to run
+            ordered: Report results in input order rather than as they finish
+            on_result: Called with (index, returncode, stdout, stderr, seconds)
+                for each invocation, from this thread
+
+        Returns:
+            Exit code of each invocation, None for those skipped
+        """
+        returncodes: list[int | None] = [None] * len(argvs)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self.run_one, index, argv): index for index, argv in enumerate(argvs)}
+            try:
+                done = futures if ordered else as_completed(futures)
+                for future in done:
+                    index = futures[future]
+                    returncode, output, errors, seconds = future.result()
+                    returncodes[index] = returncode
+                    if on_result:
+                        on_result(index, returncode, output, errors, seconds)
+            except KeyboardInterrupt:
+                # Let the running ones finish, but don't start any more
+                self.fail_fast = True
+                self.failed.set()
+                pool.shutdown(cancel_futures=True)
+                raise
+
+        return returncodes
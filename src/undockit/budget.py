@@ -0,0 +1,140 @@
+"""
+Memory budget - a cap on how much memory warm containers hold between them
+
+Set UNDOCKIT_MEMORY_BUDGET (e.g. "16G") and starting a container first stops
+idle ones, least recently used first, until the containers already running
+plus the new one's last known memory use fit. Containers with live exec
+sessions are never touched, so the budget can be overrun while they're busy.
+Each eviction is logged as a line of JSON to evictions.log in the cache dir.
+"""
+
+import json
+import os
+import time
+
+from undockit import cache
+from undockit.backend import Backend
+from undockit.lock import FileLock
+from undockit.pool import count_sessions
+from undockit.sizes import parse_size
+from undockit.status import idle_since, read_usage, stop_containers, tool_name
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def choose_evictions(containers: list[dict], budget: int, needed: int) -> list[dict]:
+    """Pick the idle containers to stop so that a new one fits in the budget
+
+    Args:
+        containers: Running containers, with memory, sessions and idle_since
+        budget: Bytes warm containers may hold between them
+        needed: Bytes the new container is expected to use
+
+    Returns:
+        Containers to stop, least recently used first
+    """
+    used = sum(container["memory"] for container in containers)
+    idle = sorted((c for c in containers if not c["sessions"]), key=lambda c: c["idle_since"])
+
+    evict = []
+    for container in idle:
+        if used + needed <= budget:
+            break
+        evict.append(container)
+        used -= container["memory"]
+    return evict
+
+
+# --- System Interface Functions ---
+
+
+def get_budget(env: dict[str, str]) -> int | None:
+    """The memory budget in bytes, or None if there isn't one"""
+    try:
+        return parse_size(env["UNDOCKIT_MEMORY_BUDGET"])
+    except (KeyError, ValueError):
+        return None
+
+
+def expected_memory(image_id: str) -> int:
+    """How much memory an image's containers were last seen using"""
+    try:
+        return int(cache.read("memory", image_id) or 0)
+    except ValueError:
+        return 0
+
+
+def log_eviction(entry: dict) -> None:
+    path = cache.get_cache_dir() / "evictions.log"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def running_containers(backend: Backend, exclude: str) -> list[dict]:
+    """Measure the running containers, remembering each image's memory use"""
+    containers = []
+    for container in backend.list_containers():
+        if container["name"] == exclude:
+            continue
+        memory = read_usage(container["pid"])["memory"]
+        if memory is not None:
+            cache.write("memory", container["image_id"], str(memory))
+        since = idle_since(container["name"])
+        containers.append(
+            {
+                "name": container["name"],
+                "image_id": container["image_id"],
+                "memory": memory or 0,
+                "sessions": count_sessions(container["name"]),
+                "idle_since": since if since is not None else container["started"] or 0,
+            }
+        )
+    return containers
+
+
+def make_room(backend: Backend, container_name: str, image_id: str) -> list[str]:
+    """Stop idle containers until a new one fits in the memory budget
+
+    Args:
+        backend: Backend the containers run on
+        container_name: Container about to be started
+        image_id: Image it's started from
+
+    Returns:
+        Names of the containers stopped
+    """
+    budget = get_budget(os.environ)
+    if budget is None:
+        return []
+
+    # Starts of different tools take turns, so they don't both evict for the same room
+    with FileLock("budget.lock"):
+        containers = running_containers(backend, container_name)
+        needed = expected_memory(image_id)
+        used = sum(container["memory"] for container in containers)
+        # An exec may have started since they were counted; leave those alone
+        evict = [c for c in choose_evictions(containers, budget, needed) if not count_sessions(c["name"])]
+        errors = stop_containers(backend, [container["name"] for container in evict])
+
+    now = time.time()
+    stopped = []
+    for container in evict:
+        if errors[container["name"]]:
+            continue
+        stopped.append(container["name"])
+        log_eviction(
+            {
+                "time": round(now, 3),
+                "container": container["name"],
+                "tool": tool_name(container["image_id"]),
+                "memory": container["memory"],
+                "idle_seconds": round(now - container["idle_since"], 1),
+                "budget": budget,
+                "used": used,
+                "needed": needed,
+                "for": container_name,
+            }
+        )
+    return stopped
@@ -0,0 +1,86 @@
+"""
+Persistent on-disk cache for undockit - small key/value files under XDG_CACHE_HOME
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def content_hash(data: bytes) -> str:
+    """Return a stable hex digest for some content"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_path(cache_dir: Path, namespace: str, key: str) -> Path:
+    """Return the file that holds a cache entry"""
+    return cache_dir / namespace / key
+
+
+def is_private(stat: os.stat_result, uid: int) -> bool:
+    """Check that a directory is ours and nobody else can get into it"""
+    return stat.st_uid == uid and not stat.st_mode & 0o077
+
+
+# --- System Interface Functions ---
+
+
+def get_cache_dir() -> Path:
+    """Get the undockit cache directory, next to the empty build context"""
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "undockit"
+
+
+def get_runtime_dir() -> Path:
+    """Get the per-user directory for sockets and locks, on tmpfs where possible"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    return Path(runtime_dir) / "undockit" if runtime_dir else Path(f"/tmp/undockit-{os.getuid()}")
+
+
+def make_private_dir(path: Path) -> Path:
+    """Create a directory for sockets only we can get into, tightening one of ours that's open
+
+    Raises:
+        PermissionError: If it belongs to someone else
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    stat = path.stat()
+    if stat.st_uid == os.getuid() and stat.st_mode & 0o077:
+        path.chmod(0o700)
+        stat = path.stat()
+    if not is_private(stat, os.getuid()):
+        raise PermissionError(f"{path} belongs to another user")
+    return path
+
+
+def read(namespace: str, key: str) -> str | None:
+    """Read a cache entry, or None if it doesn't exist"""
+    try:
+        return entry_path(get_cache_dir(), namespace, key).read_text()
+    except OSError:
+        return None
+
+
+def write(namespace: str, key: str, value: str) -> None:
+    """Write a cache entry atomically
+
+    Concurrent writers are fine; the last rename wins and readers never see
+    a partial file.
+    """
+    path = entry_path(get_cache_dir(), namespace, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp_path.write_text(value)
+    os.replace(tmp_path, path)
+
+
+def remove(namespace: str, key: str) -> None:
+    """Remove a cache entry if it exists"""
+    try:
+        entry_path(get_cache_dir(), namespace, key).unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,174 @@
+"""
+Thin client for undockitd, which tool runs go through when the daemon is up
+
+The daemon already knows the image, its command and whether its container is
+running, so a run only has to ask it and then exec. When there's no daemon
+the attempt costs a single failed connect, and the run goes the usual way.
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+from undockit import __version__, cache, trace
+
+# Values of UNDOCKIT_DAEMON that turn the daemon off
+DISABLED = ("0", "off", "no", "false")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_run_args(argv: list[str]) -> dict | None:
+    """Parse run's arguments as written in an install shebang, without argparse
+
+    Returns:
+        Dict of options, dockerfile and args, or None for anything unusual,
+        which is left to the full parser
+    """
+    options = {"timeout": 600, "replicas": 1, "rebuild": False, "host_paths": False, "path_options": []}
+    index = 0
+    while index < len(argv) and argv[index].startswith("-"):
+        name, has_value, value = argv[index].partition("=")
+        if name == "--rebuild" and not has_value:
+            options["rebuild"] = True
+        elif name == "--host-paths" and not has_value:
+            options["host_paths"] = True
+        elif name == "--path-option":
+            if not has_value:
+                index += 1
+                if index >= len(argv):
+                    return None
+                value = argv[index]
+            options["path_options"].append(value)
+        elif name in ("--timeout", "--replicas"):
+            if not has_value:
+                index += 1
+                if index >= len(argv):
+                    return None
+                value = argv[index]
+            try:
+                options[name[2:]] = int(value)
+            except ValueError:
+                return None
+        else:
+            return None
+        index += 1
+
+    if index >= len(argv):
+        return None
+
+    options["dockerfile"] = os.path.abspath(argv[index])
+    options["args"] = argv[index + 1 :]
+    return options
+
+
+# --- System Interface Functions ---
+
+
+def get_socket_path() -> Path:
+    """Get the daemon's socket path"""
+    return cache.get_runtime_dir() / "daemon.sock"
+
+
+def request(socket_path: Path, message: dict) -> dict | None:
+    """Send the daemon a request, or None if it's not there or goes away"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            return json.loads(reply.readline())
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+
+def spawn_daemon() -> None:
+    """Start the daemon in the background, detached from this run"""
+    import subprocess
+
+    import undockit
+
+    # Works from an install, a checkout or a zipapp alike, ahead of whatever
+    # the caller's PYTHONPATH already has
+    path = [os.path.dirname(os.path.dirname(undockit.__file__)), os.environ.get("PYTHONPATH")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, path)))
+    subprocess.Popen(
+        [sys.executable, "-c", "import sys; from undockit.daemon import main; sys.exit(main())"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        start_new_session=True,
+    )
+
+
+def run(argv: list[str]) -> int | None:
+    """Run a tool through the daemon
+
+    Args:
+        argv: Arguments to the run subcommand
+
+    Returns:
+        Exit code, or None to take the standalone path instead
+    """
+    mode = os.environ.get("UNDOCKIT_DAEMON", "")
+    if mode in DISABLED:
+        return None
+
+    options = parse_run_args(argv)
+    if options is None:
+        return None
+
+    response = request(
+        get_socket_path(),
+        {
+            "version": __version__,
+            "dockerfile": options["dockerfile"],
+            "rebuild": options["rebuild"],
+            "replicas": options["replicas"],
+            "timeout": options["timeout"],
+        },
+    )
+    if response is None:
+        if mode == "auto":
+            spawn_daemon()  # For next time; this run doesn't wait for it
+        return None
+
+    if "fallback" in response:
+        return None
+    if "error" in response:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        return 1
+
+    from undockit.backend import exec_client
+
+    container_name = response["container"]
+    args = options["args"]
+    if options["host_paths"] or os.environ.get("UNDOCKIT_HOST_PATHS"):
+        from undockit import paths
+
+        if paths.enabled(options["host_paths"], os.environ):
+            args = paths.translate_args(args, options["path_options"])
+    command = response["command"] + args
+
+    env = exec_client.run_env(dict(os.environ), sys.stdin.isatty())
+    returncode = exec_client.run(exec_client.socket_path(container_name), command, f"/host{os.getcwd()}", env)
+    if returncode is not None:
+        return returncode
+
+    # No exec server in this container
+    from undockit.backend import get_backend
+
+    try:
+        return get_backend().exec(container_name, command)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+trace.instrument(sys.modules[__name__], "request")
@@ -0,0 +1,285 @@
+"""
+undockitd - a per-user daemon that keeps image and container state in memory
+
+Tool runs ask it which container to exec in. It remembers the image ID for
+each dockerfile, each image's command and which containers are running, and
+follows the runtime's events so that a container stopping or an image being
+removed is noticed without asking again.
+
+It can be socket-activated by systemd, or spawned on demand by the client
+with UNDOCKIT_DAEMON=auto.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from undockit import __version__, cache, history
+from undockit.backend import Backend, get_backend
+from undockit.backend.exec_client import peer_uid
+from undockit.client import get_socket_path
+from undockit.lock import FileLock
+
+# Exit after this many seconds without a request; 0 means never
+DEFAULT_IDLE_TIMEOUT = 3600
+
+# Container events after which a container can't be assumed to be running
+STOPPED_ACTIONS = ("died", "stop", "kill", "remove", "cleanup")
+
+# Image events after which an image can't be assumed to exist
+REMOVED_ACTIONS = ("remove", "untag", "delete")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def file_key(path: Path, stat: os.stat_result) -> tuple:
+    """Identify a version of a file without reading it"""
+    return (str(path), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def listen_fd(env: dict[str, str], pid: int) -> int | None:
+    """Get the listening socket systemd passed us, if we were socket-activated"""
+    if env.get("LISTEN_PID") != str(pid):
+        return None
+    try:
+        return 3 if int(env.get("LISTEN_FDS", "0")) >= 1 else None
+    except ValueError:
+        return None
+
+
+# --- System Interface Functions ---
+
+
+def new_backend() -> Backend:
+    """Get a backend for the daemon's pool"""
+    return get_backend().clone()
+
+
+class Daemon:
+    """In-memory image and container state, kept fresh by runtime events"""
+
+    def __init__(self, backend_factory=new_backend):
+        self.backend_factory = backend_factory
+        self.lock = threading.Lock()
+
+        # Every connection gets a thread of its own, so backends are pooled
+        # rather than made for each one
+        self.backends: list[Backend] = []
+
+        self.images: dict[tuple, str] = {}
+        self.commands: dict[str, list[str]] = {}
+        self.running: set[str] = set()
+
+        # Without events, running containers have to be checked every time
+        self.watching = False
+        self.events = None
+        self.last_request = time.monotonic()
+
+    @contextmanager
+    def borrow(self):
+        """Take a backend no other request is using, making one if they all are"""
+        with self.lock:
+            backend = self.backends.pop() if self.backends else None
+        if backend is None:
+            backend = self.backend_factory()
+        try:
+            yield backend
+        finally:
+            with self.lock:
+                self.backends.append(backend)
+
+    def resolve(self, dockerfile: Path, rebuild: bool = False, replicas: int = 1, timeout: int = 600) -> dict:
+        """Make sure a dockerfile's container is running
+
+        Returns:
+            Dict with the image ID, container name and the image's command
+        """
+        try:
+            key = file_key(dockerfile, dockerfile.stat())
+        except OSError:
+            raise RuntimeError(f"Dockerfile not found: {dockerfile}")
+
+        with self.borrow() as backend:
+            start = time.monotonic()
+            with self.lock:
+                image_id = None if rebuild else self.images.get(key)
+            if image_id is None:
+                image_id = backend.get_image(dockerfile, rebuild=rebuild)
+                with self.lock:
+                    self.images[key] = image_id
+
+            container_name = backend.name(image_id)
+            started = False
+            if replicas > 1:
+                from undockit.pool import pick_replica
+
+                container_name, needs_start = pick_replica(backend, container_name, replicas)
+                if needs_start:
+                    started = backend.ensure_running(container_name, image_id, history.timeout_for(dockerfile, timeout))
+            else:
+                with self.lock:
+                    known = self.watching and container_name in self.running
+                if not known:
+                    started = backend.ensure_running(container_name, image_id, history.timeout_for(dockerfile, timeout))
+                    with self.lock:
+                        self.running.add(container_name)
+            history.record(dockerfile, time.monotonic() - start if started else None)
+
+            with self.lock:
+                command = self.commands.get(image_id)
+            if command is None:
+                command = backend.command(image_id)
+                with self.lock:
+                    self.commands[image_id] = command
+
+        return {"image_id": image_id, "container": container_name, "command": command}
+
+    def handle_event(self, event: dict) -> None:
+        """Forget whatever an event makes stale"""
+        with self.lock:
+            if event["type"] == "container" and event["action"] in STOPPED_ACTIONS:
+                self.running.discard(event["name"])
+            elif event["type"] == "image" and event["action"] in REMOVED_ACTIONS and event["id"]:
+                self.images = {key: value for key, value in self.images.items() if not value.startswith(event["id"])}
+                self.commands = {key: value for key, value in self.commands.items() if not key.startswith(event["id"])}
+
+    def watch(self) -> None:
+        """Follow runtime events for as long as the daemon runs"""
+        backend = self.backend_factory()
+        while True:
+            try:
+                self.events = backend.events()
+                with self.lock:
+                    self.watching = True
+                for event in self.events:
+                    self.handle_event(event)
+            except (RuntimeError, OSError):
+                pass
+
+            # Lost track, so stop trusting what we know until we're back
+            with self.lock:
+                self.watching = False
+                self.running.clear()
+            time.sleep(1)
+
+    def handle(self, request: dict) -> dict:
+        """Answer a client request"""
+        self.last_request = time.monotonic()
+
+        # A client from another version may not mean the same things
+        if request.get("version") != __version__:
+            return {"fallback": f"daemon is version {__version__}"}
+
+        try:
+            return self.resolve(
+                Path(request["dockerfile"]),
+                rebuild=bool(request.get("rebuild")),
+                replicas=int(request.get("replicas", 1)),
+                timeout=int(request.get("timeout", 600)),
+            )
+        except Exception as e:
+            # Anything goes wrong, the daemon keeps running for the next client
+            return {"error": str(e)}
+
+    def close(self) -> None:
+        if self.events is not None:
+            self.events.close()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON response line out"""
+
+    def handle(self):
+        # Only our own runs, whoever else can reach the socket
+        try:
+            if peer_uid(self.request) != os.getuid():
+                return
+        except OSError:
+            return
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        response = self.server.daemon.handle(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, daemon: Daemon, socket_path: Path | None = None, fd: int | None = None):
+        self.daemon = daemon
+        if fd is not None:
+            # Socket-activated: systemd already bound and listens on it
+            super().__init__(str(socket_path or ""), Handler, bind_and_activate=False)
+            self.socket.close()
+            self.socket = socket.socket(fileno=fd)
+        else:
+            super().__init__(str(socket_path), Handler)
+
+
+def serve(socket_path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> int:
+    """Run the daemon until it's been idle for idle_timeout seconds"""
+    fd = listen_fd(os.environ, os.getpid())
+    if fd is None:
+        # Without XDG_RUNTIME_DIR this is in the shared /tmp
+        try:
+            cache.make_private_dir(socket_path.parent)
+        except PermissionError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    try:
+        # Only one daemon per user, so a racing spawn just leaves
+        instance = FileLock("daemon.lock", timeout=0)
+        instance.acquire()
+    except RuntimeError:
+        print("undockitd is already running", file=sys.stderr)
+        return 0
+
+    daemon = Daemon()
+    if fd is None:
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
+    server = Server(daemon, socket_path, fd)
+
+    threading.Thread(target=daemon.watch, daemon=True).start()
+
+    def idle_check():
+        while time.monotonic() - daemon.last_request < idle_timeout:
+            time.sleep(min(idle_timeout, 10))
+        server.shutdown()
+
+    if idle_timeout:
+        threading.Thread(target=idle_check, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        daemon.close()
+        server.server_close()
+        if fd is None:
+            try:
+                socket_path.unlink()
+            except FileNotFoundError:
+                pass
+        instance.release()
+    return 0
+
+
+def main() -> int:
+    """Entry point for the daemon when spawned directly"""
+    return serve(get_socket_path())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
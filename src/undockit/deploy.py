@@ -2,25 +2,95 @@
 Binary deployment for undockit - installs the undockit zipapp to target directory
 """
 
-import zipapp
+import hashlib
+import json
+import os
 import tempfile
 import shutil
 import subprocess
+import zipfile
 from pathlib import Path
 from typing import Optional
 
 import undockit
 
+# How the deployed binary is built
+DEFAULT_MAIN_MODULE = "undockit.main:main"
+DEFAULT_SHEBANG = "/usr/bin/env python3"
+
+# Compiles every source file under a directory into a sibling .pyc, run by the
+# target interpreter so the bytecode matches it. Unchecked hash-based pycs are
+# used because zipimport would otherwise compare them against the source's
+# timestamp in the archive.
+COMPILE_SCRIPT = """
+import pathlib, py_compile, sys
+root = pathlib.Path(sys.argv[1])
+for source in root.rglob("*.py"):
+    py_compile.compile(
+        str(source),
+        cfile=str(source.with_suffix(".pyc")),
+        dfile=source.relative_to(root).as_posix(),
+        doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+"""
+
+# Prints an interpreter's bytecode magic number, which changes with its version
+MAGIC_SCRIPT = "import importlib.util, sys; sys.stdout.write(importlib.util.MAGIC_NUMBER.hex())"
+
 
 # --- Pure Logic Functions (testable) ---
 
 
+def parse_archive_comment(comment: bytes) -> Optional[dict]:
+    """Parse the metadata stored in a zipapp's archive comment"""
+    try:
+        metadata = json.loads(comment.decode())
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+    return metadata if isinstance(metadata, dict) else None
+
+
+def source_hash(source_dir: Path, version: str, main_module: str, python_shebang: str, magic: str = "") -> str:
+    """Hash everything that goes into a zipapp, so unchanged deploys can be skipped
+
+    Args:
+        magic: Bytecode magic number of the interpreter an optimized archive
+            is compiled for, as the same shebang can run a newer python later
+    """
+    digest = hashlib.sha256()
+    for value in (version, main_module, python_shebang, magic):
+        digest.update(value.encode() + b"\0")
+
+    for path in sorted(source_dir.rglob("*")):
+        if path.is_file() and "__pycache__" not in path.parts and path.suffix != ".pyc":
+            digest.update(path.relative_to(source_dir).as_posix().encode() + b"\0")
+            digest.update(path.read_bytes() + b"\0")
+
+    return digest.hexdigest()
+
+
+def get_archive_metadata(binary_path: Path) -> Optional[dict]:
+    """Read the metadata embedded in a deployed zipapp without running it"""
+    try:
+        with zipfile.ZipFile(binary_path) as zf:
+            return parse_archive_comment(zf.comment)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
 def get_installed_version(binary_path: Path) -> Optional[str]:
     """Get version of installed undockit binary, or None if not installed"""
     if not binary_path.exists():
         return None
 
-    # Try to execute it and get version
+    # Read it from the archive if it's one of ours
+    metadata = get_archive_metadata(binary_path)
+    if metadata and metadata.get("version"):
+        return metadata["version"]
+
+    # Older binaries don't have metadata, so try to execute it and get version
     try:
         result = subprocess.run([str(binary_path), "--version"], capture_output=True, text=True, timeout=5)
         if result.returncode == 0:
@@ -44,29 +114,83 @@ def needs_update(binary_path: Path, current_version: str) -> bool:
     return installed != current_version
 
 
+def compile_tree(tree: Path, python: str) -> bool:
+    """Compile a directory of sources to bytecode for the given interpreter
+
+    Returns:
+        True if it worked, False if the archive will have to make do with source
+    """
+    try:
+        result = subprocess.run([python, "-c", COMPILE_SCRIPT, str(tree)], capture_output=True, check=False)
+    except OSError:
+        return False
+
+    return result.returncode == 0
+
+
+def bytecode_magic(python_shebang: str) -> str:
+    """Get the bytecode magic number of the interpreter a shebang runs, or "" if it can't be run"""
+    python = shebang_python(python_shebang)
+    if not python:
+        return ""
+    try:
+        result = subprocess.run([python, "-c", MAGIC_SCRIPT], capture_output=True, text=True, check=False)
+    except OSError:
+        return ""
+
+    return result.stdout if result.returncode == 0 else ""
+
+
+def shebang_python(python_shebang: str) -> Optional[str]:
+    """Find the interpreter a shebang line will run"""
+    words = python_shebang.split()
+    if not words:
+        return None
+
+    # "/usr/bin/env python3" runs whatever python3 is on the PATH
+    if os.path.basename(words[0]) == "env" and len(words) > 1:
+        return shutil.which(words[-1])
+
+    return words[0]
+
+
 def create_zipapp(
     source_dir: Path,
     output_path: Path,
-    main_module: str = "undockit.main:main",
-    python_shebang: str = "/usr/bin/env python3",
-) -> None:
+    main_module: str = DEFAULT_MAIN_MODULE,
+    python_shebang: str = DEFAULT_SHEBANG,
+    optimize: bool = False,
+) -> str:
     """Create a zipapp from source directory
 
+    In optimized mode the archive also carries bytecode compiled for the
+    shebang's interpreter. The bytecode is stored uncompressed, so imports
+    neither compile nor inflate anything; the sources are only there for
+    tracebacks and stay compressed.
+
     Args:
         source_dir: Directory containing the package source
         output_path: Where to write the zipapp
         main_module: Entry point in module:function format
         python_shebang: Shebang line for the zipapp
+        optimize: Precompile bytecode for faster startup
+
+    Returns:
+        Content hash of the archive's inputs, also stored in its metadata
     """
     from . import __version__
 
+    digest = source_hash(
+        source_dir, __version__, main_module, python_shebang, bytecode_magic(python_shebang) if optimize else ""
+    )
+
     # Create a temporary directory for the zipapp contents
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
 
         # Copy the package to the temp directory
         pkg_name = source_dir.name
-        shutil.copytree(source_dir, tmp_path / pkg_name)
+        shutil.copytree(source_dir, tmp_path / pkg_name, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
 
         # Overwrite __version__.py with hardcoded version
         version_file = tmp_path / pkg_name / "__version__.py"
@@ -75,25 +199,38 @@ def create_zipapp(
         # Create __main__.py
         main_content = f"""#!/usr/bin/env python3
 import sys
-from {main_module.replace(':', ' import ')}
+from {main_module.replace(":", " import ")}
 
 if __name__ == '__main__':
     sys.exit(main())
 """
         (tmp_path / "__main__.py").write_text(main_content)
 
-        # Create the zipapp
-        zipapp.create_archive(
-            source=tmp_path,
-            target=output_path,
-            interpreter=python_shebang,
-            main=None,  # We already have __main__.py
-            compressed=True,
-        )
+        # Fall back to a source-only archive if it can't be compiled, without
+        # whatever bytecode was written before it failed
+        python = shebang_python(python_shebang) if optimize else None
+        optimized = bool(python) and compile_tree(tmp_path, python)
+        if python and not optimized:
+            for path in tmp_path.rglob("*.pyc"):
+                path.unlink()
+
+        metadata = {"name": pkg_name, "version": __version__, "hash": digest, "optimized": optimized}
+
+        # Create the zipapp: a shebang line followed by a zip archive
+        with open(output_path, "wb") as f:
+            f.write(f"#!{python_shebang}\n".encode())
+            with zipfile.ZipFile(f, "w") as zf:
+                for path in sorted(tmp_path.rglob("*")):
+                    if path.is_file():
+                        compress_type = zipfile.ZIP_STORED if path.suffix == ".pyc" else zipfile.ZIP_DEFLATED
+                        zf.write(path, path.relative_to(tmp_path).as_posix(), compress_type=compress_type)
+                zf.comment = json.dumps(metadata).encode()
 
         # Make executable
         output_path.chmod(0o755)
 
+    return digest
+
 
 def find_package_source() -> Path:
     """Find the source directory of the undockit package"""
@@ -122,24 +259,26 @@ def ensure_binary(target_dir: Path, binary_name: str = "undockit", force: bool =
 
     binary_path = target_dir / binary_name
 
-    # Check if update needed
-    if not force and not needs_update(binary_path, __version__):
-        return None  # Already up to date
-
     # Find source directory
     source_dir = find_package_source()
 
-    # Create zipapp in temp location
-    with tempfile.NamedTemporaryFile(suffix=".pyz", delete=False) as tmp:
-        tmp_path = Path(tmp.name)
+    # Check if update needed, by hash for binaries that have one
+    if not force:
+        metadata = get_archive_metadata(binary_path)
+        if metadata and metadata.get("hash"):
+            magic = bytecode_magic(DEFAULT_SHEBANG)
+            if metadata["hash"] == source_hash(source_dir, __version__, DEFAULT_MAIN_MODULE, DEFAULT_SHEBANG, magic):
+                return None  # Already up to date
+        elif not needs_update(binary_path, __version__):
+            return None  # Already up to date
 
-    try:
-        create_zipapp(source_dir, tmp_path)
-
-        # Move to final location
-        shutil.move(str(tmp_path), str(binary_path))
-        binary_path.chmod(0o755)
+    # Create zipapp next to the target, so it can be renamed into place
+    # atomically while other processes may be running the old one
+    tmp_path = target_dir / f".{binary_name}.{os.getpid()}.tmp"
 
+    try:
+        create_zipapp(source_dir, tmp_path, optimize=True)
+        os.replace(tmp_path, binary_path)
         return binary_path
     finally:
         # Clean up temp file if it still exists
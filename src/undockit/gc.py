@@ -0,0 +1,203 @@
+"""
+Garbage collection - images and containers left behind as tools change
+
+Every build records which tool it was for, so the images undockit made can
+be grouped by tool. A tool's current image is the one its dockerfile builds
+to now, or its newest one if it's been edited and not rebuilt yet; older
+ones are superseded, and once the tool's file is gone all of its images
+are. Superseded images beyond a few recent ones kept for going back, and
+the containers still using them, are removed. Stopped containers
+left behind are removed too, and running ones with live execs never are.
+
+The runtime is asked once for all images and once for all containers, and
+removals are one bulk call each.
+"""
+
+from pathlib import Path
+
+from undockit import cache
+from undockit.backend import Backend
+from undockit.pool import count_sessions
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def plan(
+    index: dict[str, dict],
+    current: set[str],
+    images: list[dict],
+    containers: list[dict],
+    keep: int = 0,
+    max_size: int | None = None,
+) -> dict:
+    """Work out what to remove
+
+    Args:
+        index: Images undockit built, each with its tool and when it was built
+        current: IDs of the images tools build to now
+        images: Local images, with id, size, shared and created
+        containers: Undockit containers, with name, image_id, running and sessions
+        keep: Superseded images to keep per tool, most recent first
+        max_size: Bytes undockit's images may take in layers of their own,
+            removing the oldest superseded ones kept until they fit
+
+    Returns:
+        Dict with images and containers to remove, the bytes it reclaims, the
+        bytes kept, and index entries for images that are already gone
+    """
+    # Wrappers share nearly all their layers with their base, which removing
+    # one doesn't free, so only the rest counts
+    sizes = {image["id"]: image["size"] - image["shared"] for image in images}
+    in_use = {container["image_id"] for container in containers if container["sessions"]}
+
+    by_tool = {}
+    for image_id, entry in index.items():
+        if image_id in sizes:
+            by_tool.setdefault(entry["tool"], []).append(image_id)
+
+    remove, kept = [], []
+    for tool, image_ids in by_tool.items():
+        superseded = sorted(
+            (image_id for image_id in image_ids if image_id not in current),
+            key=lambda image_id: index[image_id]["built"],
+            reverse=True,
+        )
+        tool_keep = keep if any(image_id in current for image_id in image_ids) else 0
+        kept += superseded[:tool_keep]
+        remove += superseded[tool_keep:]
+
+    # Over budget: the oldest superseded images go first
+    if max_size is not None:
+        total = sum(sizes[image_id] for image_id in index if image_id in sizes and image_id not in remove)
+        for image_id in sorted(kept, key=lambda image_id: index[image_id]["built"]):
+            if total <= max_size:
+                break
+            remove.append(image_id)
+            total -= sizes[image_id]
+
+    # Busy containers keep their images
+    remove = sorted(image_id for image_id in remove if image_id not in in_use)
+    doomed = set(remove)
+    remove_containers = sorted(
+        container["name"]
+        for container in containers
+        if not container["sessions"] and (container["image_id"] in doomed or not container["running"])
+    )
+
+    return {
+        "images": remove,
+        "containers": remove_containers,
+        "reclaimed": sum(sizes[image_id] for image_id in remove),
+        "kept": sum(sizes[image_id] for image_id in index if image_id in sizes and image_id not in doomed),
+        "forget": sorted(image_id for image_id in index if image_id not in sizes),
+    }
+
+
+def newest_image(index: dict[str, dict], tool: str) -> str:
+    """The most recently built of a tool's images"""
+    return max(
+        (image_id for image_id, entry in index.items() if entry["tool"] == tool), key=lambda i: index[i]["built"]
+    )
+
+
+def format_plan(result: dict, dry_run: bool) -> str:
+    from undockit.models import format_size
+
+    verb = "Would remove" if dry_run else "Removed"
+    lines = [f"{verb} container {name}" for name in result["containers"]]
+    lines += [f"{verb} image {image_id[:12]}" for image_id in result["images"]]
+    reclaimed = "would reclaim" if dry_run else "reclaimed"
+    lines.append(
+        f"{len(result['images'])} images and {len(result['containers'])} containers, "
+        f"{reclaimed} {format_size(result['reclaimed'])}, {format_size(result['kept'])} kept"
+    )
+    return "\n".join(lines)
+
+
+# --- System Interface Functions ---
+
+
+def load_index() -> dict[str, dict]:
+    """The images undockit built, from the tool each build recorded"""
+    index = {}
+    try:
+        entries = list((cache.get_cache_dir() / "tools").iterdir())
+    except OSError:
+        return index
+    for path in entries:
+        try:
+            index[path.name] = {"tool": path.read_text(), "built": path.stat().st_mtime}
+        except OSError:
+            pass
+    return index
+
+
+def current_images(index: dict[str, dict]) -> set[str]:
+    """The images tools' dockerfiles build to as they are now
+
+    A tool that's been edited but not run since has no such image yet, so
+    its newest one counts instead, as its warm containers may be using it.
+    """
+    current = set()
+    for tool in {entry["tool"] for entry in index.values()}:
+        try:
+            image_id = cache.read("images", cache.content_hash(Path(tool).read_bytes()))
+        except OSError:
+            continue  # The tool's gone
+        current.add(image_id or newest_image(index, tool))
+    return current
+
+
+def forget(image_ids: list[str]) -> None:
+    """Drop the cache entries for images that no longer exist"""
+    gone = set(image_ids)
+    cache_dir = cache.get_cache_dir()
+    for namespace in ("tools", "metadata", "memory"):
+        for image_id in gone:
+            (cache_dir / namespace / image_id).unlink(missing_ok=True)
+
+    try:
+        entries = list((cache_dir / "images").iterdir())
+    except OSError:
+        return
+    for path in entries:
+        try:
+            if path.read_text() in gone:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def collect(backend: Backend, keep: int = 0, max_size: int | None = None) -> dict:
+    """Find what to remove, asking the runtime once for images and once for containers"""
+    index = load_index()
+    images = backend.list_images()
+    containers = backend.list_containers(stopped=True)
+    for container in containers:
+        container["sessions"] = count_sessions(container["name"]) if container["running"] else 0
+    return plan(index, current_images(index), images, containers, keep, max_size)
+
+
+def gc(backend: Backend, keep: int = 0, max_size: int | None = None, dry_run: bool = False) -> dict:
+    """Remove superseded images and abandoned containers
+
+    Args:
+        backend: Backend to use
+        keep: Superseded images to keep per tool
+        max_size: Bytes undockit's images may take
+        dry_run: Only report what would be removed
+
+    Returns:
+        The plan, as from plan()
+
+    Raises:
+        RuntimeError: If the runtime can't be asked or removing fails
+    """
+    result = collect(backend, keep, max_size)
+    if not dry_run:
+        # Containers first, as images can't go while containers use them
+        backend.remove_containers(result["containers"])
+        backend.remove_images(result["images"])
+        forget(result["images"] + result["forget"])
+    return result
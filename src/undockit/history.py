@@ -0,0 +1,291 @@
+"""
+Invocation history - when each tool runs, so its containers are kept warm for as long as is useful
+
+Each run appends a line to its tool's history file. When a container starts,
+its idle timeout is picked from the gaps between recent runs: long enough to
+catch most of the next runs, within UNDOCKIT_TIMEOUT_MIN and
+UNDOCKIT_TIMEOUT_MAX. Tools without much history keep their shebang's
+--timeout, as does everything with UNDOCKIT_ADAPTIVE_TIMEOUT=0.
+"""
+
+import os
+import time
+from pathlib import Path
+
+from undockit import cache
+
+DEFAULT_MIN_TIMEOUT = 60
+DEFAULT_MAX_TIMEOUT = 3600
+
+# Runs remembered per tool, and when to trim the file back down to them
+KEEP_RUNS = 128
+MAX_FILE_SIZE = 8192
+
+# Gaps needed before the history is trusted over the shebang's timeout
+MIN_GAPS = 5
+
+# Fraction of next runs the timeout should catch, with some margin on top
+COVERAGE = 0.9
+MARGIN = 1.2
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_history(text: str) -> tuple[str, list[float], list[float]]:
+    """Parse a history file
+
+    Returns:
+        The tool's path, run start times, and how long each cold start took
+    """
+    path, times, cold = "", [], []
+    for line in text.splitlines():
+        if line.startswith("# "):
+            path = line[2:]
+            continue
+        fields = line.split()
+        try:
+            when = float(fields[0])
+            if len(fields) > 1:
+                cold.append(float(fields[1]))
+        except (IndexError, ValueError):
+            continue
+        # Trimmed files keep cold start times on lines of their own, at time 0
+        if when > 0:
+            times.append(when)
+    return path, times, cold
+
+
+def gaps_between(times: list[float]) -> list[float]:
+    """Seconds between consecutive runs"""
+    ordered = sorted(times)
+    return [after - before for before, after in zip(ordered, ordered[1:])]
+
+
+def choose_timeout(gaps: list[float], default: int, minimum: int, maximum: int) -> int:
+    """Pick an idle timeout that catches most next runs without holding on for nothing
+
+    Gaps shorter than the minimum are caught by any timeout, so only longer
+    ones count. If most of those are longer than the maximum too, the tool is
+    used too rarely for keeping it warm to pay off.
+
+    Args:
+        gaps: Seconds between recent runs
+        default: Timeout to use without enough history
+        minimum: Shortest timeout to pick
+        maximum: Longest timeout to pick
+
+    Returns:
+        Idle timeout in seconds
+    """
+    if len(gaps) < MIN_GAPS:
+        return default
+
+    long_gaps = sorted(gap for gap in gaps if gap > minimum)
+    if not long_gaps:
+        return minimum
+
+    reachable = [gap for gap in long_gaps if gap <= maximum]
+    if len(reachable) < len(long_gaps) / 2:
+        return minimum
+
+    index = min(len(reachable) - 1, int(len(reachable) * COVERAGE))
+    return int(min(maximum, max(minimum, reachable[index] * MARGIN)))
+
+
+def simulate(gaps: list[float], timeout: float) -> tuple[int, float]:
+    """Replay a history with a given timeout
+
+    Returns:
+        How many runs would have cold-started, and the seconds spent warm and idle
+    """
+    cold, held = 0, 0.0
+    for gap in gaps:
+        if gap <= timeout:
+            held += gap
+        else:
+            cold += 1
+            held += timeout
+    return cold, held
+
+
+def summarize(tool: str, times: list[float], cold: list[float], fixed: int, bounds: tuple[int, int]) -> dict:
+    """Compare a tool's fixed timeout with the one its history picks
+
+    Both are replayed over the history: the cold starts the adaptive timeout
+    avoids are worth the tool's average cold start time each, and cost the
+    extra seconds its container is held warm.
+
+    Returns:
+        Report row dict
+    """
+    gaps = gaps_between(times)
+    adaptive = choose_timeout(gaps, fixed, *bounds)
+    cold_fixed, held_fixed = simulate(gaps, fixed)
+    cold_adaptive, held_adaptive = simulate(gaps, adaptive)
+    cold_seconds = sum(cold) / len(cold) if cold else None
+    return {
+        "tool": tool,
+        "runs": len(times),
+        "cold_seconds": cold_seconds,
+        "fixed_timeout": fixed,
+        "timeout": adaptive,
+        "fixed_cold_starts": cold_fixed,
+        "cold_starts": cold_adaptive,
+        "saved_seconds": None if cold_seconds is None else (cold_fixed - cold_adaptive) * cold_seconds,
+        "extra_warm_seconds": held_adaptive - held_fixed,
+    }
+
+
+def format_report(rows: list[dict]) -> str:
+    """Format history report rows as a table"""
+    lines = [
+        f"{'tool':<16}{'runs':>6}{'timeout':>9}{'was':>7}{'cold':>6}{'was':>6}{'saved':>9}"
+        f"{'extra warm':>12}{'memory':>14}"
+    ]
+    for row in rows:
+        saved = "-" if row["saved_seconds"] is None else f"{row['saved_seconds']:.1f}s"
+        memory = "-" if row.get("memory_seconds") is None else f"{row['memory_seconds'] / 2**30:.2f}GiB*s"
+        lines.append(
+            f"{row['tool']:<16}{row['runs']:>6}{row['timeout']:>8}s{row['fixed_timeout']:>6}s"
+            f"{row['cold_starts']:>6}{row['fixed_cold_starts']:>6}{saved:>9}"
+            f"{row['extra_warm_seconds']:>11.0f}s{memory:>14}"
+        )
+    return "\n".join(lines)
+
+
+def format_line(when: float, cold_seconds: float | None) -> str:
+    if cold_seconds is None:
+        return f"{when:.3f}\n"
+    return f"{when:.3f} {cold_seconds:.3f}\n"
+
+
+# --- System Interface Functions ---
+
+
+def history_path(dockerfile: Path) -> Path:
+    """Where a tool's history is kept"""
+    return cache.entry_path(cache.get_cache_dir(), "history", cache.content_hash(str(dockerfile).encode()))
+
+
+def read_history(path: Path) -> tuple[str, list[float], list[float]]:
+    try:
+        return parse_history(path.read_text())
+    except OSError:
+        return "", [], []
+
+
+def record(dockerfile: Path, cold_seconds: float | None = None) -> None:
+    """Add a run to a tool's history
+
+    Args:
+        dockerfile: The tool
+        cold_seconds: How long starting its container took, if this run did
+    """
+    dockerfile = dockerfile.absolute()
+    path = history_path(dockerfile)
+    line = format_line(time.time(), cold_seconds)
+    try:
+        # One small append, so concurrent runs don't interleave
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except OSError:
+        return  # History is nice to have, never worth failing a run over
+
+    try:
+        if os.fstat(fd).st_size == 0:
+            line = f"# {dockerfile}\n{line}"
+        os.write(fd, line.encode())
+        too_big = os.fstat(fd).st_size > MAX_FILE_SIZE
+    finally:
+        os.close(fd)
+
+    if too_big:
+        trim(path)
+
+
+def trim(path: Path) -> None:
+    """Cut a history file down to its most recent runs"""
+    tool, times, cold = read_history(path)
+    lines = [f"# {tool}\n"] + [format_line(when, None) for when in sorted(times)[-KEEP_RUNS:]]
+    # Cold start times are kept as their own lines, so the average survives
+    lines += [format_line(0, seconds) for seconds in cold[-KEEP_RUNS // 4 :]]
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp_path.write_text("".join(lines))
+    os.replace(tmp_path, path)
+
+
+def get_bounds(env: dict[str, str]) -> tuple[int, int] | None:
+    """Timeout bounds from the environment, or None if adaptive timeouts are off"""
+    if env.get("UNDOCKIT_ADAPTIVE_TIMEOUT", "") in ("0", "off", "no", "false"):
+        return None
+    try:
+        minimum = int(env.get("UNDOCKIT_TIMEOUT_MIN", DEFAULT_MIN_TIMEOUT))
+        maximum = int(env.get("UNDOCKIT_TIMEOUT_MAX", DEFAULT_MAX_TIMEOUT))
+    except ValueError:
+        return None
+    return minimum, max(minimum, maximum)
+
+
+def timeout_for(dockerfile: Path, default: int) -> int:
+    """Pick the idle timeout for a tool's container from its history"""
+    bounds = get_bounds(os.environ)
+    if bounds is None:
+        return default
+    _, times, _ = read_history(history_path(dockerfile.absolute()))
+    return choose_timeout(gaps_between(times), default, *bounds)
+
+
+def list_histories() -> list[Path]:
+    """Every tool's history file"""
+    try:
+        return sorted((cache.get_cache_dir() / "history").iterdir())
+    except OSError:
+        return []
+
+
+def report(backend=None) -> list[dict]:
+    """Compare fixed and adaptive timeouts for every tool with a history
+
+    Memory-seconds are only known for tools whose container is running now,
+    from its current memory use.
+
+    Args:
+        backend: Backend to find running containers with, if any
+
+    Returns:
+        Report row dicts, sorted by tool
+    """
+    from undockit.status import read_usage
+    from undockit.warm import read_options
+
+    bounds = get_bounds(os.environ) or (DEFAULT_MIN_TIMEOUT, DEFAULT_MAX_TIMEOUT)
+
+    memory = {}
+    if backend is not None:
+        try:
+            for container in backend.list_containers():
+                memory.setdefault(container["image_id"], read_usage(container["pid"])["memory"])
+        except RuntimeError:
+            pass
+
+    rows = []
+    for path in list_histories():
+        tool, times, cold = read_history(path)
+        if not tool:
+            continue
+        options = read_options(Path(tool))
+        row = summarize(os.path.basename(tool), times, cold, options["timeout"] if options else 600, bounds)
+
+        try:
+            image_id = cache.read("images", cache.content_hash(Path(tool).read_bytes()))
+        except OSError:
+            image_id = None
+        used = memory.get(image_id)
+        row["memory_seconds"] = None if used is None else row["extra_warm_seconds"] * used
+        rows.append(row)
+
+    return sorted(rows, key=lambda row: row["tool"])
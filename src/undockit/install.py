@@ -5,7 +5,9 @@ Tool installation functionality for undockit
 import os
 import sys
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Sequence
+
+from undockit.resources import make_labels
 
 
 # --- Pure Logic Functions (testable) ---
@@ -80,20 +82,46 @@ def extract_name(image: str) -> str:
     return image
 
 
-def make_dockerfile(image: str, timeout: int = 600) -> str:
-    """Generate wrapper dockerfile with shebang"""
+def make_dockerfile(
+    image: str,
+    timeout: int = 600,
+    replicas: int = 1,
+    source: Optional[str] = None,
+    host_paths: bool = False,
+    path_options: Sequence[str] = (),
+    resources: Optional[dict] = None,
+) -> str:
+    """Generate wrapper dockerfile with shebang
+
+    If image is pinned to a digest, source is the reference it was pinned from.
+    Resources are the tool's profile (cpus, cpuset, memory, shm-size), which
+    go in as labels.
+
+    Raises:
+        ValueError: If a resource is invalid
+    """
     # Build shebang arguments
     args = ["undockit", "run"]
 
     # Always include timeout for visibility
     args.append(f"--timeout={timeout}")
 
+    if replicas > 1:
+        args.append(f"--replicas={replicas}")
+
+    if host_paths:
+        args.append("--host-paths")
+        args.extend(f"--path-option={key}" for key in path_options)
+
     shebang = f"#!/usr/bin/env -S {' '.join(args)}"
 
+    pinned = f"# Pinned from {source}\n" if source else ""
+    labels = "".join(f'LABEL {key}="{value}"\n' for key, value in make_labels(resources or {}).items())
+
     return f"""{shebang}
 FROM {image}
 # Wrapper dockerfile created by undockit
-"""
+{pinned}{labels}"""
 
 
 # --- System Interface Functions ---
@@ -111,6 +139,11 @@ def install(
     prefix: Optional[Path] = None,
     timeout: int = 600,
     no_undockit: bool = False,
+    replicas: int = 1,
+    source: Optional[str] = None,
+    host_paths: bool = False,
+    path_options: Sequence[str] = (),
+    resources: Optional[dict] = None,
 ) -> Path:
     """Install tool to target directory"""
     # Resolve target directory
@@ -122,7 +155,15 @@ def install(
     tool_path = target_dir / tool_name
 
     # Generate dockerfile content
-    dockerfile_content = make_dockerfile(image, timeout=timeout)
+    dockerfile_content = make_dockerfile(
+        image,
+        timeout=timeout,
+        replicas=replicas,
+        source=source,
+        host_paths=host_paths,
+        path_options=path_options,
+        resources=resources,
+    )
 
     # Write file
     tool_path.write_text(dockerfile_content)
@@ -0,0 +1,137 @@
+"""
+Cross-process locks, so that only one of many concurrent runs does a cold build or start
+"""
+
+import fcntl
+import os
+import time
+from pathlib import Path
+
+from . import cache, trace
+
+# How long a dead holder's pid has to be seen before its lock counts as stale
+STALE_GRACE = 1.0
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def lock_name(*parts: str) -> str:
+    """Make a lock file name from some identifying parts"""
+    return "-".join(part.replace("/", "_") for part in parts) + ".lock"
+
+
+def parse_holder(data: bytes) -> int | None:
+    """Parse the holder pid written into a lock file"""
+    try:
+        return int(data.split()[0])
+    except (IndexError, ValueError):
+        return None
+
+
+# --- System Interface Functions ---
+
+
+def get_lock_dir() -> Path:
+    """Get the per-user lock directory"""
+    return cache.get_runtime_dir() / "locks"
+
+
+def pid_alive(pid: int) -> bool:
+    """Check whether a process exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, but isn't ours
+    return True
+
+
+class FileLock:
+    """Exclusive flock on a file, shared by every process on the host
+
+    The kernel releases the lock when its holder exits, so a crash can't
+    leave it held. The holder's pid is written into the file as well; if
+    the lock is held but that pid has been dead for a while, the lock has
+    leaked into some other process, so the file is replaced.
+    """
+
+    def __init__(self, name: str, timeout: float = 300, poll: float = 0.05):
+        self.path = get_lock_dir() / name
+        self.timeout = timeout
+        self.poll = poll
+        self.fd: int | None = None
+
+    def _read_holder(self) -> int | None:
+        try:
+            return parse_holder(self.path.read_bytes())
+        except OSError:
+            return None
+
+    def acquire(self) -> None:
+        """Wait for the lock
+
+        Raises:
+            RuntimeError: If the lock isn't acquired within the timeout
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        deadline = time.monotonic() + self.timeout
+        stale_pid, stale_since = None, 0.0
+
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+            else:
+                # Make sure the file wasn't replaced while we were getting it
+                try:
+                    current = os.stat(self.path).st_ino == os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    os.ftruncate(fd, 0)
+                    os.write(fd, f"{os.getpid()}\n".encode())
+                    self.fd = fd
+                    return
+                os.close(fd)
+                continue
+
+            # Held, but is the holder still around? A new holder may not have
+            # written its pid yet, so it has to look dead for a while
+            holder = self._read_holder()
+            if holder is not None and holder != os.getpid() and not pid_alive(holder):
+                if holder != stale_pid:
+                    stale_pid, stale_since = holder, time.monotonic()
+                elif time.monotonic() - stale_since >= STALE_GRACE:
+                    try:
+                        self.path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    stale_pid = None
+                    continue
+            else:
+                stale_pid = None
+
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Timed out after {self.timeout}s waiting for {self.path} (held by pid {holder})")
+
+            time.sleep(self.poll)
+
+    def release(self) -> None:
+        """Release the lock"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+trace.instrument(FileLock, "acquire")
@@ -1,21 +1,31 @@
 """
 Main entry point for undockit CLI
+
+Subcommand dependencies are imported when the subcommand runs, so that tool
+invocations through "run" only pay for what they use.
 """
 
 import sys
+from undockit import trace
 from undockit.args import get_parser
-from undockit.install import install, resolve_target
-from undockit import deploy
-from undockit.backend import get_backend
 
 
-def main():
-    """Main entry point for undockit CLI"""
-    parser = get_parser()
-    parsed = parser.parse_args()
+def run_install(parsed) -> int:
+    """Install a tool, deploying the undockit binary alongside it"""
+    from undockit.install import install, resolve_target
+    from undockit import deploy
 
-    if parsed.command == "install":
-        try:
+    if parsed.file and (parsed.image or parsed.name):
+        print("Error: --file installs the manifest's tools, not an image", file=sys.stderr)
+        return 1
+    if not parsed.file and not parsed.image:
+        print("Error: give an image, or a manifest with --file", file=sys.stderr)
+        return 1
+
+    try:
+        if parsed.file:
+            returncode = run_install_toolset(parsed)
+        else:
             tool_path = install(
                 image=parsed.image,
                 to=parsed.to,
@@ -23,62 +33,471 @@ def main():
                 prefix=parsed.prefix,
                 timeout=parsed.timeout,
                 no_undockit=parsed.no_undockit,
+                replicas=parsed.replicas,
+                host_paths=parsed.host_paths,
+                path_options=parsed.path_option,
+                resources={
+                    "cpus": parsed.cpus,
+                    "cpuset": parsed.cpuset,
+                    "memory": parsed.memory,
+                    "shm-size": parsed.shm_size,
+                },
             )
             print(f"Installed {parsed.image} as {tool_path}")
+            returncode = 0
 
-            # Deploy undockit binary unless disabled
-            if not parsed.no_undockit:
-                target_dir = resolve_target(parsed.to, parsed.prefix)
-                deployed = deploy.ensure_binary(target_dir)
-                if deployed:
-                    print(f"Deployed undockit binary to {deployed}")
+        # Deploy undockit binary unless disabled
+        if not parsed.no_undockit:
+            target_dir = resolve_target(parsed.to, parsed.prefix)
+            deployed = deploy.ensure_binary(target_dir)
+            if deployed:
+                print(f"Deployed undockit binary to {deployed}")
 
-            return 0
-        except (ValueError, PermissionError) as e:
-            print(f"Error: {e}", file=sys.stderr)
-            return 1
+        return returncode
+    except (ValueError, PermissionError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def run_install_toolset(parsed) -> int:
+    """Pull and install a manifest's tools, pinned to digests"""
+    from undockit.backend import get_backend
+    from undockit.toolset import install_toolset, lock_path
+
+    def on_result(result):
+        if "error" in result:
+            print(f"Error: {result['name']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"Installed {result['image']} ({result['status']}) as {result['path']}")
+
+    try:
+        results = install_toolset(
+            get_backend(),
+            parsed.file,
+            to=parsed.to,
+            prefix=parsed.prefix,
+            jobs=parsed.jobs,
+            update=parsed.update,
+            timeout=parsed.timeout,
+            replicas=parsed.replicas,
+            on_result=on_result,
+        )
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Pinned digests written to {lock_path(parsed.file)}")
+    return 0 if all("error" not in result for result in results) else 1
+
+
+def run_build(parsed) -> int:
+    """Build a dockerfile, showing the build output"""
+    from undockit.backend import get_backend
+
+    try:
+        backend = get_backend()
+        # Always build when asked to, refreshing the build cache
+        backend.get_image(parsed.dockerfile, rebuild=True, quiet=False)  # Show build output
+        # Don't print ID - podman already shows it when not quiet
+        return 0
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def translate_args(parsed, args: list[str]) -> list[str]:
+    """Rewrite host paths in a tool's arguments, if it asked for that"""
+    import os
+
+    from undockit import paths
+
+    if not paths.enabled(parsed.host_paths, os.environ):
+        return args
+    return paths.translate_args(args, parsed.path_option)
+
+
+def run_run(parsed) -> int:
+    """Run a dockerfile's command in its warm container"""
+    import time
+
+    with trace.span("import backend"):
+        from undockit import history
+        from undockit.backend import get_backend, state
+
+    try:
+        backend = get_backend()
+        start = time.monotonic()
+
+        # Build the image, or get it from the build cache
+        image_id = backend.get_image(parsed.dockerfile, rebuild=parsed.rebuild)
+
+        # Get container name
+        container_name = backend.name(image_id)
+
+        # Containers are kept warm for as long as this tool's history
+        # suggests, which is only worth reading when one might be started
+        started = False
+        if parsed.replicas > 1:
+            # Use the least loaded of a pool of containers
+            from undockit.pool import pick_replica
+
+            container_name, needs_start = pick_replica(backend, container_name, parsed.replicas)
+            if needs_start:
+                timeout = history.timeout_for(parsed.dockerfile, parsed.timeout)
+                started = backend.ensure_running(container_name, image_id, timeout)
+        elif not state.is_known_running(container_name):
+            # Cold: look for the container while fetching the image's config,
+            # then start it or wait for whoever's starting it
+            from undockit.backend import aio
+
+            timeout = history.timeout_for(parsed.dockerfile, parsed.timeout)
+            started = aio.ensure_running(backend, container_name, image_id, timeout)
+
+        history.record(parsed.dockerfile, time.monotonic() - start if started else None)
+
+        # Get command to run - always use entrypoint+cmd, append args
+        command = backend.command(image_id)
+        if parsed.args:
+            command.extend(translate_args(parsed, parsed.args))
+
+        # Execute command
+        return backend.exec(container_name, command)
+
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+def run_xargs(parsed) -> int:
+    """Run a dockerfile's command for each input, through a pool of workers"""
+    import time
+
+    from undockit import history
+    from undockit.backend import get_backend
+    from undockit.batch import Batch, build_argv, exit_status, read_input, split_records, summarize
+    from undockit.pool import replica_name
+
+    try:
+        items = split_records(read_input(parsed.arg_file), parsed.null)
+        backend = get_backend()
+
+        # Resolve the image and start its containers once for the whole batch
+        image_id = backend.get_image(parsed.dockerfile, rebuild=parsed.rebuild)
+        container_name = backend.name(image_id)
+        replicas = max(1, min(parsed.replicas, parsed.jobs))
+        containers = [replica_name(container_name, index) for index in range(replicas)]
+        timeout = history.timeout_for(parsed.dockerfile, parsed.timeout)
+        for name in containers:
+            backend.ensure_running(name, image_id, timeout)
+        history.record(parsed.dockerfile)
+
+        command = backend.command(image_id)
+        argvs = [command + translate_args(parsed, build_argv([], parsed.args, item)) for item in items]
+        joblog = open(parsed.joblog, "w") if parsed.joblog else None
+    except (RuntimeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    def on_result(index, returncode, output, errors, seconds):
+        sys.stdout.buffer.write(output)
+        sys.stdout.buffer.flush()
+        sys.stderr.buffer.write(errors)
+        sys.stderr.buffer.flush()
+        if joblog:
+            status = "-" if returncode is None else returncode
+            joblog.write(f"{index}\t{status}\t{seconds:.3f}\t{items[index]}\n")
+
+    start = time.monotonic()
+    try:
+        batch = Batch(backend, containers, parsed.jobs, parsed.fail_fast)
+        returncodes = batch.run(argvs, ordered=parsed.keep_order, on_result=on_result)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if joblog:
+            joblog.close()
+
+    print(f"undockit: {summarize(returncodes, time.monotonic() - start)}", file=sys.stderr)
+    return exit_status(returncodes)
+
+
+def run_pipe(parsed) -> int:
+    """Run a pipeline of tools"""
+    from undockit.backend import get_backend
+    from undockit.pipe import format_report, parse_spec, run_pipeline
+    from undockit.toolset import load_manifest
+
+    try:
+        stages = parse_spec(load_manifest(parsed.spec))
+        results = run_pipeline(get_backend(), stages, parsed.spec.parent, parsed.args)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    failed = [result for result in results if result["returncode"] != 0]
+    if not failed:
+        return 0
+    print(format_report(results), file=sys.stderr)
+    return failed[0]["returncode"] or 1
+
+
+def find_tools_named(tools: list[str]):
+    """Find tools by path or on PATH, reporting any that aren't found
+
+    Returns:
+        Their absolute paths, or None if any weren't found
+    """
+    import shutil
+    from pathlib import Path
 
-    elif parsed.command == "build":
+    paths = []
+    for tool in tools:
+        found = tool if "/" in tool else shutil.which(tool)
+        if found is None:
+            print(f"Error: {tool} not found", file=sys.stderr)
+            return None
+        paths.append(Path(found).absolute())
+    return paths
+
+
+def run_warm(parsed) -> int:
+    """Build and start tools' containers, reporting how long each took"""
+    from undockit.backend import get_backend
+    from undockit.install import resolve_target
+    from undockit.warm import find_tools, format_report, warm
+
+    if parsed.tools:
+        paths = find_tools_named(parsed.tools)
+        if paths is None:
+            return 1
+    else:
         try:
-            backend = get_backend()
-            image_id = backend.build(parsed.dockerfile, quiet=False)  # Show build output
-            # Don't print ID - podman already shows it when not quiet
-            return 0
-        except RuntimeError as e:
+            bin_dir = resolve_target(parsed.to, parsed.prefix)
+        except ValueError as e:
             print(f"Error: {e}", file=sys.stderr)
             return 1
+        paths = find_tools(bin_dir)
+        if not paths:
+            print(f"No undockit tools in {bin_dir}", file=sys.stderr)
+            return 0
 
-    elif parsed.command == "run":
-        try:
-            backend = get_backend()
+    try:
+        results = warm(get_backend(), paths, parsed.jobs, parsed.keep)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
 
-            # Build the image
-            image_id = backend.build(parsed.dockerfile, quiet=True)  # Hide output when running
+    print(format_report(results))
+    return 0 if all(not result["status"].startswith("error") for result in results) else 1
 
-            # Get container name
-            container_name = backend.name(image_id)
 
-            # Start container if not running
-            if not backend.is_running(container_name):
-                backend.start(container_name, image_id, parsed.timeout)
+def run_status(parsed) -> int:
+    """Show the warm containers, once or refreshing"""
+    import json
+    import time
 
-            # Get command to run - always use entrypoint+cmd, append args
-            command = backend.command(image_id)
-            if parsed.args:
-                command.extend(parsed.args)
+    from undockit.backend import get_backend
+    from undockit.status import add_cpu_percent, collect, format_table
 
-            # Execute command
-            return backend.exec(container_name, command)
+    try:
+        backend = get_backend()
+        previous, checked = [], time.monotonic()
+        while True:
+            rows = collect(backend)
+            now = time.monotonic()
+            if previous:
+                add_cpu_percent(rows, previous, now - checked)
+            previous, checked = rows, now
 
-        except RuntimeError as e:
-            print(f"Error: {e}", file=sys.stderr)
-            return 1
+            if parsed.json:
+                print(json.dumps(rows), flush=True)
+            else:
+                if parsed.watch:
+                    print("\033[H\033[J", end="")  # Clear the screen
+                print(format_table(rows), flush=True)
 
-    else:
-        # No command given, show help
-        parser.print_help()
+            if not parsed.watch:
+                return 0
+            time.sleep(parsed.watch)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
         return 0
 
 
+def run_stop(parsed) -> int:
+    """Stop tools' containers, or all of them"""
+    from undockit import cache
+    from undockit.backend import get_backend
+    from undockit.status import stop_containers, tool_containers
+
+    if parsed.all == bool(parsed.tools):
+        print("Error: give tools to stop, or --all", file=sys.stderr)
+        return 1
+
+    paths = find_tools_named(parsed.tools)
+    if paths is None:
+        return 1
+
+    try:
+        backend = get_backend()
+        running = [container["name"] for container in backend.list_containers()]
+        if parsed.all:
+            names = running
+        else:
+            names = []
+            for path in paths:
+                # The image it was last built as, without building it again
+                image_id = cache.read("images", cache.content_hash(path.read_bytes()))
+                found = tool_containers(running, backend.name(image_id)) if image_id else []
+                if not found:
+                    print(f"{path.name} isn't running")
+                names += found
+    except (RuntimeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    returncode = 0
+    for name, error in stop_containers(backend, names, parsed.jobs).items():
+        if error:
+            print(f"Error: {error}", file=sys.stderr)
+            returncode = 1
+        else:
+            print(f"Stopped {name}")
+    return returncode
+
+
+def run_history(parsed) -> int:
+    """Report what adaptive timeouts save, and what they cost"""
+    import json
+
+    from undockit.backend import get_backend
+    from undockit.history import format_report, report
+
+    try:
+        backend = get_backend()
+    except RuntimeError:
+        backend = None  # The report works from history alone, without memory use
+
+    rows = report(backend)
+    print(json.dumps(rows) if parsed.json else format_report(rows))
+    return 0
+
+
+def run_models(parsed) -> int:
+    """List, collect or deduplicate the model store"""
+    import json
+
+    from undockit import models
+    from undockit.sizes import parse_size
+
+    if parsed.models_command == "ls":
+        blobs = models.list_blobs(parsed.verify)
+        print(json.dumps(blobs) if parsed.json else models.format_blobs(blobs))
+        return 0 if all(blob.get("ok", True) for blob in blobs) else 1
+
+    if parsed.models_command == "gc":
+        removed, freed = models.gc(parsed.dry_run)
+        verb = "Would remove" if parsed.dry_run else "Removed"
+        print(f"{verb} {len(removed)} files, {models.format_size(freed)}")
+        return 0
+
+    try:
+        min_size = parse_size(parsed.min_size)
+    except ValueError:
+        print(f"Error: invalid size: {parsed.min_size}", file=sys.stderr)
+        return 1
+
+    result = models.dedupe(parsed.paths or None, min_size, parsed.dry_run)
+    for error in result["errors"]:
+        print(f"Error: {error}", file=sys.stderr)
+    verb = "would save" if parsed.dry_run else "saved"
+    print(
+        f"{result['files']} files, {result['hashed']} hashed, {result['linked']} duplicates linked, "
+        f"{verb} {models.format_size(result['saved'])}"
+    )
+    return 1 if result["errors"] else 0
+
+
+def run_gc(parsed) -> int:
+    """Remove superseded images and abandoned containers"""
+    from undockit.backend import get_backend
+    from undockit.sizes import parse_size
+    from undockit.gc import format_plan, gc
+
+    try:
+        max_size = parse_size(parsed.max_size) if parsed.max_size else None
+    except ValueError:
+        print(f"Error: invalid size: {parsed.max_size}", file=sys.stderr)
+        return 1
+
+    try:
+        result = gc(get_backend(), parsed.keep, max_size, parsed.dry_run)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(format_plan(result, parsed.dry_run))
+    return 0
+
+
+def run_daemon(parsed) -> int:
+    """Run the undockitd daemon in the foreground"""
+    from undockit.client import get_socket_path
+    from undockit.daemon import serve
+
+    return serve(parsed.socket or get_socket_path(), parsed.idle_timeout)
+
+
+COMMANDS = {
+    "install": run_install,
+    "build": run_build,
+    "run": run_run,
+    "xargs": run_xargs,
+    "pipe": run_pipe,
+    "warm": run_warm,
+    "status": run_status,
+    "stop": run_stop,
+    "history": run_history,
+    "models": run_models,
+    "gc": run_gc,
+    "daemon": run_daemon,
+}
+
+
+def main():
+    """Main entry point for undockit CLI"""
+    path, sys.argv[1:] = trace.pop_trace_arg(sys.argv[1:])
+    if path:
+        trace.enable(path)
+
+    with trace.span("main", argv=trace.describe(sys.argv[1:])):
+        return dispatch()
+
+
+def dispatch() -> int:
+    """Run the subcommand the command line asks for"""
+    # Tool runs go through the daemon if it's up, skipping argparse and the backend
+    if sys.argv[1:2] == ["run"]:
+        with trace.span("import client"):
+            from undockit import client
+
+        returncode = client.run(sys.argv[2:])
+        if returncode is not None:
+            return returncode
+
+    with trace.span("parse args"):
+        parser = get_parser()
+        parsed = parser.parse_args()
+
+    if parsed.command in COMMANDS:
+        return COMMANDS[parsed.command](parsed)
+
+    # No command given, show help
+    parser.print_help()
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+Model store - one copy of each model file, however many tools downloaded it
+
+Tools run with their XDG directories and MODEL_PATH on the host, but each
+downloads weights into its own layout, so the same multi-GB file can end up
+stored several times. `undockit models dedupe` finds large files under
+MODEL_PATH, keeps one copy of each in a content-addressed store, and links
+every copy to it. Other directories, like the cache dir tools share with
+everything else, are only looked in when asked for: a write in place to one
+linked copy changes them all, which programs we don't know about won't
+expect. Copies whose mode or owner differs from the stored one aren't hard
+linked, as they'd take on the stored one's. Hard links share one inode, so the tools also share its page
+cache; where a hard link isn't allowed on the same filesystem, a reflink
+still shares the disk blocks if the filesystem supports them. Neither works
+across filesystems, so files on a different one from the store are reported
+and left as they are.
+
+An index of each file's size, mtime and inode means only new or changed
+files are hashed again.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from undockit import cache
+
+# Files smaller than this aren't worth the bookkeeping
+DEFAULT_MIN_SIZE = 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+# Files changed more recently than this may still be downloading
+SETTLE_SECONDS = 60
+
+# ioctl that clones a file's extents, from linux/fs.h
+FICLONE = 0x40049409
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def blob_path(store: Path, digest: str) -> Path:
+    """Where a blob with a given SHA-256 digest lives in the store"""
+    return store / "sha256" / digest[:2] / digest
+
+
+def file_key(stat: os.stat_result) -> list:
+    """What has to stay the same for a file's indexed hash to still be right"""
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def format_blobs(blobs: list[dict]) -> str:
+    """Format blob listings as a table"""
+    lines = [f"{'digest':<14}{'size':>9}{'links':>7}  paths"]
+    for blob in blobs:
+        status = "" if blob.get("ok", True) else "  CORRUPT"
+        paths = ", ".join(blob["paths"]) or "-"
+        lines.append(f"{blob['digest'][:12]:<14}{format_size(blob['size']):>9}{blob['links']:>7}  {paths}{status}")
+    return "\n".join(lines)
+
+
+# --- System Interface Functions ---
+
+
+def get_data_dir() -> Path:
+    """Get the user's data directory"""
+    return Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share"))
+
+
+def get_store() -> Path:
+    return get_data_dir() / "undockit" / "blobs"
+
+
+def default_roots() -> list[Path]:
+    """Where tools keep their models: MODEL_PATH, the one directory only they use"""
+    return [get_data_dir() / "models"]
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_index(store: Path) -> dict:
+    try:
+        return json.loads((store / "index.json").read_text())
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def save_index(store: Path, index: dict) -> None:
+    """Save the index atomically"""
+    store.mkdir(parents=True, exist_ok=True)
+    tmp_path = store / f".index.json.{os.getpid()}"
+    tmp_path.write_text(json.dumps(index))
+    os.replace(tmp_path, store / "index.json")
+
+
+def find_files(roots: list[Path], skip: list[Path], min_size: int) -> list[Path]:
+    """Find the regular files worth deduplicating under some directories"""
+    found = []
+    for root in roots:
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if Path(directory, name) not in skip]
+            for name in filenames:
+                path = Path(directory, name)
+                try:
+                    stat = path.lstat()
+                except OSError:
+                    continue
+                if stat.st_size >= min_size and path.is_file() and not path.is_symlink():
+                    found.append(path)
+    return found
+
+
+def reflink(source: Path, target: Path) -> None:
+    """Make target a copy-on-write clone of source"""
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def materialize(blob: Path, path: Path) -> str:
+    """Replace a file with a link to a blob
+
+    A hard link would give the file the blob's mode and owner, so one that
+    differs is only reflinked, keeping its own.
+
+    Returns:
+        How it was linked: "hardlink" or "reflink"
+
+    Raises:
+        OSError: If neither works here
+    """
+    tmp_path = path.with_name(f".{path.name}.undockit-{os.getpid()}")
+    stat, blob_stat = path.stat(), blob.stat()
+    try:
+        if (stat.st_mode, stat.st_uid, stat.st_gid) != (blob_stat.st_mode, blob_stat.st_uid, blob_stat.st_gid):
+            raise OSError(errno.EPERM, "Mode or owner differs from the stored copy")
+        os.link(blob, tmp_path)
+        method = "hardlink"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.EACCES):
+            raise
+        try:
+            reflink(blob, tmp_path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise e
+        os.chmod(tmp_path, stat.st_mode & 0o7777)
+        method = "reflink"
+    os.replace(tmp_path, path)
+    return method
+
+
+def store_blob(path: Path, blob: Path) -> str:
+    """Put a file into the store as a blob, without copying its data
+
+    Returns:
+        How it was stored: "hardlink", or "reflink" if the file keeps its own inode
+
+    Raises:
+        OSError: If neither works here
+    """
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(path, blob)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.EACCES):
+            raise
+        tmp_path = blob.with_name(f".{blob.name}.{os.getpid()}")
+        try:
+            reflink(path, tmp_path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise e
+        os.replace(tmp_path, blob)
+        return "reflink"
+
+
+def dedupe(roots: list[Path] | None = None, min_size: int = DEFAULT_MIN_SIZE, dry_run: bool = False) -> dict:
+    """Store each large file once and link all its copies to it
+
+    Args:
+        roots: Directories to look in (default: MODEL_PATH)
+        min_size: Smallest file to bother with, in bytes
+        dry_run: Only report what would be saved
+
+    Returns:
+        Dict with files looked at, how many were hashed and linked, the bytes
+        saved and any errors
+    """
+    store = get_store()
+    index = load_index(store)
+    files = index.setdefault("files", {})
+    skip = [store, cache.get_cache_dir()]
+    result = {"files": 0, "hashed": 0, "linked": 0, "saved": 0, "errors": []}
+
+    seen = {}
+    for path in find_files(roots or default_roots(), skip, min_size):
+        result["files"] += 1
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime < SETTLE_SECONDS:
+                continue
+            key = file_key(stat)
+            entry = files.get(str(path))
+            if entry and entry[:3] == key:
+                digest = entry[3]
+                if entry[4:] == ["reflink"]:
+                    continue  # Sharing the blob's blocks, not its inode
+            else:
+                digest = hash_file(path)
+                result["hashed"] += 1
+
+            blob = blob_path(store, digest)
+            try:
+                blob_stat = blob.stat()
+            except FileNotFoundError:
+                blob_stat = None
+
+            if blob_stat is not None and blob_stat.st_ino == stat.st_ino:
+                files[str(path)] = key + [digest]
+                continue  # Already the stored copy
+
+            if blob_stat is None and digest not in seen:
+                # First copy: it becomes the stored one, without copying anything
+                method = "hardlink" if dry_run else store_blob(path, blob)
+                seen[digest] = path
+                files[str(path)] = key + [digest] + (["reflink"] if method == "reflink" else [])
+                continue
+
+            result["linked"] += 1
+            result["saved"] += stat.st_size
+            if not dry_run:
+                method = materialize(blob, path)
+                files[str(path)] = file_key(path.stat()) + [digest, method]
+        except OSError as e:
+            result["errors"].append(f"{path}: {e}")
+
+    if not dry_run:
+        # Forget files that have gone
+        for name in [name for name in files if not os.path.lexists(name)]:
+            del files[name]
+        save_index(store, index)
+    return result
+
+
+def live_paths(files: dict) -> dict[str, list[str]]:
+    """Each digest's indexed files that are still there and unchanged since they were hashed
+
+    Reflinked files have inodes of their own, so a blob's link count doesn't
+    say whether anything still uses it; the index does.
+    """
+    paths = {}
+    for name, entry in files.items():
+        try:
+            key = file_key(os.stat(name))
+        except OSError:
+            continue
+        if key == entry[:3]:
+            paths.setdefault(entry[3], []).append(name)
+    return paths
+
+
+def list_blobs(verify: bool = False) -> list[dict]:
+    """List the stored blobs with the files that use them
+
+    Args:
+        verify: Hash every blob again to check it hasn't been changed in place
+
+    Returns:
+        Dicts with digest, size, links and paths, and ok if verified
+    """
+    store = get_store()
+    paths = live_paths(load_index(store).get("files", {}))
+
+    blobs = []
+    for blob in sorted((store / "sha256").glob("*/*")):
+        try:
+            stat = blob.stat()
+        except OSError:
+            continue
+        users = paths.get(blob.name, [])
+        row = {"digest": blob.name, "size": stat.st_size, "links": len(users), "paths": users}
+        if verify:
+            row["ok"] = hash_file(blob) == blob.name
+        blobs.append(row)
+    return blobs
+
+
+def gc(dry_run: bool = False) -> tuple[list[str], int]:
+    """Remove blobs no tool's file uses any more
+
+    Returns:
+        Digests removed, and the bytes freed
+    """
+    store = get_store()
+    paths = live_paths(load_index(store).get("files", {}))
+    removed, freed = [], 0
+    for blob in sorted((store / "sha256").glob("*/*")):
+        if blob.name in paths:
+            continue
+        try:
+            stat = blob.stat()
+        except OSError:
+            continue
+        if not dry_run:
+            blob.unlink()
+        removed.append(blob.name)
+        freed += stat.st_size
+    return removed, freed
@@ -0,0 +1,76 @@
+"""
+Host path translation - rewrite absolute paths in a tool's arguments to where they are in the container
+
+The host's root is bind mounted at /host, so `whisper /data/big.wav` can open
+the file in place as /host/data/big.wav instead of having it streamed in on
+stdin. Tools opt in with --host-paths in their shebang, or every tool with
+UNDOCKIT_HOST_PATHS=1.
+
+Arguments that are absolute paths, and --option=/path values, are rewritten
+when the path or its parent directory exists on the host. Bare key=value
+arguments, like yolo's source=/path, are only rewritten for the keys given
+with --path-option. Prefix an argument with "raw:" to pass it on untouched.
+"""
+
+import os
+
+HOST_ROOT = "/host"
+RAW_PREFIX = "raw:"
+
+# Values of UNDOCKIT_HOST_PATHS that turn translation on for every tool
+ENABLED = ("1", "on", "yes", "true")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def translate_path(path: str, exists) -> str:
+    """Rewrite a host path to its place under /host, if it's an absolute path on the host
+
+    Args:
+        path: The argument
+        exists: Function that checks whether a path exists on the host
+    """
+    if not path.startswith("/") or path == HOST_ROOT or path.startswith(f"{HOST_ROOT}/"):
+        return path
+    if not (exists(path) or exists(os.path.dirname(path.rstrip("/")) or "/")):
+        return path
+    return HOST_ROOT + path
+
+
+def translate_arg(arg: str, keys: list[str], exists) -> str:
+    """Rewrite one argument's host path, if it has one
+
+    Args:
+        arg: The argument
+        keys: Keys whose key=value arguments hold paths
+        exists: Function that checks whether a path exists on the host
+    """
+    if arg.startswith(RAW_PREFIX):
+        return arg[len(RAW_PREFIX) :]
+    if arg.startswith("/"):
+        return translate_path(arg, exists)
+
+    key, has_value, value = arg.partition("=")
+    if has_value and (key.startswith("--") or key in keys):
+        return f"{key}={translate_path(value, exists)}"
+    return arg
+
+
+def translate_args(args: list[str], keys: list[str], exists=os.path.exists) -> list[str]:
+    """Rewrite the host paths in a tool's arguments
+
+    Args:
+        args: Arguments to the tool
+        keys: Keys whose key=value arguments hold paths
+        exists: Function that checks whether a path exists on the host
+
+    Returns:
+        Arguments as the container should see them
+    """
+    return [translate_arg(arg, keys, exists) for arg in args]
+
+
+def enabled(host_paths: bool, env: dict[str, str]) -> bool:
+    """Whether a tool's arguments should be translated"""
+    return host_paths or env.get("UNDOCKIT_HOST_PATHS", "").lower() in ENABLED
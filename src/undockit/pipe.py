@@ -0,0 +1,250 @@
+"""
+Pipelines - several tools run as one job, without intermediates touching disk
+
+A pipeline spec is a TOML file of stages:
+
+    [stages.split]
+    tool = "demucs"
+    args = ["-o", "{work}", "{1}"]
+
+    [stages.transcribe]
+    tool = "whisper"
+    args = ["{work}/htdemucs/input/vocals.wav"]
+    after = ["split"]
+
+    [stages.shout]
+    tool = "tr"
+    args = ["a-z", "A-Z"]
+    stdin = "transcribe"
+
+Every stage's container is started at once, so their startup costs overlap.
+A stage runs once the stages it's after have finished, and a stage with
+stdin runs alongside the stage it reads from, taking its output through a
+pipe whose fds are handed straight to the container. Files go in {work}, a
+directory on tmpfs in the runtime dir that all the containers can see, and
+which is removed when the job ends. {1}, {2} and so on are the pipeline's
+own arguments, with host paths rewritten to where the containers see them.
+"""
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from undockit import cache, history, paths
+from undockit.backend import Backend
+from undockit.backend.base import thread_backend
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_spec(data: dict) -> list[dict]:
+    """Get the stages from a parsed pipeline spec
+
+    Returns:
+        Stage dicts with name, tool, args, after and stdin keys, in an order
+        where every stage comes after those it waits for
+
+    Raises:
+        ValueError: If the spec is malformed, its stages wait in a cycle, or
+            a stage waits for the one it reads from
+    """
+    entries = data.get("stages")
+    if not isinstance(entries, dict) or not entries:
+        raise ValueError("Pipeline needs a [stages] table")
+
+    stages = {}
+    for name, entry in entries.items():
+        if not isinstance(entry, dict) or not isinstance(entry.get("tool"), str):
+            raise ValueError(f"Stage {name} needs a tool")
+        stage = {
+            "name": name,
+            "tool": entry["tool"],
+            "args": entry.get("args", []),
+            "after": entry.get("after", []),
+            "stdin": entry.get("stdin"),
+        }
+        if not isinstance(stage["args"], list) or not all(isinstance(arg, str) for arg in stage["args"]):
+            raise ValueError(f"Stage {name} has invalid args")
+        if not isinstance(stage["after"], list) or any(dep not in entries for dep in stage["after"]):
+            raise ValueError(f"Stage {name} is after a stage that doesn't exist")
+        if stage["stdin"] is not None and stage["stdin"] not in entries:
+            raise ValueError(f"Stage {name} reads from a stage that doesn't exist")
+        stages[name] = stage
+
+    readers = [stage["stdin"] for stage in stages.values() if stage["stdin"]]
+    for name in readers:
+        if readers.count(name) > 1:
+            raise ValueError(f"Stage {name}'s output can only be read by one stage")
+
+    # A stage that waits for the one it reads from to end, even through other
+    # stages, deadlocks: that one blocks writing to a pipe nobody reads yet
+    ordered = order(stages)
+    ends = {}
+    for stage in ordered:
+        waits = set().union(*(ends[dep] for dep in stage["after"]))
+        if stage["stdin"] in waits:
+            raise ValueError(f"Stage {stage['name']} waits for {stage['stdin']}, which it reads from")
+        ends[stage["name"]] = waits | {stage["name"]} | (ends[stage["stdin"]] if stage["stdin"] else set())
+    return ordered
+
+
+def order(stages: dict[str, dict]) -> list[dict]:
+    """Sort stages so each comes after the stages it waits for
+
+    A stage reading another's output runs alongside it rather than after it,
+    but still can't be waited for by the stage it reads from.
+
+    Raises:
+        ValueError: If stages wait for each other in a cycle
+    """
+    ordered, done, visiting = [], set(), set()
+
+    def visit(name: str) -> None:
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage {name} waits for itself")
+        visiting.add(name)
+        stage = stages[name]
+        for dep in stage["after"] + ([stage["stdin"]] if stage["stdin"] else []):
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(stage)
+
+    for name in stages:
+        visit(name)
+    return ordered
+
+
+def expand_args(args: list[str], values: dict[str, str]) -> list[str]:
+    """Fill {work} and {1}, {2}... into a stage's arguments"""
+    expanded = []
+    for arg in args:
+        for key, value in values.items():
+            arg = arg.replace(f"{{{key}}}", value)
+        expanded.append(arg)
+    return expanded
+
+
+def pipeline_values(work_dir: str, argv: list[str], exists=os.path.exists) -> dict[str, str]:
+    """The values stages' arguments are filled with, as the containers see them"""
+    values = {"work": paths.translate_path(work_dir, exists)}
+    for index, arg in enumerate(argv, 1):
+        values[str(index)] = paths.translate_path(os.path.abspath(arg), exists) if os.path.exists(arg) else arg
+    return values
+
+
+def format_report(results: list[dict]) -> str:
+    lines = []
+    for result in results:
+        status = "skipped" if result["returncode"] is None else f"exit {result['returncode']}"
+        lines.append(f"{result['name']}: {status}")
+    return "\n".join(lines)
+
+
+# --- System Interface Functions ---
+
+
+def find_tool(tool: str, base: Path) -> Path:
+    """Find a stage's tool, on PATH or relative to the spec
+
+    Raises:
+        ValueError: If it isn't found
+    """
+    if "/" in tool:
+        path = base / tool
+    else:
+        found = shutil.which(tool)
+        if found is None:
+            raise ValueError(f"Tool {tool} not found")
+        path = Path(found)
+    if not path.is_file():
+        raise ValueError(f"Tool {tool} not found")
+    return path.absolute()
+
+
+def prepare(backend: Backend, path: Path) -> tuple[str, list[str]]:
+    """Build a stage's image and start its container
+
+    Returns:
+        The container to exec in, and the image's command
+    """
+    from undockit.warm import read_options
+
+    options = read_options(path) or {"timeout": 600}
+    image_id = backend.get_image(path)
+    container_name = backend.name(image_id)
+    backend.ensure_running(container_name, image_id, history.timeout_for(path, options["timeout"]))
+    history.record(path)
+    return container_name, backend.command(image_id)
+
+
+def run_pipeline(backend: Backend, stages: list[dict], spec_dir: Path, argv: list[str]) -> list[dict]:
+    """Run a pipeline's stages, each as soon as it can
+
+    Args:
+        backend: Backend to use, cloned for each stage
+        stages: Stages from parse_spec()
+        spec_dir: Directory tools are relative to
+        argv: The pipeline's own arguments
+
+    Returns:
+        Dicts with each stage's name and returncode, None if it was skipped
+
+    Raises:
+        ValueError: If a tool isn't found
+        RuntimeError: If a stage's container can't be started
+    """
+    tools = {stage["name"]: find_tool(stage["tool"], spec_dir) for stage in stages}
+    clone = thread_backend(backend)
+
+    # Start every container at once, so their startup costs overlap
+    with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+        prepared = dict(zip(tools, pool.map(lambda name: prepare(clone(), tools[name]), tools)))
+
+    work_dir = cache.get_runtime_dir() / "pipes" / str(os.getpid())
+    work_dir.mkdir(parents=True, exist_ok=True)
+    values = pipeline_values(str(work_dir), argv)
+
+    # A pipe for each stage whose output is read by another
+    pipes = {stage["stdin"]: os.pipe() for stage in stages if stage["stdin"]}
+    finished = {stage["name"]: threading.Event() for stage in stages}
+    returncodes = {}
+
+    def run_stage(stage: dict) -> None:
+        name = stage["name"]
+        stdin = pipes[stage["stdin"]][0] if stage["stdin"] else 0
+        stdout = pipes[name][1] if name in pipes else 1
+        try:
+            for dep in stage["after"]:
+                finished[dep].wait()
+            if any(returncodes.get(dep) != 0 for dep in stage["after"]):
+                returncodes[name] = None
+                return
+
+            container_name, command = prepared[name]
+            argv = command + expand_args(stage["args"], values)
+            returncodes[name] = clone().exec(container_name, argv, (stdin, stdout, 2))
+        except RuntimeError:
+            returncodes[name] = 1
+            raise
+        finally:
+            # Our copies of the pipe ends go, so the other side sees EOF or EPIPE
+            for fd in (stdin, stdout):
+                if fd > 2:
+                    os.close(fd)
+            finished[name].set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+            futures = [pool.submit(run_stage, stage) for stage in stages]
+            for future in futures:
+                future.result()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return [{"name": stage["name"], "returncode": returncodes.get(stage["name"])} for stage in stages]
@@ -0,0 +1,81 @@
+"""
+Warm container pools - several replicas of one image, with runs sent to the least loaded
+"""
+
+import os
+import sys
+
+from undockit import trace
+from undockit.backend import Backend, state
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def replica_name(container_name: str, index: int) -> str:
+    """Get the container name of a replica; the first keeps the plain name"""
+    return container_name if index == 0 else f"{container_name}-{index}"
+
+
+def choose_replica(loads: list[int | None]) -> tuple[int, bool]:
+    """Pick the replica for a run
+
+    Idle replicas are preferred, lowest first so that the higher ones go
+    unused and time out when demand drops. When every running replica is
+    busy a new one is started, and only when the pool is full do runs share.
+
+    Args:
+        loads: Live exec sessions in each replica, or None if it isn't running
+
+    Returns:
+        The replica's index, and whether it needs starting
+    """
+    running = [(load, index) for index, load in enumerate(loads) if load is not None]
+
+    for load, index in running:
+        if load == 0:
+            return index, False
+
+    for index, load in enumerate(loads):
+        if load is None:
+            return index, True
+
+    return min(running)[1], False
+
+
+# --- System Interface Functions ---
+
+
+def count_sessions(container_name: str) -> int:
+    """Count a container's live exec sessions from its pid files"""
+    try:
+        return len(os.listdir(state.control_dir(container_name) / "pid"))
+    except OSError:
+        return 0
+
+
+def pick_replica(backend: Backend, container_name: str, replicas: int) -> tuple[str, bool]:
+    """Pick the replica of a container to run in
+
+    Args:
+        backend: Backend the containers run on
+        container_name: Name of the image's container, from Backend.name()
+        replicas: Size of the pool
+
+    Returns:
+        The replica's container name, and whether it needs starting
+    """
+    names = [replica_name(container_name, index) for index in range(replicas)]
+
+    # Only the local state record is consulted here, so picking is cheap
+    loads = [count_sessions(name) if state.is_known_running(name) else None for name in names]
+    index, needs_start = choose_replica(loads)
+
+    # Before starting one, make sure it isn't running without a state record
+    if needs_start and backend.is_running(names[index]):
+        needs_start = False
+
+    return names[index], needs_start
+
+
+trace.instrument(sys.modules[__name__], "pick_replica")
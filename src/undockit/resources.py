@@ -0,0 +1,240 @@
+"""
+Resource profiles - CPU, memory and /dev/shm limits for a tool's containers
+
+A tool declares its profile with LABELs in its wrapper dockerfile, which
+`undockit install --cpus --cpuset --memory --shm-size` writes:
+
+    LABEL undockit.cpus="4"
+    LABEL undockit.cpuset="auto"
+    LABEL undockit.memory="8G"
+    LABEL undockit.shm-size="2G"
+
+The labels end up in the image's config, so starting a container reads them
+from the metadata cache with no extra podman call. cpuset is a CPU list like
+"0-3,8", or "auto" to give each of a pool's replicas its own CPUs: replicas
+are spread across NUMA nodes, pinned to their node's memory, and when cpus
+is set each gets its own slice of the node's cores, so parallel runs don't
+evict each other's caches.
+"""
+
+import math
+import os
+from pathlib import Path
+
+from undockit.sizes import parse_size
+
+LABEL_PREFIX = "undockit."
+
+# Profile keys, as they're written in labels and passed to install
+KEYS = ("cpus", "cpuset", "memory", "shm-size")
+
+AUTO = "auto"
+
+NODE_ROOT = Path("/sys/devices/system/node")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_cpulist(text: str) -> list[int]:
+    """Parse a kernel CPU list like "0-3,8,10-11"
+
+    Raises:
+        ValueError: If it isn't one
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        start, end = int(first), int(last or first)
+        if start < 0 or end < start:
+            raise ValueError(f"Invalid CPU list: {text}")
+        cpus.extend(range(start, end + 1))
+    if not cpus:
+        raise ValueError(f"Invalid CPU list: {text}")
+    return sorted(set(cpus))
+
+
+def format_cpulist(cpus: list[int]) -> str:
+    """Format CPUs as a kernel CPU list, with runs as ranges"""
+    parts = []
+    for cpu in sorted(cpus):
+        if parts and parts[-1][1] == cpu - 1:
+            parts[-1][1] = cpu
+        else:
+            parts.append([cpu, cpu])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in parts)
+
+
+def parse_profile(labels: dict[str, str]) -> dict:
+    """Get a resource profile from an image's labels
+
+    Returns:
+        Dict with cpus (float), cpuset ("auto" or a CPU list), memory and
+        shm_size (bytes) for each key that's set
+
+    Raises:
+        ValueError: If a value is invalid
+    """
+    profile = {}
+    for key in KEYS:
+        value = labels.get(LABEL_PREFIX + key)
+        if value is None or value == "":
+            continue
+        value = str(value).strip()
+        if key == "cpus":
+            try:
+                cpus = float(value)
+            except ValueError:
+                cpus = 0.0
+            if not cpus > 0:
+                raise ValueError(f"Invalid cpus: {value}")
+            profile["cpus"] = cpus
+        elif key == "cpuset":
+            profile["cpuset"] = AUTO if value == AUTO else format_cpulist(parse_cpulist(value))
+        else:
+            size = parse_size(value)
+            if size <= 0:
+                raise ValueError(f"Invalid {key}: {value}")
+            profile[key.replace("-", "_")] = size
+    return profile
+
+
+def make_labels(options: dict[str, str | None]) -> dict[str, str]:
+    """Turn install's resource options into labels, checking them
+
+    Args:
+        options: Values for any of KEYS, None where unset
+
+    Raises:
+        ValueError: If a value is invalid
+    """
+    labels = {LABEL_PREFIX + key: str(value) for key, value in options.items() if value is not None}
+    unknown = [key for key in options if key not in KEYS]
+    if unknown:
+        raise ValueError(f"Unknown resource: {unknown[0]}")
+    parse_profile(labels)
+    return labels
+
+
+def replica_index(container_name: str, base_name: str) -> int:
+    """Which of a pool's replicas a container is, 0 for anything else"""
+    suffix = container_name.removeprefix(f"{base_name}-")
+    return int(suffix) if suffix != container_name and suffix.isdigit() else 0
+
+
+def place(
+    nodes: list[tuple[int | None, list[int]]], index: int, cpus: float | None = None
+) -> tuple[list[int], int | None]:
+    """Pick CPUs for a replica in auto mode
+
+    Replicas go round the nodes in turn. With a CPU count, each one on a node
+    gets the next slice of that many of its cores, wrapping round when the
+    node is full.
+
+    Args:
+        nodes: Each NUMA node's ID (None if unknown) and CPUs
+        index: The replica's index in its pool
+        cpus: CPUs each replica may use
+
+    Returns:
+        The CPUs to pin to, and the node to take memory from
+    """
+    node_id, node_cpus = nodes[index % len(nodes)]
+    if cpus:
+        width = min(len(node_cpus), math.ceil(cpus))
+        slot = (index // len(nodes)) % (len(node_cpus) // width)
+        node_cpus = node_cpus[slot * width : (slot + 1) * width]
+    return node_cpus, node_id
+
+
+def resolve(profile: dict, nodes: list[tuple[int | None, list[int]]], index: int) -> dict:
+    """Work out a container's limits from its profile
+
+    Returns:
+        Dict with cpus, cpuset_cpus, cpuset_mems, memory and shm_size, for
+        the ones that apply
+    """
+    limits = {key: profile[key] for key in ("cpus", "memory", "shm_size") if key in profile}
+    cpuset = profile.get("cpuset")
+    if cpuset == AUTO:
+        if nodes:
+            cpu_list, node_id = place(nodes, index, profile.get("cpus"))
+            limits["cpuset_cpus"] = format_cpulist(cpu_list)
+            if node_id is not None:
+                limits["cpuset_mems"] = str(node_id)
+    elif cpuset:
+        limits["cpuset_cpus"] = cpuset
+    return limits
+
+
+def podman_flags(limits: dict) -> list[str]:
+    """podman run flags for a container's limits"""
+    flags = []
+    if "cpus" in limits:
+        flags.append(f"--cpus={limits['cpus']:g}")
+    if "cpuset_cpus" in limits:
+        flags.append(f"--cpuset-cpus={limits['cpuset_cpus']}")
+    if "cpuset_mems" in limits:
+        flags.append(f"--cpuset-mems={limits['cpuset_mems']}")
+    if "memory" in limits:
+        flags.append(f"--memory={limits['memory']}")
+    if "shm_size" in limits:
+        flags.append(f"--shm-size={limits['shm_size']}")
+    return flags
+
+
+def api_spec(limits: dict) -> dict:
+    """The libpod create spec fields for a container's limits"""
+    spec = {}
+    cpu = {}
+    if "cpus" in limits:
+        cpu.update(period=100000, quota=int(limits["cpus"] * 100000))
+    if "cpuset_cpus" in limits:
+        cpu["cpus"] = limits["cpuset_cpus"]
+    if "cpuset_mems" in limits:
+        cpu["mems"] = limits["cpuset_mems"]
+    if cpu:
+        spec.setdefault("resource_limits", {})["cpu"] = cpu
+    if "memory" in limits:
+        spec.setdefault("resource_limits", {})["memory"] = {"limit": limits["memory"]}
+    if "shm_size" in limits:
+        spec["shm_size"] = limits["shm_size"]
+    return spec
+
+
+# --- System Interface Functions ---
+
+
+def numa_nodes(root: Path = NODE_ROOT) -> list[tuple[int | None, list[int]]]:
+    """The NUMA nodes with CPUs this process may use
+
+    Returns:
+        Each node's ID and CPUs, or one node with no ID if the kernel
+        doesn't say
+    """
+    allowed = os.sched_getaffinity(0)
+    nodes = []
+    for path in sorted(root.glob("node[0-9]*"), key=lambda path: int(path.name[4:])):
+        try:
+            cpus = [cpu for cpu in parse_cpulist((path / "cpulist").read_text()) if cpu in allowed]
+        except (OSError, ValueError):
+            continue  # Memory-only nodes have no CPUs
+        if cpus:
+            nodes.append((int(path.name[4:]), cpus))
+    return nodes or [(None, sorted(allowed))]
+
+
+def container_limits(labels: dict[str, str], container_name: str, base_name: str) -> dict:
+    """Work out a container's limits from its image's labels
+
+    Raises:
+        RuntimeError: If the image's profile is invalid
+    """
+    try:
+        profile = parse_profile(labels)
+    except ValueError as e:
+        raise RuntimeError(f"Invalid resource profile: {e}")
+    nodes = numa_nodes() if profile.get("cpuset") == AUTO else []
+    return resolve(profile, nodes, replica_index(container_name, base_name))
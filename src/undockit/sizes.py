@@ -0,0 +1,22 @@
+"""
+Sizes - byte counts written the way people write them, like 512M or 1.5G
+
+Kept apart from the modules that use them, so parsing a resource profile on
+the run path doesn't import the memory budget and everything it needs.
+"""
+
+UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_size(text: str) -> int:
+    """Parse a size like 512M or 1.5G into bytes
+
+    Raises:
+        ValueError: If it isn't a size
+    """
+    text = text.strip().upper().removesuffix("IB").removesuffix("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    return int(float(text[: len(text) - len(unit)]) * UNITS[unit])
@@ -0,0 +1,193 @@
+"""
+Status - what's warm, how busy it is, and what it's holding on to
+
+The runtime is asked once for every undockit container; everything else
+comes from the control directories the containers share with us and from
+the containers' cgroups.
+"""
+
+import os
+import time
+from pathlib import Path
+
+from undockit import cache
+from undockit.backend import Backend, state
+from undockit.pool import count_sessions
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+PROC_ROOT = Path("/proc")
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def cgroup_path(cgroup: str) -> str | None:
+    """Get a process's container cgroup from /proc/pid/cgroup, on cgroup v2
+
+    Podman may put the container's processes in a child of the container's
+    own cgroup, so that's stepped out of to count execs too.
+    """
+    for line in cgroup.splitlines():
+        if line.startswith("0::"):
+            path = line[3:].strip()
+            return path.removesuffix("/container") or "/"
+    return None
+
+
+def parse_flat_keyed(text: str) -> dict[str, int]:
+    """Parse a cgroup file of "key value" lines, like memory.stat and cpu.stat"""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            pass
+    return values
+
+
+def seconds_left(idle_since: float | None, timeout: int | None, sessions: int, now: float) -> float | None:
+    """Seconds until an idle container times out, or None if it's busy or unknown"""
+    if sessions or idle_since is None or timeout is None:
+        return None
+    return max(0.0, idle_since + timeout - now)
+
+
+def cpu_percent(before: float | None, after: float | None, seconds: float) -> float | None:
+    """CPU use between two cumulative CPU time readings"""
+    if before is None or after is None or seconds <= 0:
+        return None
+    return max(0.0, (after - before) / seconds * 100)
+
+
+def format_bytes(size: int | None) -> str:
+    if size is None:
+        return "-"
+    if size < 1024:
+        return f"{size}B"
+    for unit in ("K", "M", "G"):
+        size /= 1024
+        if size < 1024 or unit == "G":
+            return f"{size:.1f}{unit}"
+
+
+def add_cpu_percent(rows: list[dict], previous: list[dict], seconds: float) -> None:
+    """Work out each container's CPU use since the previous rows"""
+    before = {row["name"]: row["cpu_seconds"] for row in previous}
+    for row in rows:
+        row["cpu_percent"] = cpu_percent(before.get(row["name"]), row["cpu_seconds"], seconds)
+
+
+def format_table(rows: list[dict]) -> str:
+    """Format status rows as a table"""
+    lines = [f"{'tool':<16}{'container':<32}{'execs':>6}{'idle':>8}{'stops in':>10}{'rss':>9}{'cpu':>9}"]
+    for row in rows:
+        idle = "-" if row["idle_seconds"] is None else f"{row['idle_seconds']:.0f}s"
+        left = "-" if row["seconds_left"] is None else f"{row['seconds_left']:.0f}s"
+        if row.get("cpu_percent") is not None:
+            cpu = f"{row['cpu_percent']:.1f}%"
+        else:
+            cpu = "-" if row["cpu_seconds"] is None else f"{row['cpu_seconds']:.1f}s"
+        lines.append(
+            f"{row['tool'] or '-':<16}{row['name']:<32}{row['sessions']:>6}{idle:>8}{left:>10}"
+            f"{format_bytes(row['rss']):>9}{cpu:>9}"
+        )
+    return "\n".join(lines)
+
+
+def tool_containers(names: list[str], container_name: str) -> list[str]:
+    """Pick out a tool's container and its pool replicas"""
+    return [name for name in names if name == container_name or name.startswith(f"{container_name}-")]
+
+
+# --- System Interface Functions ---
+
+
+def read_usage(pid: int, cgroup_root: Path = CGROUP_ROOT, proc_root: Path = PROC_ROOT) -> dict:
+    """Read a container's memory and CPU time from its cgroup
+
+    Returns:
+        Dict of rss and memory in bytes and cpu_seconds, each None if unknown
+    """
+    usage = {"rss": None, "memory": None, "cpu_seconds": None}
+    try:
+        path = cgroup_path((proc_root / str(pid) / "cgroup").read_text())
+    except OSError:
+        return usage
+    if path is None:
+        return usage
+
+    group = cgroup_root / path.lstrip("/")
+    try:
+        usage["memory"] = int((group / "memory.current").read_text())
+        usage["rss"] = parse_flat_keyed((group / "memory.stat").read_text()).get("anon")
+    except (OSError, ValueError):
+        pass
+    try:
+        usage_usec = parse_flat_keyed((group / "cpu.stat").read_text()).get("usage_usec")
+        usage["cpu_seconds"] = None if usage_usec is None else usage_usec / 1e6
+    except OSError:
+        pass
+    return usage
+
+
+def idle_since(container_name: str) -> float | None:
+    """When a container's last exec session started or ended
+
+    Sessions add and remove pid files, and the startup script times out from
+    the pid directory's mtime, so that's when it went idle.
+    """
+    try:
+        return os.stat(state.control_dir(container_name) / "pid").st_mtime
+    except OSError:
+        return None
+
+
+def tool_name(image_id: str) -> str:
+    """The name of the tool an image was built for, if it was built here"""
+    path = cache.read("tools", image_id)
+    return os.path.basename(path) if path else ""
+
+
+def collect(backend: Backend, now: float | None = None) -> list[dict]:
+    """Get the status of every warm container
+
+    Returns:
+        Row dicts, sorted by tool and container name
+    """
+    now = time.time() if now is None else now
+    rows = []
+    for container in backend.list_containers():
+        name = container["name"]
+        sessions = count_sessions(name)
+        since = idle_since(name)
+        try:
+            timeout = int(container["labels"]["undockit.timeout"])
+        except (KeyError, ValueError):
+            timeout = None
+
+        row = {
+            "name": name,
+            "tool": tool_name(container["image_id"]),
+            "image_id": container["image_id"],
+            "sessions": sessions,
+            "timeout": timeout,
+            "idle_seconds": None if sessions or since is None else max(0.0, now - since),
+            "seconds_left": seconds_left(since, timeout, sessions, now),
+            "started": container["started"],
+        }
+        row.update(read_usage(container["pid"]))
+        rows.append(row)
+
+    return sorted(rows, key=lambda row: (row["tool"], row["name"]))
+
+
+def stop_containers(backend: Backend, names: list[str], jobs: int = 32) -> dict[str, str | None]:
+    """Stop containers, jobs at a time
+
+    Returns:
+        Each container's error, or None if it stopped
+    """
+    from undockit.backend import aio
+
+    return aio.stop_containers(backend, names, jobs)
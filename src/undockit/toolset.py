@@ -0,0 +1,248 @@
+"""
+Toolsets - install many tools at once from a manifest, pinned to image digests
+
+A toolset.toml lists the tools to install:
+
+    [defaults]
+    timeout = 900
+
+    [tools]
+    jq = "ghcr.io/jqlang/jq:latest"
+    whisper = { image = "ghcr.io/org/whisper:v3", replicas = 2, shm_size = "2G" }
+
+Each image is pulled up front and its tag resolved to a digest, and the
+wrappers are pinned to that digest, so no tool run ever waits on a pull or a
+registry lookup. The digests are recorded in a lockfile next to the manifest,
+and reused by later installs until they're asked to update.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from undockit import resources
+from undockit.backend import Backend
+from undockit.backend.base import thread_backend
+from undockit.install import install
+
+LOCK_VERSION = 1
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_manifest(data: dict, timeout: int = 600, replicas: int = 1) -> list[dict]:
+    """Get the tools from a parsed manifest
+
+    Args:
+        data: The manifest's TOML, parsed
+        timeout: Container timeout for tools that don't set one
+        replicas: Warm containers for tools that don't set a count
+
+    Returns:
+        List of dicts with name, image, timeout, replicas, host_paths,
+        path_options and resources keys
+
+    Raises:
+        ValueError: If the manifest is malformed
+    """
+    defaults = data.get("defaults", {})
+    tools = data.get("tools")
+    if not isinstance(defaults, dict) or not isinstance(tools, dict) or not tools:
+        raise ValueError("Manifest needs a [tools] table")
+
+    parsed = []
+    for name, entry in tools.items():
+        if isinstance(entry, str):
+            entry = {"image": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("image"), str):
+            raise ValueError(f"Tool {name} needs an image")
+        if "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid tool name: {name}")
+
+        tool = {
+            "name": name,
+            "image": entry["image"],
+            "timeout": entry.get("timeout", defaults.get("timeout", timeout)),
+            "replicas": entry.get("replicas", defaults.get("replicas", replicas)),
+        }
+        for key in ("timeout", "replicas"):
+            if not isinstance(tool[key], int) or isinstance(tool[key], bool) or tool[key] < 1:
+                raise ValueError(f"Tool {name} has an invalid {key}")
+
+        tool["host_paths"] = entry.get("host_paths", defaults.get("host_paths", False))
+        tool["path_options"] = entry.get("path_options", [])
+        if not isinstance(tool["host_paths"], bool):
+            raise ValueError(f"Tool {name} has an invalid host_paths")
+        if not isinstance(tool["path_options"], list) or not all(isinstance(k, str) for k in tool["path_options"]):
+            raise ValueError(f"Tool {name} has invalid path_options")
+
+        tool["resources"] = {}
+        for key in resources.KEYS:
+            value = entry.get(key.replace("-", "_"), defaults.get(key.replace("-", "_")))
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                tool["resources"][key] = value
+            elif value is not None:
+                raise ValueError(f"Tool {name} has an invalid {key}")
+        try:
+            resources.make_labels(tool["resources"])
+        except ValueError as e:
+            raise ValueError(f"Tool {name}: {e}")
+        parsed.append(tool)
+
+    return parsed
+
+
+def locked_reference(lock: dict, tool: dict) -> str | None:
+    """Get a tool's pinned reference from the lock, if it's for the same image"""
+    entry = lock.get("tools", {}).get(tool["name"])
+    if isinstance(entry, dict) and entry.get("image") == tool["image"]:
+        return entry.get("pinned")
+    return None
+
+
+def make_lock(results: list[dict], old_lock: dict) -> dict:
+    """Make a lock from install results, keeping old entries for tools that failed"""
+    tools = {}
+    for result in results:
+        if result.get("pinned"):
+            tools[result["name"]] = {"image": result["image"], "pinned": result["pinned"]}
+        elif result["name"] in old_lock.get("tools", {}):
+            tools[result["name"]] = old_lock["tools"][result["name"]]
+    return {"version": LOCK_VERSION, "tools": tools}
+
+
+# --- System Interface Functions ---
+
+
+def lock_path(manifest_path: Path) -> Path:
+    """Where a manifest's lockfile lives"""
+    return manifest_path.with_suffix(".lock")
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    """Read a TOML manifest
+
+    Raises:
+        ValueError: If it can't be read or parsed
+    """
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import tomli as tomllib
+
+    try:
+        with open(manifest_path, "rb") as f:
+            return tomllib.load(f)
+    except OSError as e:
+        raise ValueError(f"Can't read {manifest_path}: {e.strerror}")
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"Invalid manifest {manifest_path}: {e}")
+
+
+def load_lock(path: Path) -> dict:
+    """Read a lockfile, or an empty lock if there isn't a usable one"""
+    try:
+        lock = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(lock, dict) or lock.get("version") != LOCK_VERSION:
+        return {}
+    return lock
+
+
+def save_lock(path: Path, lock: dict) -> None:
+    """Write a lockfile atomically"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp_path.write_text(json.dumps(lock, indent=2, sort_keys=True) + "\n")
+    os.replace(tmp_path, path)
+
+
+def pin_tool(backend: Backend, tool: dict, lock: dict, update: bool = False) -> dict:
+    """Make sure a tool's image is local, and find the digest to pin it to
+
+    A locked digest that's already in local storage needs no pull at all.
+
+    Returns:
+        The tool with pinned and status keys added, or an error key
+    """
+    result = dict(tool)
+    try:
+        pinned = None if update else locked_reference(lock, tool)
+        if pinned and backend.image_exists(pinned):
+            result.update(pinned=pinned, status="locked")
+        else:
+            # A locked digest that's gone is pulled by digest, not by tag
+            result.update(pinned=backend.pull(pinned or tool["image"]), status="pulled")
+    except RuntimeError as e:
+        result["error"] = str(e)
+    return result
+
+
+def install_toolset(
+    backend: Backend,
+    manifest_path: Path,
+    to: str = "user",
+    prefix: Path | None = None,
+    jobs: int = 4,
+    update: bool = False,
+    timeout: int = 600,
+    replicas: int = 1,
+    on_result=None,
+) -> list[dict]:
+    """Pull and install every tool in a manifest, and record their digests
+
+    Args:
+        backend: Backend to pull with, cloned for each download
+        manifest_path: The toolset.toml
+        to: Installation target
+        prefix: Override installation prefix
+        jobs: Downloads at a time
+        update: Resolve tags again rather than using locked digests
+        timeout: Container timeout for tools that don't set one
+        replicas: Warm containers for tools that don't set a count
+        on_result: Called from this thread with each tool's result as it's installed
+
+    Returns:
+        Each tool with status and path keys, or an error key if it failed
+
+    Raises:
+        ValueError: If the manifest is malformed
+    """
+    tools = parse_manifest(load_manifest(manifest_path), timeout, replicas)
+    lock = load_lock(lock_path(manifest_path))
+    worker_backend = thread_backend(backend)
+
+    def one(tool: dict) -> dict:
+        result = pin_tool(worker_backend(), tool, lock, update)
+        if "error" not in result:
+            try:
+                result["path"] = install(
+                    image=result["pinned"],
+                    to=to,
+                    name=tool["name"],
+                    prefix=prefix,
+                    timeout=tool["timeout"],
+                    replicas=tool["replicas"],
+                    source=tool["image"],
+                    host_paths=tool["host_paths"],
+                    path_options=tool["path_options"],
+                    resources=tool["resources"],
+                )
+            except (ValueError, OSError) as e:
+                # Its wrapper still has the old digest, if any, so the lock should too
+                del result["pinned"]
+                result["error"] = str(e)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(one, tool) for tool in tools]
+        # Reported here rather than by the workers, so their lines can't interleave
+        for future in as_completed(futures):
+            if on_result:
+                on_result(future.result())
+        results = [future.result() for future in futures]
+
+    save_lock(lock_path(manifest_path), make_lock(results, lock))
+    return results
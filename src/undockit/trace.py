@@ -0,0 +1,252 @@
+"""
+Tracing - records where a run spends its time, as nested spans
+
+Enabled with UNDOCKIT_TRACE=path or --trace=path. Interpreter startup,
+backend calls, API requests, locks and subprocesses are recorded with
+monotonic timestamps, and written at exit as Chrome trace events (open them
+in Perfetto or chrome://tracing), or as JSON lines if the path ends in
+.jsonl. Any {pid} in the path is replaced by the process ID, so that each run
+can have its own trace; JSON lines are appended, so runs can also share one.
+
+When tracing is off, instrument() leaves everything as it is and span()
+returns a shared no-op, so the cost is a check of a global.
+"""
+
+import os
+import sys
+import time
+from _thread import get_native_id
+
+# Spans recorded so far, or None while tracing is off
+_spans: list | None = None
+_path = ""
+
+# Longest argument recorded as it is
+MAX_ARG_LENGTH = 200
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def describe(value):
+    """Make a value fit for a trace, or None if it's not worth recording"""
+    if isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (str, os.PathLike)):
+        text = os.fspath(value)
+        if isinstance(text, bytes):
+            text = text.decode(errors="replace")
+        return text if len(text) <= MAX_ARG_LENGTH else text[:MAX_ARG_LENGTH] + "..."
+    if isinstance(value, (list, tuple)) and all(isinstance(item, (str, int, os.PathLike)) for item in value):
+        return [describe(item) for item in value]
+    return None
+
+
+def describe_args(args: tuple) -> list:
+    """Describe a call's positional arguments, leaving out objects"""
+    return [description for description in map(describe, args) if description is not None]
+
+
+def pop_trace_arg(argv: list[str]) -> tuple[str | None, list[str]]:
+    """Take a leading --trace=PATH or --trace PATH off the command line"""
+    if argv[:1] == ["--trace"] and len(argv) > 1:
+        return argv[1], argv[2:]
+    if argv[:1] and argv[0].startswith("--trace="):
+        return argv[0].partition("=")[2], argv[1:]
+    return None, argv
+
+
+def trace_path(template: str, pid: int) -> str:
+    """Fill in the process ID in a trace path"""
+    return template.replace("{pid}", str(pid))
+
+
+def parse_start_ticks(stat: str) -> int:
+    """Get a process's start time, in clock ticks since boot, from /proc/pid/stat"""
+    # The command name can hold anything, so count fields from after it
+    return int(stat.rpartition(")")[2].split()[19])
+
+
+def chrome_events(spans: list[dict], pid: int) -> dict:
+    """Convert spans to the Chrome trace event format"""
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "undockit"}}]
+    for span in spans:
+        events.append(
+            {
+                "name": span["name"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6, 1),
+                "dur": round((span["end"] - span["start"]) * 1e6, 1),
+                "pid": pid,
+                "tid": span["tid"],
+                "args": span["args"],
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+# --- System Interface Functions ---
+
+
+class NoSpan:
+    """What span() gives when tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Span:
+    """A timed section of a run, recorded when it ends"""
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        record(self.name, self.start, time.monotonic(), self.args)
+        return False
+
+    def set(self, **args) -> None:
+        """Add details that are only known part way through"""
+        self.args.update(args)
+
+
+def enabled() -> bool:
+    return _spans is not None
+
+
+def record(name: str, start: float, end: float, args: dict | None = None) -> None:
+    """Record a span that's already over"""
+    if _spans is not None:
+        _spans.append({"name": name, "start": start, "end": end, "tid": get_native_id(), "args": args or {}})
+
+
+def span(name: str, **args):
+    """Time a block of code
+
+    Usage:
+        with trace.span("build", dockerfile=path) as span:
+            ...
+            span.set(image_id=image_id)
+    """
+    if _spans is None:
+        return NO_SPAN
+    return Span(name, args)
+
+
+def traced(name: str, function, method: bool):
+    """Wrap a function so each call is a span, with its arguments and simple results"""
+
+    def wrapper(*args, **kwargs):
+        with Span(name, {"args": describe_args(args[1:] if method else args)}) as current:
+            result = function(*args, **kwargs)
+            description = describe(result)
+            if description is not None:
+                current.args["result"] = description
+            return result
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def instrument(target, *names: str) -> None:
+    """Trace calls to some of a class's methods or a module's functions
+
+    Does nothing unless tracing is on, so it can be called where they're defined.
+    """
+    if _spans is None:
+        return
+
+    method = isinstance(target, type)
+    prefix = target.__name__.rpartition(".")[2]
+    for name in names:
+        function = vars(target).get(name)
+        if callable(function) and not hasattr(function, "__wrapped__"):
+            setattr(target, name, traced(f"{prefix}.{name}", function, method))
+
+
+def process_start() -> float | None:
+    """When this process started, on the monotonic clock"""
+    try:
+        with open("/proc/self/stat") as f:
+            started = parse_start_ticks(f.read()) / os.sysconf("SC_CLK_TCK")
+        since_start = time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.monotonic() - since_start
+
+
+def trace_subprocesses() -> None:
+    """Record every subprocess.run, with its argv and exit code"""
+    import subprocess
+
+    run = subprocess.run
+
+    def traced_run(*popenargs, **kwargs):
+        argv = popenargs[0] if popenargs else kwargs.get("args")
+        with span("subprocess", argv=describe(argv)) as current:
+            result = run(*popenargs, **kwargs)
+            current.set(returncode=result.returncode)
+            return result
+
+    subprocess.run = traced_run
+
+
+def write() -> None:
+    """Write out the spans recorded so far"""
+    import json
+
+    path = trace_path(_path, os.getpid())
+    try:
+        if path.endswith(".jsonl"):
+            lines = "".join(json.dumps(dict(span, pid=os.getpid())) + "\n" for span in _spans)
+            # One append per process, so runs sharing a file don't interleave
+            with open(path, "a") as f:
+                f.write(lines)
+        else:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(chrome_events(_spans, os.getpid()), f)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"undockit: couldn't write trace to {path}: {e}", file=sys.stderr)
+
+
+def enable(path: str) -> None:
+    """Start tracing, to be written to path at exit"""
+    global _spans, _path
+    if _spans is not None:
+        return
+
+    import atexit
+
+    _spans = []
+    _path = path
+    start = process_start()
+    if start is not None:
+        # Interpreter startup and imports, up to tracing being turned on
+        record("startup", start, time.monotonic(), {"argv": describe(sys.argv)})
+
+    trace_subprocesses()
+    atexit.register(write)
+
+
+if os.environ.get("UNDOCKIT_TRACE"):
+    enable(os.environ["UNDOCKIT_TRACE"])
@@ -0,0 +1,140 @@
+"""
+Prewarming - build and start installed tools' containers ahead of their first run
+"""
+
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from undockit import history
+from undockit.backend import Backend
+from undockit.backend.base import thread_backend
+from undockit.client import parse_run_args
+
+# Enough to recognise a shebang without reading whole files
+HEAD_SIZE = 512
+
+
+# --- Pure Logic Functions (testable) ---
+
+
+def parse_shebang(head: bytes, path: Path) -> dict | None:
+    """Get the run options from an undockit shebang
+
+    Args:
+        head: Start of the file
+        path: The file, which is the dockerfile the shebang runs
+
+    Returns:
+        Run options as from client.parse_run_args, or None if it's not an
+        undockit tool
+    """
+    if not head.startswith(b"#!"):
+        return None
+
+    line = head[2:].split(b"\n", 1)[0].decode(errors="replace")
+    try:
+        words = shlex.split(line)
+    except ValueError:
+        return None
+
+    for index, word in enumerate(words[:-1]):
+        if os.path.basename(word) == "undockit" and words[index + 1] == "run":
+            return parse_run_args(words[index + 2 :] + [str(path)])
+    return None
+
+
+def format_report(results: list[dict]) -> str:
+    """Format warm results as a table"""
+    lines = [f"{'tool':<24}{'build':>8}{'start':>8}{'total':>8}  status"]
+    for result in results:
+        lines.append(
+            f"{result['tool']:<24}{result['build']:>7.2f}s{result['start']:>7.2f}s{result['total']:>7.2f}s"
+            f"  {result['status']}"
+        )
+    return "\n".join(lines)
+
+
+# --- System Interface Functions ---
+
+
+def read_options(path: Path) -> dict | None:
+    """Read the run options from a file's shebang, or None if it's not an undockit tool"""
+    try:
+        with open(path, "rb") as f:
+            return parse_shebang(f.read(HEAD_SIZE), path)
+    except OSError:
+        return None
+
+
+def find_tools(bin_dir: Path) -> list[Path]:
+    """Find the undockit tools installed in a directory"""
+    try:
+        paths = sorted(bin_dir.iterdir())
+    except OSError:
+        return []
+    return [path for path in paths if path.is_file() and read_options(path) is not None]
+
+
+def warm_tool(backend: Backend, path: Path, keep: int | None = None) -> dict:
+    """Build a tool's image and start its container, timing each step
+
+    Only the first container of a pool is started; the rest follow demand.
+
+    Args:
+        backend: Backend to use
+        path: The tool, an undockit-shebang dockerfile
+        keep: Idle timeout for the container, instead of the tool's own
+
+    Returns:
+        Dict with the tool's name, build, start and total seconds, and status
+    """
+    result = {"tool": path.name, "build": 0.0, "start": 0.0, "total": 0.0}
+    start = time.monotonic()
+    try:
+        options = read_options(path)
+        if options is None:
+            raise RuntimeError(f"{path} is not an undockit tool")
+
+        image_id = backend.get_image(path)
+        built = time.monotonic()
+        result["build"] = built - start
+
+        timeout = keep if keep is not None else history.timeout_for(path, options["timeout"])
+        started = backend.ensure_running(backend.name(image_id), image_id, timeout)
+        result["start"] = time.monotonic() - built
+        result["status"] = "started" if started else "already warm"
+    except (RuntimeError, OSError) as e:
+        result["status"] = f"error: {e}"
+
+    result["total"] = time.monotonic() - start
+    return result
+
+
+def warm(backend: Backend, paths: list[Path], jobs: int = 4, keep: int | None = None, on_result=None) -> list[dict]:
+    """Warm several tools at once
+
+    Args:
+        backend: Backend to use, cloned for each worker
+        paths: Tools to warm
+        jobs: How many to build or start at a time
+        keep: Idle timeout for the containers, instead of each tool's own
+        on_result: Called from this thread with each result as it's ready
+
+    Returns:
+        Results in the order of paths
+    """
+    worker_backend = thread_backend(backend)
+
+    def one(path: Path) -> dict:
+        return warm_tool(worker_backend(), path, keep)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(one, path) for path in paths]
+        # Reported here rather than by the workers, so their lines can't interleave
+        for future in as_completed(futures):
+            if on_result:
+                on_result(future.result())
+        return [future.result() for future in futures]
@@ -0,0 +1,71 @@
+"""
+Shared fixtures
+"""
+
+import json
+import os
+import shutil
+import signal
+import sys
+from pathlib import Path
+
+import pytest
+
+from undockit.backend import state
+
+FAKE_PODMAN = Path(__file__).parent / "fake_podman.py"
+
+
+class FakePodman:
+    """Handle on a fake podman CLI installed on PATH"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def calls(self, command: str | None = None) -> list[list[str]]:
+        """Podman calls made so far, optionally just those of one subcommand"""
+        try:
+            lines = (self.root / "calls.log").read_text().splitlines()
+        except FileNotFoundError:
+            return []
+        calls = [json.loads(line) for line in lines]
+        return [call for call in calls if command is None or call[0] == command]
+
+    def containers(self) -> list[str]:
+        """Names of containers ever started and not stopped"""
+        return sorted(path.stem for path in (self.root / "containers").glob("*.json"))
+
+    def cleanup(self) -> None:
+        """Kill every fake container and remove its control directory"""
+        for path in (self.root / "containers").glob("*.json"):
+            try:
+                os.killpg(json.loads(path.read_text())["pid"], signal.SIGTERM)
+            except (OSError, ValueError, KeyError):
+                pass
+            shutil.rmtree(state.control_dir(path.stem), ignore_errors=True)
+
+
+@pytest.fixture
+def fake_podman(tmp_path, monkeypatch):
+    """Put a fake podman first on PATH, with undockit's dirs in tmp_path"""
+    root = tmp_path / "podman"
+    bin_dir = tmp_path / "bin"
+    (root / "containers").mkdir(parents=True)
+    bin_dir.mkdir()
+
+    podman = bin_dir / "podman"
+    podman.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PODMAN}" "$@"\n')
+    podman.chmod(0o755)
+
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_PODMAN_DIR", str(root))
+    monkeypatch.setenv("UNDOCKIT_BACKEND", "cli")
+    # The exec server would run commands on the host, where there's no /host to cd to
+    monkeypatch.setenv("UNDOCKIT_NO_EXEC_SERVER", "1")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+
+    fake = FakePodman(root)
+    yield fake
+    fake.cleanup()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+A stand-in for the podman CLI, just enough of it to drive PodmanBackend
+
+Containers are the startup script run by a local /bin/sh, and exec runs the
+command directly on the host. Every call is logged, so tests can count them.
+
+Environment:
+    FAKE_PODMAN_DIR: Directory for images, containers and the call log
+    FAKE_PODMAN_BUILD_DELAY: Seconds a build takes
+    FAKE_PODMAN_START_DELAY: Seconds before a started container is running
+    FAKE_PODMAN_LATENCY: Extra seconds per subcommand, like "build=0.5,exec=0.01"
+
+Pulls come from registry.json in FAKE_PODMAN_DIR, a map of repo:tag to the
+digest it currently points at; every repo is in the registry.test registry.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+STATE_DIR = Path(os.environ["FAKE_PODMAN_DIR"])
+
+
+def log_call(argv: list[str]) -> None:
+    # A single small append is atomic, so concurrent calls don't interleave
+    with open(STATE_DIR / "calls.log", "a") as f:
+        f.write(json.dumps(argv) + "\n")
+
+
+def write_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def read_json(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A container that exited but hasn't been reaped yet isn't running
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+        return stat.rpartition(")")[2].split()[0] not in ("Z", "X")
+    except (OSError, IndexError):
+        return False
+
+
+def container(name: str) -> dict | None:
+    record = read_json(STATE_DIR / "containers" / f"{name}.json")
+    if record and pid_alive(record["pid"]):
+        return record
+    return None
+
+
+def log_event(kind: str, action: str, name: str = "", object_id: str = "") -> None:
+    with open(STATE_DIR / "events.log", "a") as f:
+        f.write(json.dumps({"Type": kind, "Status": action, "Name": name, "ID": object_id}) + "\n")
+
+
+def kill(name: str) -> None:
+    record = read_json(STATE_DIR / "containers" / f"{name}.json")
+    if record:
+        try:
+            os.killpg(record["pid"], 15)
+        except ProcessLookupError:
+            pass
+        (STATE_DIR / "containers" / f"{name}.json").unlink(missing_ok=True)
+        log_event("container", "died", name, record["id"])
+
+
+def build(args: list[str]) -> int:
+    dockerfile = Path(args[args.index("-f") + 1])
+    content = dockerfile.read_bytes()
+    time.sleep(float(os.environ.get("FAKE_PODMAN_BUILD_DELAY", "0")))
+
+    config = {"Entrypoint": None, "Cmd": None, "WorkingDir": "", "Env": [], "Labels": {}}
+    for line in content.decode().splitlines():
+        keyword, _, value = line.partition(" ")
+        if keyword in ("ENTRYPOINT", "CMD"):
+            config[keyword.title()] = json.loads(value)
+        elif keyword == "LABEL":
+            key, _, label = value.partition("=")
+            config["Labels"][key] = json.loads(label)
+
+    image_id = hashlib.sha256(content).hexdigest()
+    write_json(STATE_DIR / "images" / image_id, config)
+
+    if "--iidfile" in args:
+        Path(args[args.index("--iidfile") + 1]).write_text(f"sha256:{image_id}")
+    else:
+        print(image_id)
+    return 0
+
+
+def image(args: list[str]) -> int:
+    action, image_id = args[0], args[1]
+    image_id = (read_json(STATE_DIR / "refs.json") or {}).get(image_id, image_id)
+    config = read_json(STATE_DIR / "images" / image_id)
+    if config is None:
+        print(f"Error: {image_id}: image not known", file=sys.stderr)
+        return 1
+    if action == "inspect":
+        print(json.dumps(config.get("RepoDigests", []) if "RepoDigests" in args[-1] else config))
+    return 0
+
+
+def pull(args: list[str]) -> int:
+    reference = args[-1]
+    repo, _, digest = reference.partition("@")
+    repo = repo.removeprefix("registry.test/")
+    if ":" not in repo and not digest:
+        repo += ":latest"
+
+    registry = read_json(STATE_DIR / "registry.json") or {}
+    if digest:
+        found = [tag for tag, tag_digest in registry.items() if tag_digest == digest and tag.startswith(f"{repo}:")]
+    else:
+        found = [repo] if repo in registry else []
+    if not found:
+        print(f"Error: {reference}: manifest unknown", file=sys.stderr)
+        return 125
+
+    digest = registry[found[0]]
+    image_id = hashlib.sha256(digest.encode()).hexdigest()
+    pinned = f"registry.test/{found[0].rsplit(':', 1)[0]}@{digest}"
+
+    # Concurrent pulls mustn't lose each other's references
+    with open(STATE_DIR / "refs.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        config = read_json(STATE_DIR / "images" / image_id) or {"Labels": {}, "RepoDigests": []}
+        config["RepoDigests"] = sorted(set(config["RepoDigests"]) | {pinned})
+        write_json(STATE_DIR / "images" / image_id, config)
+        refs = read_json(STATE_DIR / "refs.json") or {}
+        refs.update({reference: image_id, pinned: image_id})
+        write_json(STATE_DIR / "refs.json", refs)
+    print(image_id)
+    return 0
+
+
+def run(args: list[str]) -> int:
+    name = args[args.index("--name") + 1]
+    script = args[-1]
+    if "--replace" in args:
+        kill(name)
+
+    time.sleep(float(os.environ.get("FAKE_PODMAN_START_DELAY", "0")))
+
+    # The container ID goes on the command line so liveness checks can find it
+    container_id = hashlib.sha256(f"{name}{time.time()}".encode()).hexdigest()
+    process = subprocess.Popen(
+        ["/bin/sh", "-c", script, container_id],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    labels = dict(args[index + 1].split("=", 1) for index, arg in enumerate(args) if arg == "--label")
+    record = {"id": container_id, "pid": process.pid, "image": args[-3], "labels": labels, "started": int(time.time())}
+    write_json(STATE_DIR / "containers" / f"{name}.json", record)
+    log_event("container", "start", name, container_id)
+    print(container_id)
+    return 0
+
+
+def inspect(args: list[str]) -> int:
+    record = container(args[0])
+    if record is None:
+        print(f"Error: no such container {args[0]}", file=sys.stderr)
+        return 125
+    print(f"{record['pid']} {record['pid']}")
+    return 0
+
+
+def ps(args: list[str]) -> int:
+    wanted = args[args.index("--filter") + 1].removeprefix("name=")
+    found = []
+    for path in sorted((STATE_DIR / "containers").glob("*.json")):
+        record = container(path.stem)
+        if record is None and "--all" in args:
+            record = read_json(path)
+            if record:
+                record["state"] = "exited"
+        if record and re.search(wanted, path.stem):
+            found.append((path.stem, record))
+
+    if args[args.index("--format") + 1] == "json":
+        entries = [
+            {
+                "Names": [name],
+                "Id": record["id"],
+                "ImageID": record.get("image", ""),
+                "Pid": record["pid"],
+                "Labels": record.get("labels", {}),
+                "StartedAt": record.get("started", 0),
+                "State": record.get("state", "running"),
+            }
+            for name, record in found
+        ]
+        print(json.dumps(entries))
+    else:
+        for name, _ in found:
+            print(name)
+    return 0
+
+
+def exec_(args: list[str]) -> int:
+    while args[0].startswith("-"):
+        args = args[1:]
+    name, _script, _workdir, *argv = args
+    if container(name) is None:
+        print(f"Error: container {name} is not running", file=sys.stderr)
+        return 125
+    return subprocess.run(argv, check=False).returncode
+
+
+def events(args: list[str]) -> int:
+    # Follow the event log from its current end, like podman does
+    path = STATE_DIR / "events.log"
+    path.touch()
+    with open(path) as f:
+        f.seek(0, os.SEEK_END)
+        while True:
+            line = f.readline()
+            if line:
+                print(line, end="", flush=True)
+            else:
+                time.sleep(0.02)
+
+
+def stop(args: list[str]) -> int:
+    kill(args[0])
+    return 0
+
+
+def rm(args: list[str]) -> int:
+    for name in [arg for arg in args if not arg.startswith("-")]:
+        kill(name)
+    return 0
+
+
+def images(args: list[str]) -> int:
+    entries = []
+    for path in sorted((STATE_DIR / "images").glob("*")):
+        entries.append({"Id": path.name, "Size": path.stat().st_size, "Created": int(path.stat().st_mtime)})
+    print(json.dumps(entries))
+    return 0
+
+
+def rmi(args: list[str]) -> int:
+    for image_id in [arg for arg in args if not arg.startswith("-")]:
+        (STATE_DIR / "images" / image_id).unlink(missing_ok=True)
+        log_event("image", "remove", "", image_id)
+    return 0
+
+
+COMMANDS = {
+    "build": build,
+    "image": image,
+    "pull": pull,
+    "run": run,
+    "inspect": inspect,
+    "ps": ps,
+    "exec": exec_,
+    "events": events,
+    "stop": stop,
+    "rm": rm,
+    "images": images,
+    "rmi": rmi,
+}
+
+
+def parse_latency(spec: str) -> dict[str, float]:
+    latency = {}
+    for item in filter(None, spec.split(",")):
+        command, _, seconds = item.partition("=")
+        latency[command.strip()] = float(seconds)
+    return latency
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    log_call(argv)
+    time.sleep(parse_latency(os.environ.get("FAKE_PODMAN_LATENCY", "")).get(argv[0], 0))
+    return COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
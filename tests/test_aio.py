@@ -0,0 +1,105 @@
+"""
+Tests for the asyncio backend
+"""
+
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from undockit.backend import aio
+from undockit.backend.podman import PodmanBackend
+
+
+def test_map_bounded():
+    """Results keep their order, errors are returned, and no more than jobs run at once"""
+    running, peak = 0, 0
+
+    async def work(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if item == 3:
+            raise RuntimeError("three")
+        return item * 2
+
+    results = asyncio.run(aio.map_bounded(work, list(range(20)), jobs=4))
+    assert peak == 4
+    assert results[:3] == [0, 2, 4] and isinstance(results[3], RuntimeError) and results[19] == 38
+
+
+class StoppingBackend:
+    """A sync backend that takes a while to stop things"""
+
+    def __init__(self):
+        self.stopped = []
+
+    def clone(self):
+        return self
+
+    def stop(self, name):
+        time.sleep(0.2)
+        if name == "missing":
+            raise RuntimeError("no such container")
+        self.stopped.append(name)
+
+
+def test_stop_containers_threaded():
+    """Sync backends are driven from worker threads, with errors per container"""
+    backend = StoppingBackend()
+    names = [f"c{index}" for index in range(8)] + ["missing"]
+    start = time.monotonic()
+    errors = aio.stop_containers(backend, names, jobs=9)
+    assert time.monotonic() - start < 1
+    assert errors == {**{name: None for name in names[:-1]}, "missing": "no such container"}
+
+
+@pytest.fixture
+def tool(fake_podman, tmp_path):
+    dockerfile = tmp_path / "tool"
+    dockerfile.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+    yield dockerfile
+    fake_podman.cleanup()
+
+
+def test_probe_overlaps(fake_podman, tool, monkeypatch):
+    """The running check and the inspect wait on podman at the same time"""
+    image_id = PodmanBackend().get_image(tool)
+    monkeypatch.setenv("FAKE_PODMAN_LATENCY", "ps=0.5,image=0.5")
+    backend = aio.AsyncPodmanBackend()
+
+    start = time.monotonic()
+    assert asyncio.run(aio.probe(backend, backend.name(image_id), image_id)) is False
+    assert time.monotonic() - start < 0.9
+    assert asyncio.run(backend.command(image_id)) == ["echo"]
+    assert len(fake_podman.calls("image")) == 1
+
+
+def test_ensure_running(fake_podman, tool):
+    """A cold start checks for the container once before the lock and once under it"""
+    backend = PodmanBackend()
+    image_id = backend.get_image(tool)
+    name = backend.name(image_id)
+    assert aio.ensure_running(backend, name, image_id) is True
+    assert aio.ensure_running(backend, name, image_id) is False
+    assert len(fake_podman.calls("ps")) == 2
+    assert len(fake_podman.calls("run")) == 1
+
+
+def test_async_podman_stop(fake_podman, tool):
+    """Many containers stop at once, and podman is only asked what's running when the state doesn't say"""
+    sync_backend = PodmanBackend()
+    image_id = sync_backend.get_image(tool)
+    names = [f"{sync_backend.name(image_id)}-{index}" for index in range(10)]
+    for name in names:
+        sync_backend.start(name, image_id, timeout=60)
+    backend = aio.AsyncPodmanBackend()
+    assert asyncio.run(backend.is_running(names[0])) is True
+    assert fake_podman.calls("ps") == []
+
+    assert aio.stop_containers(sync_backend, names) == dict.fromkeys(names)
+    assert fake_podman.containers() == []
+    assert asyncio.run(backend.is_running(names[0])) is False
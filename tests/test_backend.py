@@ -0,0 +1,221 @@
+"""
+Tests for backend base class behaviour
+"""
+
+import subprocess
+import threading
+
+import pytest
+
+from undockit.backend.base import Backend, thread_backend
+from undockit.backend.podman import PodmanBackend, image_in_storage, parse_image_config, pinned_reference, repository
+
+
+class FakeBackend(Backend):
+    """Backend that records calls instead of running containers"""
+
+    def __init__(self):
+        self.builds = 0
+        self.inspects = 0
+        self.images = set()
+
+    def build(self, dockerfile_path, quiet=False):
+        self.builds += 1
+        image_id = f"{self.builds:064x}"
+        self.images.add(image_id)
+        return image_id
+
+    def image_exists(self, image_id):
+        return image_id in self.images
+
+    def inspect(self, image_id):
+        self.inspects += 1
+        return {"entrypoint": ["tool"], "cmd": ["--help"], "workdir": "/app", "env": [], "labels": {}}
+
+    def start(self, container_name, image_id, timeout=600):
+        pass
+
+    def stop(self, container_name):
+        pass
+
+    def is_running(self, container_name):
+        return False
+
+    def exec(self, container_name, argv):
+        return 0
+
+    def name(self, image_id):
+        return f"fake-{image_id[:12]}"
+
+
+@pytest.fixture
+def dockerfile(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "tool"
+    path.write_text("FROM alpine\n")
+    return path
+
+
+def test_get_image_builds_on_miss(dockerfile):
+    """First call builds the image"""
+    backend = FakeBackend()
+    image_id = backend.get_image(dockerfile)
+    assert backend.builds == 1
+    assert image_id in backend.images
+
+
+def test_get_image_cached(dockerfile):
+    """Unchanged dockerfile doesn't build again"""
+    backend = FakeBackend()
+    first = backend.get_image(dockerfile)
+    second = backend.get_image(dockerfile)
+    assert first == second
+    assert backend.builds == 1
+
+
+def test_get_image_cache_shared_between_backends(dockerfile):
+    """Cache persists on disk, not in the backend instance"""
+    first = FakeBackend()
+    image_id = first.get_image(dockerfile)
+
+    second = FakeBackend()
+    second.images.add(image_id)
+    assert second.get_image(dockerfile) == image_id
+    assert second.builds == 0
+
+
+def test_get_image_changed_dockerfile(dockerfile):
+    """Editing the dockerfile causes a rebuild"""
+    backend = FakeBackend()
+    backend.get_image(dockerfile)
+    dockerfile.write_text("FROM ubuntu\n")
+    backend.get_image(dockerfile)
+    assert backend.builds == 2
+
+
+def test_get_image_missing_image(dockerfile):
+    """Cached ID that's gone from storage causes a rebuild"""
+    backend = FakeBackend()
+    image_id = backend.get_image(dockerfile)
+    backend.images.discard(image_id)
+    assert backend.get_image(dockerfile) != image_id
+    assert backend.builds == 2
+
+
+def test_get_image_rebuild(dockerfile):
+    """rebuild=True ignores the cache"""
+    backend = FakeBackend()
+    backend.get_image(dockerfile)
+    backend.get_image(dockerfile, rebuild=True)
+    assert backend.builds == 2
+
+
+def test_get_image_missing_dockerfile(tmp_path):
+    """Missing dockerfile is a RuntimeError"""
+    with pytest.raises(RuntimeError, match="Dockerfile not found"):
+        FakeBackend().get_image(tmp_path / "nope")
+
+
+def test_image_in_storage(tmp_path):
+    """Finds images in any known driver's image directory"""
+    image_id = "a" * 64
+    assert image_in_storage(tmp_path, image_id) is False
+    (tmp_path / "overlay-images" / image_id).mkdir(parents=True)
+    assert image_in_storage(tmp_path, image_id) is True
+    assert image_in_storage(tmp_path, "b" * 64) is False
+
+
+def test_command_combines_entrypoint_and_cmd(dockerfile):
+    """Command is ENTRYPOINT followed by CMD"""
+    assert FakeBackend().command("a" * 64) == ["tool", "--help"]
+
+
+def test_metadata_cached(dockerfile):
+    """Image config is only inspected once per image ID, even across instances"""
+    first = FakeBackend()
+    first.metadata("a" * 64)
+    first.command("a" * 64)
+    assert first.inspects == 1
+
+    second = FakeBackend()
+    assert second.metadata("a" * 64)["workdir"] == "/app"
+    assert second.inspects == 0
+
+
+def test_metadata_corrupt_cache(dockerfile, tmp_path):
+    """A corrupt cache entry is refetched"""
+    backend = FakeBackend()
+    backend.metadata("a" * 64)
+    (tmp_path / "cache" / "undockit" / "metadata" / ("a" * 64)).write_text("{not json")
+    assert backend.metadata("a" * 64)["entrypoint"] == ["tool"]
+    assert backend.inspects == 2
+
+
+def test_thread_backend():
+    """Each thread gets one clone of its own, reused on later calls"""
+
+    class Cloning(FakeBackend):
+        def clone(self):
+            return FakeBackend()
+
+    get = thread_backend(Cloning())
+    mine = get()
+    assert get() is mine
+    theirs = []
+    thread = threading.Thread(target=lambda: theirs.extend([get(), get()]))
+    thread.start()
+    thread.join()
+    assert theirs[0] is theirs[1]
+    assert theirs[0] is not mine
+
+
+def test_pull_malformed_inspect(monkeypatch):
+    """Garbled inspect output after a pull is an error, not a crash"""
+
+    def run(argv, **kwargs):
+        return subprocess.CompletedProcess(argv, 0, "<html>" if "inspect" in argv else "", "")
+
+    monkeypatch.setattr(subprocess, "run", run)
+    with pytest.raises(RuntimeError, match="malformed"):
+        PodmanBackend().pull("alpine:3")
+
+
+def test_parse_image_config():
+    """Podman config keys map to metadata keys"""
+    config = {
+        "Entrypoint": ["yolo"],
+        "Cmd": None,
+        "WorkingDir": "/app",
+        "Env": ["PATH=/usr/bin"],
+        "Labels": {"a": "b"},
+    }
+    assert parse_image_config(config) == {
+        "entrypoint": ["yolo"],
+        "cmd": [],
+        "workdir": "/app",
+        "env": ["PATH=/usr/bin"],
+        "labels": {"a": "b"},
+    }
+
+
+def test_parse_image_config_empty():
+    """Missing config gives empty defaults"""
+    assert parse_image_config(None) == {"entrypoint": [], "cmd": [], "workdir": "", "env": [], "labels": {}}
+
+
+def test_repository():
+    """Tags and digests come off, registry ports stay"""
+    assert repository("alpine:3") == "alpine"
+    assert repository("localhost:5000/org/tool:dev") == "localhost:5000/org/tool"
+    assert repository("ghcr.io/org/tool@sha256:abc") == "ghcr.io/org/tool"
+    assert repository("localhost:5000/tool") == "localhost:5000/tool"
+
+
+def test_pinned_reference():
+    """The digest for the repo it was pulled as, short names and all"""
+    digests = ["quay.io/other/alpine@sha256:aaa", "docker.io/library/alpine@sha256:bbb"]
+    assert pinned_reference("docker.io/library/alpine:3", digests) == "docker.io/library/alpine@sha256:bbb"
+    assert pinned_reference("alpine:3", digests[1:]) == "docker.io/library/alpine@sha256:bbb"
+    assert pinned_reference("other/alpine", digests) == "quay.io/other/alpine@sha256:aaa"
+    with pytest.raises(RuntimeError, match="No digest"):
+        pinned_reference("localbuild", [])
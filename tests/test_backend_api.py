@@ -0,0 +1,413 @@
+"""
+Tests for the podman REST API backend, against a stand-in service on a unix socket
+"""
+
+import json
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+from undockit.backend import state
+from undockit.backend.api import (
+    Connection,
+    PodmanApiBackend,
+    StreamDemuxer,
+    api_path,
+    container_spec,
+    get_socket_path,
+    image_id_from_build,
+    make_build_context,
+    parse_head,
+    parse_json_stream,
+    split_json_stream,
+)
+
+IMAGE_ID = "ab" * 32
+
+
+class FakePodmanService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Just enough of the libpod API to drive the backend"""
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(str(path), FakePodmanHandler)
+        self.connections = 0
+        self.requests = []
+        self.images = {IMAGE_ID}
+        self.containers = {}
+        self.labels = {}
+
+
+class FakePodmanHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, data=None, raw=None):
+        body = raw if raw is not None else b"" if data is None else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def handle_request(self, method):
+        body = self.read_body()
+        path = self.path.removeprefix("/v4.0.0/libpod")
+        endpoint = path.split("?")[0]
+        self.server.requests.append((method, endpoint))
+        parts = endpoint.strip("/").split("/")
+        containers = self.server.containers
+
+        if method == "POST" and endpoint == "/build":
+            output = [{"stream": "STEP 1/1: FROM alpine\n"}, {"aux": {"ID": f"sha256:{IMAGE_ID}"}}]
+            # Send it chunked, like the real service
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for message in output:
+                line = json.dumps(message).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.write(b"0\r\n\r\n")
+        elif parts[0] == "images" and parts[-1] == "exists":
+            self.reply(204 if parts[1] in self.server.images else 404)
+        elif endpoint == "/images/pull":
+            reference = urllib.parse.parse_qs(path.split("?")[1])["reference"][0]
+            message = {"error": "manifest unknown"} if "missing" in reference else {"id": IMAGE_ID}
+            self.reply(200, message)
+        elif endpoint == "/images/json":
+            self.reply(200, [{"Id": image_id, "Size": 1000, "Created": 1700000000} for image_id in self.server.images])
+        elif endpoint == "/images/remove" and method == "DELETE":
+            for image_id in urllib.parse.parse_qs(path.split("?")[1])["images"]:
+                self.server.images.discard(image_id)
+            self.reply(200, {"Deleted": []})
+        elif parts[0] == "images" and parts[-1] == "json" and "garbled" in parts[1]:
+            self.reply(200, raw=b"<html>")
+        elif parts[0] == "images" and parts[-1] == "json":
+            config = {"Entrypoint": ["tool"], "Cmd": ["--help"], "WorkingDir": "/app", "Labels": self.server.labels}
+            digests = [f"docker.io/library/alpine@sha256:{IMAGE_ID}"]
+            self.reply(200, {"Id": parts[1], "Config": config, "RepoDigests": digests})
+        elif endpoint == "/containers/create":
+            spec = json.loads(body)
+            containers[spec["name"]] = {"spec": spec, "running": False}
+            self.reply(201, {"Id": "c1"})
+        elif parts[0] == "containers" and method == "DELETE":
+            self.reply(200 if containers.pop(parts[1], None) else 404)
+        elif parts[0] == "containers" and parts[-1] == "start":
+            containers[parts[1]]["running"] = True
+            self.reply(204)
+        elif parts[0] == "containers" and parts[-1] == "stop":
+            if parts[1] not in containers:
+                return self.reply(404, {"message": "no such container"})
+            containers[parts[1]]["running"] = False
+            self.reply(204)
+        elif endpoint == "/containers/json":
+            entries = [
+                {"Names": [name], "Id": "c1", "ImageID": IMAGE_ID, "Pid": 100, "Labels": container["spec"]["labels"]}
+                for name, container in containers.items()
+                if container["running"]
+            ]
+            self.reply(200, entries)
+        elif parts[0] == "containers" and parts[-1] == "json":
+            if parts[1] not in containers:
+                return self.reply(404, {"message": "no such container"})
+            container_state = {"Running": containers[parts[1]]["running"], "Pid": 100, "ConmonPid": 99}
+            self.reply(200, {"Id": "c1", "State": container_state})
+        elif parts[0] == "containers" and parts[-1] == "exec":
+            self.server.exec_config = json.loads(body)
+            self.reply(201, {"Id": "e1"})
+        elif endpoint == "/exec/e1/start":
+            self.hijack()
+        elif endpoint == "/exec/e1/json":
+            self.reply(200, {"Running": False, "ExitCode": 3})
+        else:
+            self.reply(404, {"message": f"unknown endpoint {endpoint}"})
+
+    def hijack(self):
+        """Echo stdin back as stdout frames, then say goodbye on stderr"""
+        self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+        self.wfile.flush()
+        while data := self.connection.recv(65536):
+            self.wfile.write(struct.pack(">BxxxL", 1, len(data)) + data)
+        self.wfile.write(struct.pack(">BxxxL", 2, 3) + b"bye")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+
+@pytest.fixture
+def service():
+    # AF_UNIX paths are short, so don't use pytest's deep tmp_path
+    tmpdir = Path(tempfile.mkdtemp(prefix="undockit-api-"))
+    server = FakePodmanService(tmpdir / "podman.sock")
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    (tmpdir / "podman.sock").unlink()
+    tmpdir.rmdir()
+
+
+@pytest.fixture
+def backend(service, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(state, "CONTROL_ROOT", tmp_path / "undockit")
+    return PodmanApiBackend(Connection(Path(service.server_address)))
+
+
+def test_get_socket_path_override():
+    """Explicit socket setting wins"""
+    env = {"UNDOCKIT_PODMAN_SOCKET": "/x.sock", "CONTAINER_HOST": "unix:///y.sock"}
+    assert get_socket_path(env, 1000) == Path("/x.sock")
+
+
+def test_get_socket_path_container_host():
+    """Podman's CONTAINER_HOST is used for unix sockets"""
+    assert get_socket_path({"CONTAINER_HOST": "unix:///y.sock"}, 1000) == Path("/y.sock")
+
+
+def test_get_socket_path_rootless():
+    """Rootless socket is in the runtime dir"""
+    env = {"XDG_RUNTIME_DIR": "/run/user/1000"}
+    assert get_socket_path(env, 1000) == Path("/run/user/1000/podman/podman.sock")
+    assert get_socket_path({}, 1000) == Path("/run/user/1000/podman/podman.sock")
+
+
+def test_get_socket_path_root():
+    """Root uses the system socket"""
+    assert get_socket_path({}, 0) == Path("/run/podman/podman.sock")
+
+
+def test_api_path():
+    """Endpoints get the API prefix and encoded params"""
+    assert api_path("/images/x/json") == "/v4.0.0/libpod/images/x/json"
+    assert api_path("/build", {"q": "true", "dockerfile": "a b"}) == "/v4.0.0/libpod/build?q=true&dockerfile=a+b"
+
+
+def test_parse_head():
+    """Status and lowercased headers are parsed"""
+    status, headers = parse_head(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\nX-Thing: a:b")
+    assert status == 204
+    assert headers == {"content-length": "0", "x-thing": "a:b"}
+
+
+def test_parse_head_malformed():
+    """Garbage responses are a RuntimeError"""
+    with pytest.raises(RuntimeError, match="Malformed"):
+        parse_head(b"nonsense")
+
+
+def test_parse_json_stream():
+    """Concatenated and newline separated objects are both parsed"""
+    assert list(parse_json_stream('{"a": 1}{"b": 2}\n{"c": 3}\n')) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+
+def test_split_json_stream():
+    """A partial object at the end is kept for when the rest arrives"""
+    assert split_json_stream('{"a": 1}\n{"b": ') == ([{"a": 1}], '{"b": ')
+    assert split_json_stream("") == ([], "")
+
+
+def test_image_id_from_build_aux():
+    """Image ID comes from the aux message"""
+    messages = [{"stream": "hi\n"}, {"aux": {"ID": f"sha256:{IMAGE_ID}"}}]
+    assert image_id_from_build(messages) == IMAGE_ID
+
+
+def test_image_id_from_build_stream():
+    """Image ID falls back to the last line of output"""
+    assert image_id_from_build([{"stream": f"{IMAGE_ID}\n"}]) == IMAGE_ID
+    assert image_id_from_build([{"stream": "Successfully built abc123\n"}]) == "abc123"
+    assert image_id_from_build([{"stream": "nope\n"}]) == ""
+
+
+def test_make_build_context():
+    """Build context is a tar with just the dockerfile"""
+    import io
+    import tarfile
+
+    with tarfile.open(fileobj=io.BytesIO(make_build_context(b"FROM alpine\n"))) as tar:
+        assert tar.getnames() == ["Dockerfile"]
+        assert tar.extractfile("Dockerfile").read() == b"FROM alpine\n"
+
+
+def test_container_spec(tmp_path, monkeypatch):
+    """Spec mirrors the CLI backend's run flags"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    spec = container_spec("undockit-1-abc", IMAGE_ID, "echo hi", ["nvidia.com/gpu=all"])
+    assert spec["name"] == "undockit-1-abc"
+    assert spec["userns"] == {"nsmode": "keep-id"}
+    assert spec["entrypoint"] == ["/bin/sh"]
+    assert spec["command"] == ["-c", "echo hi"]
+    assert spec["devices"] == [{"path": "nvidia.com/gpu=all"}]
+    assert {(m["source"], m["destination"]) for m in spec["mounts"]} == {
+        ("/", "/host"),
+        ("/tmp", "/tmp"),
+        (str(tmp_path / "undockit" / "exec"), "/run/undockit"),
+    }
+
+
+def test_stream_demuxer_split_frames():
+    """Frames split across reads are reassembled"""
+    data = struct.pack(">BxxxL", 1, 5) + b"hello" + struct.pack(">BxxxL", 2, 3) + b"err"
+    demuxer = StreamDemuxer()
+    assert demuxer.feed(data[:6]) == []
+    assert demuxer.feed(data[6:15]) == [(1, b"hello")]
+    assert demuxer.feed(data[15:]) == [(2, b"err")]
+
+
+def test_connection_unreachable(tmp_path):
+    """Missing socket isn't reachable"""
+    assert Connection(tmp_path / "nope.sock").is_reachable() is False
+
+
+def test_connection_reused(service, backend):
+    """Many requests share one connection"""
+    for _ in range(5):
+        backend.is_running("undockit-test")
+    assert service.connections == 1
+    assert len(service.requests) == 5
+
+
+def test_connection_reconnects(service, backend):
+    """A dropped keep-alive connection is replaced transparently"""
+    backend.is_running("undockit-test")
+    backend.connection.sock.shutdown(2)
+    assert backend.is_running("undockit-test") is False
+    assert service.connections == 2
+
+
+def test_build(service, backend, tmp_path):
+    """Build posts a tar context and reads the ID from the stream"""
+    dockerfile = tmp_path / "tool"
+    dockerfile.write_text("FROM alpine\n")
+    assert backend.build(dockerfile, quiet=True) == IMAGE_ID
+    assert ("POST", "/build") in service.requests
+
+
+def test_build_missing_dockerfile(backend, tmp_path):
+    """Missing dockerfile is a RuntimeError"""
+    with pytest.raises(RuntimeError, match="not found"):
+        backend.build(tmp_path / "nope")
+
+
+def test_image_exists(service, backend):
+    """Exists endpoint answers when storage can't"""
+    assert backend.image_exists(IMAGE_ID) is True
+    assert backend.image_exists("cd" * 32) is False
+
+
+def test_inspect(backend):
+    """Image config is mapped to metadata"""
+    metadata = backend.inspect(IMAGE_ID)
+    assert metadata["entrypoint"] == ["tool"]
+    assert metadata["cmd"] == ["--help"]
+    assert metadata["workdir"] == "/app"
+
+
+def test_pull(service, backend):
+    """Pulls are pinned to the digest the tag resolved to"""
+    assert backend.pull("alpine:3") == f"docker.io/library/alpine@sha256:{IMAGE_ID}"
+    assert ("GET", "/images/alpine%3A3/json") in service.requests
+    with pytest.raises(RuntimeError, match="manifest unknown"):
+        backend.pull("missing")
+    with pytest.raises(RuntimeError, match="malformed"):
+        backend.pull("garbled")
+
+
+def test_start_stop(service, backend):
+    """Containers are created, started, checked and removed"""
+    name = backend.name(IMAGE_ID)
+    assert backend.is_running(name) is False
+
+    backend.start(name, IMAGE_ID, timeout=5)
+    assert backend.is_running(name) is True
+    assert "timeout_seconds=5" in service.containers[name]["spec"]["command"][1]
+    assert state.read_state(name)["conmon_pid"] == 99
+
+    backend.stop(name)
+    assert backend.is_running(name) is False
+    assert name not in service.containers
+    assert state.read_state(name) is None
+
+
+def test_start_resources(service, backend):
+    """The image's resource profile becomes the container's limits"""
+    service.labels = {"undockit.cpus": "1.5", "undockit.memory": "1G", "undockit.shm-size": "64M"}
+    name = backend.name(IMAGE_ID)
+    backend.start(name, IMAGE_ID)
+    spec = service.containers[name]["spec"]
+    assert spec["shm_size"] == 64 * 1024**2
+    assert spec["resource_limits"] == {"cpu": {"period": 100000, "quota": 150000}, "memory": {"limit": 1024**3}}
+
+
+def test_list_containers(service, backend):
+    """Running containers come back in one request, with their labels"""
+    backend.start("undockit-1-abc", IMAGE_ID, timeout=42)
+    [container] = backend.list_containers()
+    assert container["name"] == "undockit-1-abc"
+    assert container["image_id"] == IMAGE_ID
+    assert container["labels"] == {"undockit.timeout": "42"}
+
+
+def test_images_in_bulk(service, backend):
+    """Images are listed in one request and removed in another, however many"""
+    service.images.add("other")
+    assert sorted(image["id"] for image in backend.list_images()) == sorted([IMAGE_ID, "other"])
+    before = len(service.requests)
+    backend.remove_images([IMAGE_ID, "other"])
+    assert service.requests[before:] == [("DELETE", "/images/remove")]
+    assert backend.list_images() == []
+
+
+def test_stop_missing(backend):
+    """Stopping a missing container is an error, like the CLI"""
+    with pytest.raises(RuntimeError, match="no such container"):
+        backend.stop("undockit-nope")
+
+
+def test_exec_streams(service, backend):
+    """stdin goes in, stdout and stderr come out, exit code comes back"""
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    os.write(stdin_w, b"hello container")
+    os.close(stdin_w)
+
+    code = backend._attach("undockit-test", ["cat"], stdin_r, stdout_w, stderr_w, tty=False)
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+
+    assert code == 3
+    assert os.read(stdout_r, 1024) == b"hello container"
+    assert os.read(stderr_r, 1024) == b"bye"
+    assert service.exec_config["Cmd"][0] == "/tmp/undockit/undockit-test/exec"
+    assert service.exec_config["Cmd"][2:] == ["cat"]
+    os.close(stdout_r)
+    os.close(stderr_r)
@@ -0,0 +1,175 @@
+"""
+Tests for batch mode
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from undockit.backend import Backend
+from undockit.batch import Batch, build_argv, exit_status, split_records, summarize
+
+
+class EchoBackend(Backend):
+    """Backend whose exec echoes its last argument, and exits with it if it's a number"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.most_active = 0
+        self.lock = threading.Lock()
+
+    def exec(self, container_name, argv, stdio=None):
+        with self.lock:
+            self.calls.append((container_name, argv))
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+
+        item = argv[-1]
+        if item == "boom":
+            raise RuntimeError("exploded")
+        os.write(stdio[1], f"{item}\n".encode())
+        os.write(stdio[2], b"noise\n")
+        return int(item) if item.isdigit() else 0
+
+    def name(self, image_id):
+        return "undockit-test"
+
+    build = image_exists = inspect = start = stop = is_running = None
+
+
+def test_split_records_lines():
+    """One record per line, skipping blank ones"""
+    assert split_records(b"a b\n\nc\r\n  \nd") == ["a b", "c", "d"]
+
+
+def test_split_records_null():
+    """NUL separated records are taken whole, newlines and all"""
+    assert split_records(b"a\nb\0c\0", null=True) == ["a\nb", "c"]
+    assert split_records(b"", null=True) == []
+
+
+def test_build_argv():
+    """Inputs are appended, or replace {} wherever it appears"""
+    assert build_argv(["tool"], ["-v"], "x.wav") == ["tool", "-v", "x.wav"]
+    assert build_argv(["tool"], ["-i", "{}", "-o", "{}.txt"], "x") == ["tool", "-i", "x", "-o", "x.txt"]
+
+
+def test_exit_status():
+    """Any failure or skip is xargs' 123"""
+    assert exit_status([0, 0]) == 0
+    assert exit_status([0, 2]) == 123
+    assert exit_status([0, None]) == 123
+    assert exit_status([]) == 0
+
+
+def test_summarize():
+    """Counts of each outcome"""
+    assert summarize([0, 1, None, 0], 1.5) == "4 items: 2 ok, 1 failed, 1 skipped in 1.50s"
+
+
+def test_batch_ordered():
+    """Ordered results come in input order, with their own output"""
+    backend = EchoBackend()
+    seen = []
+    batch = Batch(backend, ["c"], jobs=4)
+    returncodes = batch.run([["echo", str(n)] for n in (3, 0, 2)], on_result=lambda *result: seen.append(result[:4]))
+
+    assert returncodes == [3, 0, 2]
+    assert seen == [(0, 3, b"3\n", b"noise\n"), (1, 0, b"0\n", b"noise\n"), (2, 2, b"2\n", b"noise\n")]
+
+
+def test_batch_parallel():
+    """Up to jobs invocations run at once"""
+    backend = EchoBackend(delay=0.2)
+    start = time.monotonic()
+    Batch(backend, ["c"], jobs=4).run([["echo", "x"]] * 8, ordered=False)
+
+    assert backend.most_active == 4
+    assert time.monotonic() - start < 0.8
+
+
+def test_batch_fail_fast():
+    """Once something fails, nothing new starts"""
+    backend = EchoBackend()
+    returncodes = Batch(backend, ["c"], jobs=1, fail_fast=True).run([["echo", "0"], ["echo", "5"], ["echo", "0"]])
+    assert returncodes == [0, 5, None]
+
+
+def test_batch_keep_going():
+    """Without fail-fast everything runs"""
+    returncodes = Batch(EchoBackend(), ["c"], jobs=1).run([["echo", "5"], ["echo", "0"]])
+    assert returncodes == [5, 0]
+
+
+def test_batch_errors():
+    """A backend error fails that invocation, with the error as its stderr"""
+    seen = []
+    Batch(EchoBackend(), ["c"], jobs=1).run([["echo", "boom"]], on_result=lambda *result: seen.append(result))
+    assert seen[0][1] == 1
+    assert seen[0][3] == b"Error: exploded\n"
+
+
+def test_batch_replicas():
+    """Invocations are spread across the containers"""
+    backend = EchoBackend()
+    Batch(backend, ["a", "b"], jobs=2).run([["echo", str(n)] for n in range(4)])
+    assert sorted(name for name, _ in backend.calls) == ["a", "a", "b", "b"]
+
+
+def test_xargs(fake_podman, tmp_path):
+    """The whole batch shares one build and container start"""
+    dockerfile = tmp_path / "tool"
+    dockerfile.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+    joblog = tmp_path / "jobs.tsv"
+
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "xargs", "-j", "4", "-k", "--joblog", str(joblog)]
+        + [str(dockerfile), "item:"],
+        input="one\ntwo\nthree\n",
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "item: one\nitem: two\nitem: three\n"
+    assert "3 items: 3 ok, 0 failed, 0 skipped" in result.stderr
+    assert [line.split("\t")[1] for line in joblog.read_text().splitlines()] == ["0", "0", "0"]
+
+    assert len(fake_podman.calls("build")) == 1
+    assert len(fake_podman.calls("run")) == 1
+    assert len(fake_podman.calls("exec")) == 3
+
+
+def test_xargs_bad_joblog(fake_podman, tmp_path):
+    """A joblog that can't be written is reported like any other bad argument"""
+    dockerfile = tmp_path / "tool"
+    dockerfile.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "undockit",
+            "xargs",
+            "--joblog",
+            str(tmp_path / "missing" / "jobs.tsv"),
+            str(dockerfile),
+        ],
+        input="one\n",
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    fake_podman.cleanup()
+
+    assert result.returncode == 1
+    assert result.stderr.startswith("Error: ") and "Traceback" not in result.stderr
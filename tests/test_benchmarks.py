@@ -0,0 +1,39 @@
+"""
+Tests for the overhead benchmark's bookkeeping
+"""
+
+import importlib.util
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location("overhead", Path(__file__).parent.parent / "benchmarks" / "overhead.py")
+overhead = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(overhead)
+
+
+def test_percentile():
+    """Nearest rank, so every percentile is a real sample"""
+    samples = [float(n) for n in range(1, 101)]
+    assert overhead.percentile(samples, 50) == 50.0
+    assert overhead.percentile(samples, 99) == 99.0
+    assert overhead.percentile([5.0], 95) == 5.0
+
+
+def test_summarize():
+    result = overhead.summarize([10.0, 20.0, 30.0, 40.0], podman_calls=6, runs=4)
+    assert result == {"runs": 4, "p50": 20.0, "p95": 40.0, "p99": 40.0, "calls_per_run": 1.5}
+
+
+def test_regressions():
+    """An extra podman call always fails, timing only past the tolerance"""
+    baseline = {"warm": {"p50": 100.0, "p95": 120.0, "calls_per_run": 2.0}}
+    same = {"warm": {"p50": 110.0, "p95": 125.0, "calls_per_run": 2.0}}
+    assert overhead.regressions(same, baseline) == []
+
+    worse = {"warm": {"p50": 200.0, "p95": 125.0, "calls_per_run": 3.0}}
+    assert overhead.regressions(worse, baseline) == [
+        "warm: 3.0 podman calls per run, was 2.0",
+        "warm: p50 200.0ms, was 100.0ms",
+    ]
+
+    # Nothing to compare with
+    assert overhead.regressions(worse, {}) == []
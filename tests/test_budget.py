@@ -0,0 +1,76 @@
+"""
+Tests for the warm container memory budget
+"""
+
+import json
+
+from undockit import budget
+from undockit.budget import choose_evictions, get_budget
+
+
+def test_get_budget():
+    assert get_budget({}) is None
+    assert get_budget({"UNDOCKIT_MEMORY_BUDGET": "bad"}) is None
+    assert get_budget({"UNDOCKIT_MEMORY_BUDGET": "1K"}) == 1024
+
+
+def container(name, memory, idle_since, sessions=0):
+    return {"name": name, "image_id": name, "memory": memory, "idle_since": idle_since, "sessions": sessions}
+
+
+def test_choose_evictions_lru():
+    """Least recently used first, only as many as needed"""
+    containers = [container("new", 40, 300.0), container("old", 40, 100.0), container("mid", 40, 200.0)]
+    assert [c["name"] for c in choose_evictions(containers, 100, 30)] == ["old", "mid"]
+    assert choose_evictions(containers, 200, 30) == []
+
+
+def test_choose_evictions_spares_busy():
+    """Containers with live execs stay, even if that leaves the budget overrun"""
+    containers = [container("busy", 90, 0.0, sessions=1), container("idle", 10, 50.0)]
+    assert [c["name"] for c in choose_evictions(containers, 50, 10)] == ["idle"]
+
+
+class FakeBackend:
+    def __init__(self, containers):
+        self.containers = containers
+        self.stopped = []
+
+    def clone(self):
+        return self
+
+    def list_containers(self):
+        return self.containers
+
+    def stop(self, name):
+        self.stopped.append(name)
+
+
+def test_make_room(tmp_path, monkeypatch):
+    """Idle containers are stopped to fit, and each eviction logged"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setenv("UNDOCKIT_MEMORY_BUDGET", "100")
+    usage = {1: 60, 2: 30, 3: 30}
+    idle = {"a": 10.0, "b": 20.0, "c": None}
+    monkeypatch.setattr(budget, "read_usage", lambda pid: {"memory": usage[pid]})
+    monkeypatch.setattr(budget, "idle_since", lambda name: idle[name])
+    monkeypatch.setattr(budget, "count_sessions", lambda name: 1 if name == "c" else 0)
+
+    backend = FakeBackend(
+        [
+            {"name": name, "image_id": f"img-{name}", "pid": pid, "started": 0}
+            for name, pid in (("a", 1), ("b", 2), ("c", 3))
+        ]
+    )
+    (tmp_path / "undockit" / "memory").mkdir(parents=True)
+    (tmp_path / "undockit" / "memory" / "img-new").write_text("20")
+
+    assert budget.make_room(backend, "new", "img-new") == ["a"]
+    assert backend.stopped == ["a"]
+    [entry] = [json.loads(line) for line in (tmp_path / "undockit" / "evictions.log").read_text().splitlines()]
+    assert entry["container"] == "a" and entry["memory"] == 60 and entry["used"] == 120 and entry["needed"] == 20
+    assert budget.expected_memory("img-b") == 30
+
+    monkeypatch.delenv("UNDOCKIT_MEMORY_BUDGET")
+    assert budget.make_room(backend, "new", "img-new") == []
@@ -0,0 +1,70 @@
+"""
+Tests for cache module
+"""
+
+import os
+
+import pytest
+
+from undockit import cache
+
+
+def test_content_hash_stable():
+    """Same content gives the same hash"""
+    assert cache.content_hash(b"FROM alpine\n") == cache.content_hash(b"FROM alpine\n")
+
+
+def test_content_hash_differs():
+    """Different content gives a different hash"""
+    assert cache.content_hash(b"FROM alpine\n") != cache.content_hash(b"FROM ubuntu\n")
+
+
+def test_cache_dir_uses_xdg(monkeypatch, tmp_path):
+    """Cache lives under XDG_CACHE_HOME"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert cache.get_cache_dir() == tmp_path / "undockit"
+
+
+def test_read_missing(monkeypatch, tmp_path):
+    """Missing entries read as None"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert cache.read("images", "nope") is None
+
+
+def test_write_then_read(monkeypatch, tmp_path):
+    """Written entries can be read back"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cache.write("images", "abc", "1234")
+    assert cache.read("images", "abc") == "1234"
+    # No temp files left behind
+    assert [p.name for p in (tmp_path / "undockit" / "images").iterdir()] == ["abc"]
+
+
+def test_remove(monkeypatch, tmp_path):
+    """Removed entries are gone, and removing twice is fine"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cache.write("images", "abc", "1234")
+    cache.remove("images", "abc")
+    cache.remove("images", "abc")
+    assert cache.read("images", "abc") is None
+
+
+def test_is_private():
+    """Only a directory of ours that nobody else can get into will do"""
+    stat = os.stat_result((0o40700, 0, 0, 0, 1000, 1000, 0, 0, 0, 0))
+    assert cache.is_private(stat, 1000)
+    assert not cache.is_private(stat, 1001)
+    assert not cache.is_private(os.stat_result((0o41777, 0, 0, 0, 1000, 1000, 0, 0, 0, 0)), 1000)
+
+
+def test_make_private_dir(tmp_path, monkeypatch):
+    """Our own open directory is tightened, and someone else's is refused"""
+    path = tmp_path / "run" / "undockit"
+    path.mkdir(parents=True, mode=0o755)
+    path.chmod(0o755)
+    assert cache.make_private_dir(path) == path
+    assert path.stat().st_mode & 0o777 == 0o700
+
+    monkeypatch.setattr(os, "getuid", lambda: path.stat().st_uid + 1)
+    with pytest.raises(PermissionError):
+        cache.make_private_dir(path)
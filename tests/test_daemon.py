@@ -0,0 +1,306 @@
+"""
+Tests for undockitd and its thin client
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+from undockit import __version__, client
+from undockit.backend import Backend
+from undockit.backend.podman import parse_event
+from undockit import daemon as daemon_module
+from undockit.daemon import Daemon, Server, file_key, listen_fd
+from undockit.lock import parse_holder
+
+
+class CountingBackend(Backend):
+    """Backend that counts the calls the daemon makes to it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_image(self, dockerfile_path, rebuild=False, quiet=True):
+        self.calls.append("get_image")
+        return "a" * 64
+
+    def ensure_running(self, container_name, image_id, timeout=600):
+        self.calls.append("ensure_running")
+        return True
+
+    def command(self, image_id):
+        self.calls.append("command")
+        return ["echo"]
+
+    def name(self, image_id):
+        return f"undockit-test-{image_id[:12]}"
+
+    build = image_exists = inspect = start = stop = is_running = exec = None
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    backend = CountingBackend()
+    daemon = Daemon(lambda: backend)
+    daemon.watching = True
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text("FROM scratch\n")
+    return daemon, backend, dockerfile
+
+
+def test_parse_run_args_shebang():
+    """The form install writes into shebangs"""
+    options = client.parse_run_args(["--timeout=60", "--replicas=2", "tool", "--flag", "x"])
+    assert options == {
+        "timeout": 60,
+        "replicas": 2,
+        "rebuild": False,
+        "host_paths": False,
+        "path_options": [],
+        "dockerfile": os.path.abspath("tool"),
+        "args": ["--flag", "x"],
+    }
+
+
+def test_parse_run_args_spaced():
+    """Options with separate values, and --rebuild"""
+    options = client.parse_run_args(["--timeout", "5", "--rebuild", "tool"])
+    assert options["timeout"] == 5 and options["rebuild"]
+    assert options["args"] == []
+
+
+def test_parse_run_args_host_paths():
+    """Host path options, as install writes them"""
+    options = client.parse_run_args(["--host-paths", "--path-option=source", "--path-option", "model", "tool"])
+    assert options["host_paths"] and options["path_options"] == ["source", "model"]
+
+
+def test_parse_run_args_unusual():
+    """Anything unexpected is left to argparse"""
+    assert client.parse_run_args(["--help"]) is None
+    assert client.parse_run_args(["--timeout=soon", "tool"]) is None
+    assert client.parse_run_args(["--timeout"]) is None
+    assert client.parse_run_args(["--timeout=5"]) is None
+
+
+def test_parse_event_cli():
+    """podman events --format json"""
+    event = parse_event({"Type": "container", "Status": "died", "Name": "undockit-x", "ID": "abc"})
+    assert event == {"type": "container", "action": "died", "id": "abc", "name": "undockit-x"}
+
+
+def test_parse_event_api():
+    """The API's docker-style events"""
+    event = parse_event({"Type": "image", "Action": "remove", "Actor": {"ID": "sha256:abc", "Attributes": {}}})
+    assert event == {"type": "image", "action": "remove", "id": "abc", "name": ""}
+
+
+def test_file_key_changes(tmp_path):
+    """Rewriting a file changes its key"""
+    path = tmp_path / "Dockerfile"
+    path.write_text("FROM a\n")
+    before = file_key(path, path.stat())
+    path.write_text("FROM bb\n")
+    assert file_key(path, path.stat()) != before
+
+
+def test_listen_fd():
+    """Socket activation is only for the process it was meant for"""
+    assert listen_fd({"LISTEN_PID": "42", "LISTEN_FDS": "1"}, 42) == 3
+    assert listen_fd({"LISTEN_PID": "41", "LISTEN_FDS": "1"}, 42) is None
+    assert listen_fd({}, 42) is None
+
+
+def test_resolve_remembers(daemon):
+    """A second run needs nothing from the backend"""
+    daemon, backend, dockerfile = daemon
+    first = daemon.resolve(dockerfile)
+    assert daemon.resolve(dockerfile) == first
+    assert first["command"] == ["echo"]
+    assert backend.calls == ["get_image", "ensure_running", "command"]
+
+
+def test_resolve_dockerfile_changed(daemon):
+    """An edited dockerfile is looked up again"""
+    daemon, backend, dockerfile = daemon
+    daemon.resolve(dockerfile)
+    dockerfile.write_text("FROM scratch\nLABEL changed=yes\n")
+    daemon.resolve(dockerfile)
+    assert backend.calls.count("get_image") == 2
+
+
+def test_container_died(daemon):
+    """A container's death means it's checked again next time"""
+    daemon, backend, dockerfile = daemon
+    name = daemon.resolve(dockerfile)["container"]
+    daemon.handle_event({"type": "container", "action": "died", "id": "", "name": name})
+    daemon.resolve(dockerfile)
+    assert backend.calls.count("ensure_running") == 2
+
+
+def test_image_removed(daemon):
+    """A removed image is looked up again, along with its command"""
+    daemon, backend, dockerfile = daemon
+    daemon.resolve(dockerfile)
+    daemon.handle_event({"type": "image", "action": "remove", "id": "a" * 64, "name": ""})
+    daemon.resolve(dockerfile)
+    assert backend.calls.count("get_image") == 2
+    assert backend.calls.count("command") == 2
+
+
+def test_not_watching(daemon):
+    """Without events, whether the container is running is checked every time"""
+    daemon, backend, dockerfile = daemon
+    daemon.watching = False
+    daemon.resolve(dockerfile)
+    daemon.resolve(dockerfile)
+    assert backend.calls.count("ensure_running") == 2
+
+
+def test_backends_pooled(tmp_path):
+    """Requests on new threads reuse backends, only making one when all are busy"""
+    made = []
+    daemon = Daemon(lambda: made.append(CountingBackend()) or made[-1])
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text("FROM scratch\n")
+    for _ in range(3):
+        thread = threading.Thread(target=daemon.resolve, args=(dockerfile,))
+        thread.start()
+        thread.join()
+    assert len(made) == 1
+
+    with daemon.borrow():
+        daemon.resolve(dockerfile)
+    assert len(made) == 2
+
+
+def test_spawn_keeps_pythonpath(monkeypatch):
+    """The daemon can still import whatever the caller's PYTHONPATH had"""
+    spawned = []
+    monkeypatch.setenv("PYTHONPATH", "/opt/plugins")
+    monkeypatch.setattr(subprocess, "Popen", lambda *args, **kwargs: spawned.append(kwargs["env"]))
+    client.spawn_daemon()
+    [path] = [env["PYTHONPATH"].split(os.pathsep) for env in spawned]
+    assert path[1:] == ["/opt/plugins"]
+
+
+def test_other_users_refused(daemon, tmp_path, monkeypatch):
+    """Connections from other users get no answer"""
+    daemon, _, dockerfile = daemon
+    socket_path = tmp_path / "daemon.sock"
+    server = Server(daemon, socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        message = {"version": __version__, "dockerfile": str(dockerfile)}
+        assert client.request(socket_path, message)["command"] == ["echo"]
+        monkeypatch.setattr(daemon_module, "peer_uid", lambda sock: os.getuid() + 1)
+        assert client.request(socket_path, message) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_handle_errors(daemon):
+    """Failures are reported to the client, and other versions are sent away"""
+    daemon, _, dockerfile = daemon
+    request = {"version": __version__, "dockerfile": str(dockerfile.parent / "missing")}
+    assert "Dockerfile not found" in daemon.handle(request)["error"]
+    assert "fallback" in daemon.handle({"version": "0.0.0", "dockerfile": str(dockerfile)})
+
+
+def test_fallback_cost(tmp_path, monkeypatch):
+    """With no daemon, trying it costs next to nothing"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        assert client.run(["--timeout=60", "tool"]) is None
+        timings.append(time.perf_counter() - start)
+    assert min(timings) < 0.005
+
+
+def test_disabled(tmp_path, monkeypatch):
+    """UNDOCKIT_DAEMON=0 doesn't even try"""
+    monkeypatch.setenv("UNDOCKIT_DAEMON", "0")
+    monkeypatch.setattr(client, "request", pytest.fail)
+    assert client.run(["tool"]) is None
+
+
+def wait_for(path: Path, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not path.exists():
+        assert time.monotonic() < deadline, f"{path} never appeared"
+        time.sleep(0.01)
+
+
+def undockit(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "undockit", *args], capture_output=True, text=True, timeout=60)
+
+
+@pytest.fixture
+def dockerfile(tmp_path):
+    path = tmp_path / "tool"
+    path.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+    return path
+
+
+@pytest.fixture
+def running_daemon(fake_podman):
+    """A real daemon process on the fake podman"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "undockit", "daemon", "--idle-timeout=0"],
+        start_new_session=True,
+    )
+    wait_for(client.get_socket_path())
+    yield process
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+
+def test_daemon_runs(fake_podman, running_daemon, dockerfile):
+    """Runs go through the daemon, and warm ones only exec"""
+    result = undockit("run", "--timeout=10", str(dockerfile), "first")
+    assert (result.returncode, result.stdout) == (0, "first\n"), result.stderr
+    assert len(fake_podman.calls("run")) == 1
+
+    before = [call for call in fake_podman.calls() if call[0] != "events"]
+    result = undockit("run", "--timeout=10", str(dockerfile), "second")
+    assert (result.returncode, result.stdout) == (0, "second\n"), result.stderr
+    after = [call for call in fake_podman.calls() if call[0] != "events"]
+    assert [call[0] for call in after[len(before) :]] == ["exec"]
+
+
+def test_daemon_sees_container_stop(fake_podman, running_daemon, dockerfile):
+    """A container stopped behind the daemon's back is started again"""
+    assert undockit("run", "--timeout=10", str(dockerfile)).returncode == 0
+
+    name = fake_podman.containers()[0]
+    subprocess.run(["podman", "stop", name], check=True)
+    time.sleep(0.5)  # Let the event arrive
+
+    result = undockit("run", "--timeout=10", str(dockerfile), "again")
+    assert (result.returncode, result.stdout) == (0, "again\n"), result.stderr
+    assert len(fake_podman.calls("run")) == 2
+
+
+def test_daemon_auto_spawn(fake_podman, dockerfile, monkeypatch):
+    """UNDOCKIT_DAEMON=auto starts a daemon for next time"""
+    monkeypatch.setenv("UNDOCKIT_DAEMON", "auto")
+    socket_path = client.get_socket_path()
+    try:
+        assert undockit("run", "--timeout=10", str(dockerfile)).returncode == 0
+        wait_for(socket_path)
+    finally:
+        lock_file = socket_path.parent / "locks" / "daemon.lock"
+        wait_for(lock_file)
+        time.sleep(0.2)
+        pid = parse_holder(lock_file.read_bytes())
+        if pid:
+            os.killpg(pid, signal.SIGTERM)
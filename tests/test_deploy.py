@@ -2,17 +2,40 @@
 Tests for deploy module
 """
 
+import importlib.util
+import sys
 import zipfile
 import subprocess
 
 
+from undockit import __version__
 from undockit.deploy import (
+    bytecode_magic,
     needs_update,
     create_zipapp,
+    ensure_binary,
     find_package_source,
+    get_archive_metadata,
+    get_installed_version,
+    parse_archive_comment,
+    shebang_python,
+    source_hash,
 )
 
 
+def make_package(tmp_path):
+    """Create a fake package that prints where its main module was loaded from"""
+    source_dir = tmp_path / "mypackage"
+    source_dir.mkdir()
+    (source_dir / "__init__.py").write_text("")
+    (source_dir / "main.py").write_text("""
+def main():
+    print(__file__)
+    return 0
+""")
+    return source_dir
+
+
 def test_needs_update_not_installed(tmp_path):
     """Non-existent binary needs update"""
     binary_path = tmp_path / "undockit"
@@ -147,3 +170,133 @@ def main():
     result = subprocess.run([str(output_path)], capture_output=True, text=True)
     assert result.stdout.strip() == "working"
     assert result.returncode == 0
+
+
+def test_create_zipapp_metadata(tmp_path):
+    """Archive carries its version and content hash"""
+    source_dir = make_package(tmp_path)
+    output_path = tmp_path / "myapp.pyz"
+    digest = create_zipapp(source_dir=source_dir, output_path=output_path, main_module="mypackage.main:main")
+
+    metadata = get_archive_metadata(output_path)
+    assert metadata["version"] == __version__
+    assert metadata["hash"] == digest
+    assert metadata["optimized"] is False
+
+
+def test_create_zipapp_optimized(tmp_path):
+    """Optimized archive ships uncompressed bytecode that's actually used"""
+    source_dir = make_package(tmp_path)
+    output_path = tmp_path / "myapp.pyz"
+    create_zipapp(source_dir=source_dir, output_path=output_path, main_module="mypackage.main:main", optimize=True)
+
+    assert get_archive_metadata(output_path)["optimized"] is True
+    with zipfile.ZipFile(output_path, "r") as zf:
+        assert zf.getinfo("mypackage/main.pyc").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("mypackage/main.py").compress_type == zipfile.ZIP_DEFLATED
+        assert "__main__.pyc" in zf.namelist()
+
+    result = subprocess.run([str(output_path)], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout.strip().endswith("mypackage/main.pyc")
+
+
+def test_create_zipapp_optimized_no_interpreter(tmp_path):
+    """Can't compile for a missing interpreter, so ship source only"""
+    source_dir = make_package(tmp_path)
+    output_path = tmp_path / "myapp.pyz"
+    create_zipapp(
+        source_dir=source_dir,
+        output_path=output_path,
+        main_module="mypackage.main:main",
+        python_shebang="/nonexistent/python3",
+        optimize=True,
+    )
+
+    with zipfile.ZipFile(output_path, "r") as zf:
+        assert not [name for name in zf.namelist() if name.endswith(".pyc")]
+
+
+def test_create_zipapp_compile_fails(tmp_path):
+    """A tree that won't compile ships as source only, without the bytecode that did"""
+    source_dir = make_package(tmp_path)
+    (source_dir / "zz_broken.py").write_text("def (:\n")
+    output_path = tmp_path / "myapp.pyz"
+    create_zipapp(source_dir=source_dir, output_path=output_path, main_module="mypackage.main:main", optimize=True)
+
+    assert get_archive_metadata(output_path)["optimized"] is False
+    with zipfile.ZipFile(output_path, "r") as zf:
+        assert not [name for name in zf.namelist() if name.endswith(".pyc")]
+
+
+def test_source_hash_changes_with_content(tmp_path):
+    """Hash covers file contents, version, entry point and the interpreter's bytecode version"""
+    source_dir = make_package(tmp_path)
+    before = source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3")
+    assert before == source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3")
+    assert before != source_hash(source_dir, "1.0.1", "mypackage.main:main", "/usr/bin/env python3")
+    assert before != source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3", "a70d0d0a")
+
+    (source_dir / "main.py").write_text("def main(): return 1")
+    assert before != source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3")
+
+
+def test_source_hash_ignores_bytecode(tmp_path):
+    """Bytecode caches don't change the hash"""
+    source_dir = make_package(tmp_path)
+    before = source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3")
+    (source_dir / "__pycache__").mkdir()
+    (source_dir / "__pycache__" / "main.cpython-311.pyc").write_bytes(b"junk")
+    assert before == source_hash(source_dir, "1.0.0", "mypackage.main:main", "/usr/bin/env python3")
+
+
+def test_parse_archive_comment():
+    """Only JSON objects count as metadata"""
+    assert parse_archive_comment(b'{"version": "1.0.0"}') == {"version": "1.0.0"}
+    assert parse_archive_comment(b"") is None
+    assert parse_archive_comment(b"[1]") is None
+    assert parse_archive_comment(b"\xff") is None
+
+
+def test_bytecode_magic():
+    """The magic number comes from the shebang's interpreter, not ours"""
+    assert bytecode_magic(f"{sys.executable} -S") == importlib.util.MAGIC_NUMBER.hex()
+    assert bytecode_magic("/nonexistent/python3") == ""
+
+
+def test_shebang_python():
+    """Shebangs resolve to the interpreter they'd run"""
+    assert shebang_python("/usr/bin/python3 -S") == "/usr/bin/python3"
+    assert shebang_python("/usr/bin/env definitely-not-a-python") is None
+    assert shebang_python("") is None
+
+
+def test_get_installed_version_without_running(tmp_path):
+    """Version comes from the archive, even if it can't be executed"""
+    output_path = tmp_path / "myapp.pyz"
+    create_zipapp(source_dir=make_package(tmp_path), output_path=output_path, main_module="mypackage.main:main")
+    output_path.chmod(0o644)
+    assert get_installed_version(output_path) == __version__
+
+
+def test_ensure_binary_skips_when_unchanged(tmp_path):
+    """Second deploy of the same source is skipped"""
+    binary_path = ensure_binary(tmp_path)
+    assert binary_path == tmp_path / "undockit"
+    assert get_archive_metadata(binary_path)["optimized"] is True
+
+    assert ensure_binary(tmp_path) is None
+    assert ensure_binary(tmp_path, force=True) == binary_path
+
+    # Renamed into place, with no temp files left behind
+    assert [path.name for path in tmp_path.iterdir()] == ["undockit"]
+
+    result = subprocess.run([str(binary_path), "--version"], capture_output=True, text=True)
+    assert result.stdout.strip() == f"undockit {__version__}"
+
+
+def test_ensure_binary_replaces_stale_hash(tmp_path):
+    """A binary built from different source is replaced"""
+    binary_path = tmp_path / "undockit"
+    create_zipapp(source_dir=make_package(tmp_path), output_path=binary_path, main_module="mypackage.main:main")
+    assert ensure_binary(tmp_path) == binary_path
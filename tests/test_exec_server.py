@@ -0,0 +1,177 @@
+"""
+Tests for the in-container exec server and its client, with the server run on the host
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from undockit.backend import exec_client
+from undockit.backend.exec_client import decode_response, encode_request, run_env
+
+SERVER = Path(exec_client.__file__).with_name("exec_server.py")
+
+# Stands in for the exec script the startup script deploys
+EXEC_SCRIPT = """#!/bin/sh
+cd "$1" || exit 1
+shift
+exec "$@"
+"""
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Run an exec server on a control directory, returning its socket"""
+    exec_script = tmp_path / "exec"
+    exec_script.write_text(EXEC_SCRIPT)
+    exec_script.chmod(0o755)
+
+    sock = tmp_path / "exec.sock"
+    process = subprocess.Popen([sys.executable, str(SERVER), str(tmp_path), str(sock)])
+    while not sock.exists():
+        assert process.poll() is None
+        time.sleep(0.01)
+
+    yield sock
+    process.kill()
+    process.wait()
+
+
+def run(sock: Path, tmp_path: Path, argv: list[str], env: dict | None = None, stdin: bytes = b"", cwd=None):
+    """Run through the server with files for stdio, returning the exit code and output"""
+    (tmp_path / "stdin").write_bytes(stdin)
+    with (
+        open(tmp_path / "stdin", "rb") as stdin_file,
+        open(tmp_path / "stdout", "wb") as stdout_file,
+        open(tmp_path / "stderr", "wb") as stderr_file,
+    ):
+        fds = (stdin_file.fileno(), stdout_file.fileno(), stderr_file.fileno())
+        returncode = exec_client.run(sock, argv, str(cwd or tmp_path), env or {}, fds)
+    return returncode, (tmp_path / "stdout").read_bytes(), (tmp_path / "stderr").read_bytes()
+
+
+def test_encode_request():
+    """Requests are a single JSON line"""
+    data = encode_request(["echo", "hi"], "/host/work", {"TERM": "xterm"})
+    assert data.endswith(b"\n") and data.count(b"\n") == 1
+    assert b'"argv": ["echo", "hi"]' in data
+
+
+def test_decode_response():
+    """Exit codes pass through, and signals become 128+N like a shell"""
+    assert decode_response(b'{"returncode": 0}\n') == 0
+    assert decode_response(b'{"returncode": 3}\n') == 3
+    assert decode_response(b'{"returncode": -9}\n') == 137
+
+
+def test_decode_response_errors():
+    """Server failures and hangups are errors"""
+    with pytest.raises(RuntimeError, match="No such file"):
+        decode_response(b'{"error": "No such file"}\n')
+    with pytest.raises(RuntimeError, match="went away"):
+        decode_response(b"")
+
+
+def test_run_env():
+    """Only TERM is sent, and only with a terminal"""
+    assert run_env({"TERM": "xterm", "SECRET": "x"}, tty=True) == {"TERM": "xterm"}
+    assert run_env({"TERM": "xterm"}, tty=False) == {}
+    assert run_env({}, tty=True) == {}
+
+
+def test_no_server(tmp_path):
+    """Without a server nothing runs, so the caller can fall back"""
+    assert exec_client.run(tmp_path / "exec.sock", ["true"], "/", {}) is None
+
+
+def test_shared_dir_refused(server, tmp_path):
+    """Our fds aren't sent to a socket in a directory others can get into"""
+    tmp_path.chmod(0o755)
+    assert exec_client.run(server, ["true"], "/", {}) is None
+
+
+def test_other_user_refused(server, tmp_path, monkeypatch):
+    """Our fds aren't sent to a server run by someone else"""
+    monkeypatch.setattr(exec_client, "peer_uid", lambda sock: os.getuid() + 1)
+    assert exec_client.run(server, ["true"], "/", {}) is None
+
+
+def test_opt_out(server, tmp_path, monkeypatch):
+    """UNDOCKIT_NO_EXEC_SERVER skips the server"""
+    monkeypatch.setenv("UNDOCKIT_NO_EXEC_SERVER", "1")
+    assert exec_client.run(server, ["true"], "/", {}) is None
+
+
+def test_output_goes_to_our_fds(server, tmp_path):
+    """The command writes straight to the fds we passed, and its exit code comes back"""
+    assert run(server, tmp_path, ["sh", "-c", "echo out; echo err >&2; exit 3"]) == (3, b"out\n", b"err\n")
+
+
+def test_stdin_cwd_and_env(server, tmp_path):
+    """stdin, working directory and extra environment reach the command"""
+    work = tmp_path / "work"
+    work.mkdir()
+    script = 'cat; pwd; echo "$GREETING"'
+    returncode, stdout, _ = run(server, work, ["sh", "-c", script], {"GREETING": "hello"}, stdin=b"in\n")
+    assert returncode == 0
+    assert stdout == f"in\n{work}\nhello\n".encode()
+
+
+def test_killed_by_signal(server, tmp_path):
+    """A command killed by a signal exits with 128+N"""
+    assert run(server, tmp_path, ["sh", "-c", "kill -9 $$"])[0] == 137
+
+
+def test_bad_workdir(server, tmp_path):
+    """The exec script's own failures are just exit codes"""
+    returncode, _, _ = run(server, tmp_path, ["true"], cwd=tmp_path / "missing")
+    assert returncode == 1
+
+
+def test_server_error(server, tmp_path):
+    """A command the server can't start is an error, not a fallback"""
+    (tmp_path / "exec").unlink()
+    with pytest.raises(RuntimeError, match="Exec server failed"):
+        run(server, tmp_path, ["true"])
+
+
+def test_signals_forwarded(server, tmp_path):
+    """Signals sent to us are passed on to the command"""
+    timer = threading.Timer(0.5, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    start = time.monotonic()
+    try:
+        returncode, _, _ = run(server, tmp_path, ["sleep", "10"])
+    finally:
+        timer.cancel()
+
+    assert returncode == 128 + signal.SIGTERM
+    assert time.monotonic() - start < 5
+    # Our own handler is back afterwards
+    assert signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+
+
+def test_concurrent_runs(server, tmp_path):
+    """Runs are served at the same time, not one after another"""
+    start = time.monotonic()
+    results = []
+
+    def one(index: int):
+        work = tmp_path / str(index)
+        work.mkdir()
+        results.append(run(server, work, ["sh", "-c", "sleep 0.5; echo done"]))
+
+    threads = [threading.Thread(target=one, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [(0, b"done\n", b"")] * 4
+    assert time.monotonic() - start < 1.5
@@ -0,0 +1,121 @@
+"""
+Tests for garbage collection of images and containers
+"""
+
+import json
+import subprocess
+import sys
+import uuid
+
+from undockit.backend.podman import parse_image_list
+from undockit.gc import newest_image, plan
+
+
+def test_parse_image_list():
+    entries = [{"Id": "sha256:abc", "Size": 1000, "SharedSize": 900, "Created": 1700000000}]
+    assert parse_image_list(entries) == [{"id": "abc", "size": 1000, "shared": 900, "created": 1700000000}]
+    assert parse_image_list([{"Id": "def", "SharedSize": -1}])[0]["shared"] == 0
+    assert parse_image_list(None) == []
+
+
+INDEX = {
+    "new": {"tool": "/bin/jq", "built": 300.0},
+    "mid": {"tool": "/bin/jq", "built": 200.0},
+    "old": {"tool": "/bin/jq", "built": 100.0},
+    "gone": {"tool": "/bin/removed", "built": 100.0},
+}
+IMAGES = [{"id": image_id, "size": 10, "shared": 0, "created": 0} for image_id in ("new", "mid", "old", "gone", "base")]
+
+
+def container(name, image_id, running=True, sessions=0):
+    return {"name": name, "image_id": image_id, "running": running, "sessions": sessions}
+
+
+def test_plan_superseded():
+    """Every image but a tool's current one goes, and images of removed tools; others aren't ours"""
+    result = plan(INDEX, {"new"}, IMAGES, [])
+    assert result["images"] == ["gone", "mid", "old"]
+    assert result["reclaimed"] == 30 and result["kept"] == 10
+
+
+def test_newest_image():
+    assert newest_image(INDEX, "/bin/jq") == "new"
+
+
+def test_plan_keep():
+    """Retention keeps the newest superseded images, but not for removed tools"""
+    assert plan(INDEX, {"new"}, IMAGES, [], keep=1)["images"] == ["gone", "old"]
+
+
+def test_plan_max_size():
+    """Over the disk budget, kept images go oldest first"""
+    assert plan(INDEX, {"new"}, IMAGES, [], keep=2, max_size=20)["images"] == ["gone", "old"]
+    assert plan(INDEX, {"new"}, IMAGES, [], keep=2, max_size=100)["images"] == ["gone"]
+
+
+def test_plan_shared_base():
+    """Only an image's own layers count, as removing it leaves the base they share"""
+    images = [{"id": image_id, "size": 1010, "shared": 1000, "created": 0} for image_id in INDEX]
+    result = plan(INDEX, {"new"}, images, [], keep=2, max_size=25)
+    assert result["images"] == ["gone", "old"]
+    assert result["reclaimed"] == 20 and result["kept"] == 20
+
+
+def test_plan_containers():
+    """Containers of removed images and stopped ones go; busy ones and their images stay"""
+    containers = [
+        container("c-new", "new"),
+        container("c-old", "old"),
+        container("c-mid", "mid", sessions=1),
+        container("c-dead", "new", running=False),
+    ]
+    result = plan(INDEX, {"new"}, IMAGES, containers)
+    assert result["containers"] == ["c-dead", "c-old"]
+    assert result["images"] == ["gone", "old"]
+
+
+def test_plan_forgets_missing():
+    """Index entries for images that have already gone are dropped"""
+    assert plan(INDEX, {"new"}, IMAGES[:1], [])["forget"] == ["gone", "mid", "old"]
+
+
+def undockit(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "undockit", *args], capture_output=True, text=True, timeout=60)
+
+
+def test_gc(fake_podman, tmp_path):
+    """A changed tool's old image and container go, in one call each"""
+    tool = tmp_path / "tool"
+    tool.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+    assert undockit("run", str(tool)).returncode == 0
+    tool.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+    assert undockit("run", str(tool)).returncode == 0
+    assert len(json.loads(undockit("status", "--json").stdout)) == 2
+
+    result = undockit("gc", "--dry-run")
+    assert result.returncode == 0, result.stderr
+    assert "1 images and 1 containers" in result.stdout
+    assert len(json.loads(undockit("status", "--json").stdout)) == 2
+
+    before = len(fake_podman.calls())
+    result = undockit("gc")
+    assert result.returncode == 0, result.stderr
+    assert [call[0] for call in fake_podman.calls()[before:]] == ["images", "ps", "rm", "rmi"]
+    assert len(json.loads(undockit("status", "--json").stdout)) == 1
+    assert "0 images and 0 containers" in undockit("gc").stdout
+
+    # The tool still runs
+    assert undockit("run", str(tool)).returncode == 0
+
+
+def test_gc_edited_tool(fake_podman, tmp_path):
+    """A tool edited since its last run keeps the image its container is running"""
+    tool = tmp_path / "tool"
+    tool.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+    assert undockit("run", str(tool)).returncode == 0
+    tool.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+
+    result = undockit("gc")
+    assert result.returncode == 0, result.stderr
+    assert "0 images and 0 containers" in result.stdout
+    assert len(json.loads(undockit("status", "--json").stdout)) == 1
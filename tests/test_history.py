@@ -0,0 +1,113 @@
+"""
+Tests for invocation history and adaptive timeouts
+"""
+
+import json
+import subprocess
+import sys
+import uuid
+
+from undockit import history
+from undockit.history import choose_timeout, gaps_between, get_bounds, parse_history, simulate, summarize
+
+
+def test_parse_history():
+    """Cold start times come with their run, or on their own after trimming"""
+    text = "# /bin/tool\n100.000\n160.000 2.500\n0.000 1.500\nbad\n"
+    assert parse_history(text) == ("/bin/tool", [100.0, 160.0], [2.5, 1.5])
+
+
+def test_gaps_between():
+    assert gaps_between([30.0, 0.0, 10.0]) == [10.0, 20.0]
+    assert gaps_between([5.0]) == []
+
+
+def test_choose_timeout_needs_history():
+    """Without enough history, the shebang's timeout stands"""
+    assert choose_timeout([300.0] * 4, 600, 60, 3600) == 600
+
+
+def test_choose_timeout_covers_usual_gaps():
+    """Long enough for most gaps, with a margin, ignoring bursts of runs"""
+    gaps = [1.0] * 20 + [100.0, 200.0, 300.0, 400.0, 500.0]
+    assert choose_timeout(gaps, 600, 60, 3600) == 600
+    assert choose_timeout([1000.0] * 10, 600, 60, 3600) == 1200
+    assert choose_timeout([800.0] * 10, 600, 60, 900) == 900
+
+
+def test_choose_timeout_rare_tools():
+    """Tools mostly used further apart than the maximum aren't held for long"""
+    assert choose_timeout([10000.0] * 8 + [100.0] * 2, 600, 60, 3600) == 60
+    assert choose_timeout([2.0] * 10, 600, 60, 3600) == 60
+
+
+def test_simulate():
+    """Gaps within the timeout are warm for the whole gap, others go cold after it"""
+    assert simulate([10.0, 100.0, 30.0], 60) == (1, 100.0)
+
+
+def test_summarize():
+    times = [0.0, 100.0, 200.0, 300.0, 400.0, 500.0]
+    row = summarize("tool", times, [3.0, 5.0], 60, (60, 3600))
+    assert row["timeout"] == 120
+    assert (row["fixed_cold_starts"], row["cold_starts"]) == (5, 0)
+    assert row["saved_seconds"] == 20.0
+    assert row["extra_warm_seconds"] == 200.0
+
+
+def test_get_bounds():
+    assert get_bounds({}) == (60, 3600)
+    assert get_bounds({"UNDOCKIT_TIMEOUT_MIN": "300", "UNDOCKIT_TIMEOUT_MAX": "100"}) == (300, 300)
+    assert get_bounds({"UNDOCKIT_ADAPTIVE_TIMEOUT": "0"}) is None
+
+
+def test_record_and_trim(tmp_path, monkeypatch):
+    """Runs are appended, and trimmed back to the most recent"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(history, "MAX_FILE_SIZE", 200)
+    monkeypatch.setattr(history, "KEEP_RUNS", 4)
+    tool = tmp_path / "tool"
+
+    history.record(tool, 2.0)
+    for _ in range(20):
+        history.record(tool)
+
+    path = history.history_path(tool)
+    assert path.stat().st_size <= 200
+    name, times, cold = history.read_history(path)
+    assert name == str(tool)
+    assert 0 < len(times) < 21
+    assert cold == [2.0]
+
+
+def test_timeout_for(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    tool = tmp_path / "tool"
+    path = history.history_path(tool)
+    path.parent.mkdir(parents=True)
+    path.write_text(f"# {tool}\n" + "".join(f"{n * 1000}.0\n" for n in range(1, 10)))
+
+    assert history.timeout_for(tool, 600) == 1200
+    monkeypatch.setenv("UNDOCKIT_ADAPTIVE_TIMEOUT", "0")
+    assert history.timeout_for(tool, 600) == 600
+
+
+def test_run_records_history(fake_podman, tmp_path):
+    """Runs are recorded with their cold start time, and the report replays them"""
+    tool = tmp_path / "tool"
+    shebang = "#!/usr/bin/env -S undockit run --timeout=120\n"
+    tool.write_text(f'{shebang}FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+    for _ in range(3):
+        result = subprocess.run([sys.executable, "-m", "undockit", "run", str(tool)], capture_output=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+
+    _, times, cold = history.read_history(history.history_path(tool))
+    assert len(times) == 3
+    assert len(cold) == 1
+
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "history", "--json"], capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    [row] = json.loads(result.stdout)
+    assert row["tool"] == "tool" and row["runs"] == 3 and row["fixed_timeout"] == 120
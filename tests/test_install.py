@@ -56,6 +56,36 @@ def test_make_dockerfile_custom_timeout_long():
     assert "FROM nvidia/cuda" in result
 
 
+def test_make_dockerfile_replicas():
+    """Pools are only mentioned when there's more than one replica"""
+    assert "--replicas" not in make_dockerfile("alpine", replicas=1)
+    assert "#!/usr/bin/env -S undockit run --timeout=600 --replicas=4" in make_dockerfile("alpine", replicas=4)
+
+
+def test_make_dockerfile_pinned():
+    """A digest-pinned wrapper says what it was pinned from"""
+    result = make_dockerfile("docker.io/library/alpine@sha256:abc", source="alpine:3")
+    assert "FROM docker.io/library/alpine@sha256:abc\n" in result
+    assert "# Pinned from alpine:3\n" in result
+    assert "Pinned" not in make_dockerfile("alpine")
+
+
+def test_make_dockerfile_host_paths():
+    """Host path translation and its keys go in the shebang"""
+    result = make_dockerfile("yolo", host_paths=True, path_options=["source"])
+    assert result.startswith("#!/usr/bin/env -S undockit run --timeout=600 --host-paths --path-option=source\n")
+    assert "--path-option" not in make_dockerfile("yolo", path_options=["source"])
+
+
+def test_make_dockerfile_resources():
+    """Resource profiles go in as labels, and bad ones are refused"""
+    result = make_dockerfile("whisper", resources={"cpus": "4", "shm-size": "2G", "memory": None})
+    assert result.endswith('LABEL undockit.cpus="4"\nLABEL undockit.shm-size="2G"\n')
+    assert "LABEL" not in make_dockerfile("whisper")
+    with pytest.raises(ValueError):
+        make_dockerfile("whisper", resources={"cpuset": "3-1"})
+
+
 def test_resolve_target_path_prefix_override():
     """Test that explicit prefix overrides everything"""
     path = resolve_target_path(to="user", env={}, sys_prefix="/usr", base_prefix="/usr", prefix=Path("/custom"))
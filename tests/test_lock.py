@@ -0,0 +1,139 @@
+"""
+Tests for cross-process locks and single-flight builds and starts
+"""
+
+import fcntl
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+from undockit import lock
+from undockit.lock import FileLock, lock_name, parse_holder
+
+
+@pytest.fixture
+def lock_dir(tmp_path, monkeypatch):
+    """Keep locks in tmp_path"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return lock.get_lock_dir()
+
+
+def test_lock_name():
+    """Slashes can't escape the lock directory"""
+    assert lock_name("start", "undockit-1000-abc") == "start-undockit-1000-abc.lock"
+    assert lock_name("build", "a/b") == "build-a_b.lock"
+
+
+def test_parse_holder():
+    """Pid is read from the lock file, which may be empty or junk"""
+    assert parse_holder(b"1234\n") == 1234
+    assert parse_holder(b"") is None
+    assert parse_holder(b"junk") is None
+
+
+def test_lock_records_holder(lock_dir):
+    """The holder's pid is written into the lock file"""
+    with FileLock("test.lock"):
+        assert parse_holder((lock_dir / "test.lock").read_bytes()) == os.getpid()
+
+
+def test_lock_times_out(lock_dir):
+    """A held lock makes others give up after the timeout"""
+    with FileLock("test.lock"):
+        start = time.monotonic()
+        with pytest.raises(RuntimeError, match="Timed out"):
+            FileLock("test.lock", timeout=0.2).acquire()
+        assert time.monotonic() - start >= 0.2
+
+
+def test_lock_released_on_exit(lock_dir):
+    """A holder that's killed can't keep the lock"""
+    code = (
+        "from undockit.lock import FileLock; import time; "
+        "FileLock('test.lock').acquire(); print(flush=True); time.sleep(60)"
+    )
+    holder = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE)
+    try:
+        holder.stdout.readline()
+        with pytest.raises(RuntimeError):
+            FileLock("test.lock", timeout=0.1).acquire()
+    finally:
+        holder.kill()
+        holder.wait()
+
+    with FileLock("test.lock", timeout=1):
+        pass
+
+
+def test_lock_stale_holder(lock_dir, monkeypatch):
+    """A lock held in the name of a dead process is broken"""
+    monkeypatch.setattr(lock, "STALE_GRACE", 0.1)
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+
+    # Leaked into something that isn't the holder, as with an inherited fd
+    lock_dir.mkdir(parents=True)
+    path = lock_dir / "test.lock"
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, f"{dead.pid}\n".encode())
+
+        with FileLock("test.lock", timeout=5):
+            assert parse_holder(path.read_bytes()) == os.getpid()
+    finally:
+        os.close(fd)
+
+
+def test_lock_live_holder_not_stale(lock_dir, monkeypatch):
+    """A holder that's alive is waited for, not broken"""
+    monkeypatch.setattr(lock, "STALE_GRACE", 0.05)
+    with FileLock("test.lock"):
+        with pytest.raises(RuntimeError):
+            FileLock("test.lock", timeout=0.3).acquire()
+
+
+def test_single_flight_run(fake_podman, tmp_path, monkeypatch):
+    """Concurrent cold runs share one build and one container start"""
+    monkeypatch.setenv("FAKE_PODMAN_BUILD_DELAY", "0.3")
+    monkeypatch.setenv("FAKE_PODMAN_START_DELAY", "0.5")
+
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+
+    runs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "undockit", "run", "--timeout", "10", str(dockerfile), f"run {i}"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for i in range(8)
+    ]
+    results = [(run.wait(timeout=60), run.stdout.read(), run.stderr.read()) for run in runs]
+
+    for i, (returncode, stdout, stderr) in enumerate(results):
+        assert returncode == 0, stderr
+        assert stdout == f"run {i}\n"
+
+    assert len(fake_podman.calls("build")) == 1
+    assert len(fake_podman.calls("run")) == 1
+    assert len(fake_podman.calls("exec")) == 8
+
+
+def test_single_flight_replaces_dead(fake_podman, tmp_path):
+    """A container that died is started again by the next run"""
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+
+    command = [sys.executable, "-m", "undockit", "run", "--timeout", "10", str(dockerfile)]
+    assert subprocess.run(command).returncode == 0
+    fake_podman.cleanup()
+    assert subprocess.run(command).returncode == 0
+
+    assert len(fake_podman.calls("build")) == 1
+    assert len(fake_podman.calls("run")) == 2
@@ -0,0 +1,177 @@
+"""
+Tests for the model store
+"""
+
+import errno
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from undockit import models
+from undockit.models import blob_path, format_size
+
+SIZE = 4096
+OLD = 1_000_000_000
+
+
+def test_blob_path():
+    assert blob_path(Path("/store"), "abcdef") == Path("/store/sha256/ab/abcdef")
+
+
+def test_format_size():
+    assert format_size(512) == "512B"
+    assert format_size(3 * 1024 * 1024) == "3.0M"
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    """A models dir with the same weights downloaded by three tools, and once more in the cache"""
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    weights = os.urandom(SIZE)
+    paths = [
+        tmp_path / "data" / "models" / "whisper" / "base.pt",
+        tmp_path / "data" / "models" / "tts" / "model.bin",
+        tmp_path / "data" / "models" / "huggingface" / "blobs" / "0123",
+    ]
+    cached = tmp_path / "cache" / "pip" / "wheel"
+    for path in paths + [cached]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(weights)
+    other = tmp_path / "data" / "models" / "demucs.th"
+    other.write_bytes(os.urandom(SIZE))
+    small = tmp_path / "data" / "models" / "small"
+    small.write_bytes(weights[:10])
+    for path in paths + [cached, other, small]:
+        os.utime(path, (OLD, OLD))
+    return paths
+
+
+def test_dedupe(dirs):
+    """Copies end up as one inode, and unchanged files aren't hashed again"""
+    result = models.dedupe(min_size=SIZE)
+    assert result == {"files": 4, "hashed": 4, "linked": 2, "saved": 2 * SIZE, "errors": []}
+    assert len({path.stat().st_ino for path in dirs}) == 1
+
+    again = models.dedupe(min_size=SIZE)
+    assert again["hashed"] == 0 and again["linked"] == 0
+
+    blobs = models.list_blobs(verify=True)
+    assert sorted(blob["links"] for blob in blobs) == [1, 3]
+    assert all(blob["ok"] for blob in blobs)
+
+
+def test_dedupe_only_models_by_default(dirs, tmp_path):
+    """Other programs' caches are left alone unless they're asked for"""
+    cached = tmp_path / "cache" / "pip" / "wheel"
+    models.dedupe(min_size=SIZE)
+    assert cached.stat().st_nlink == 1
+
+    result = models.dedupe([tmp_path / "cache"], min_size=SIZE)
+    assert result["linked"] == 1 and cached.stat().st_ino == dirs[0].stat().st_ino
+
+
+def test_dedupe_keeps_modes(dirs, monkeypatch):
+    """A copy with its own mode isn't hard linked to the stored one, which would change it"""
+    dirs[2].chmod(0o600)
+    monkeypatch.setattr(models, "reflink", lambda source, target: shutil.copyfile(source, target))
+    result = models.dedupe(min_size=SIZE)
+    assert result["linked"] == 2 and result["errors"] == []
+    assert dirs[2].stat().st_mode & 0o777 == 0o600
+    assert dirs[2].stat().st_ino != dirs[0].stat().st_ino == dirs[1].stat().st_ino
+
+    def unsupported(*args):
+        raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    monkeypatch.setattr(models, "reflink", unsupported)
+    dirs[1].unlink()
+    dirs[1].write_bytes(dirs[0].read_bytes())
+    dirs[1].chmod(0o640)
+    os.utime(dirs[1], (OLD, OLD))
+    result = models.dedupe(min_size=SIZE)
+    assert [error for error in result["errors"] if "Mode or owner differs" in error] == [
+        f"{dirs[1]}: [Errno 1] Mode or owner differs from the stored copy"
+    ]
+    assert dirs[1].stat().st_mode & 0o777 == 0o640
+
+
+def test_dedupe_dry_run(dirs):
+    result = models.dedupe(min_size=SIZE, dry_run=True)
+    assert result["linked"] == 2 and result["saved"] == 2 * SIZE
+    assert len({path.stat().st_ino for path in dirs}) == 3
+    assert models.list_blobs() == []
+
+
+def test_dedupe_skips_recent(dirs):
+    """Files still being written are left alone"""
+    os.utime(dirs[0])
+    assert models.dedupe(min_size=SIZE)["linked"] == 1
+    assert dirs[0].stat().st_nlink == 1
+
+
+def test_dedupe_no_links(dirs, monkeypatch):
+    """Where the store can't be linked to, nothing is recorded as stored"""
+
+    def cross_device(*args):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", cross_device)
+    monkeypatch.setattr(models, "reflink", cross_device)
+    result = models.dedupe(min_size=SIZE)
+    assert result["linked"] == 0 and len(result["errors"]) == 4
+    assert all("cross-device" in error for error in result["errors"])
+    assert models.list_blobs() == []
+
+
+def test_dedupe_reflinks(dirs, monkeypatch):
+    """Without hard links, the first copy is cloned into the store and the rest cloned from it"""
+
+    def cross_device(*args):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", cross_device)
+    monkeypatch.setattr(models, "reflink", lambda source, target: shutil.copyfile(source, target))
+    result = models.dedupe(min_size=SIZE)
+    assert result["linked"] == 2 and result["errors"] == []
+    assert models.dedupe(min_size=SIZE)["hashed"] == 0
+
+    # Nothing is hard linked to the blobs, but they're still in use
+    assert sorted(blob["links"] for blob in models.list_blobs()) == [1, 3]
+    assert models.gc() == ([], 0)
+    for path in dirs:
+        path.unlink()
+    assert len(models.gc()[0]) == 1
+
+
+def test_verify(dirs):
+    """A stored file changed in place no longer matches its digest"""
+    models.dedupe(min_size=SIZE)
+    dirs[0].write_bytes(b"x" * SIZE)
+    assert not all(blob["ok"] for blob in models.list_blobs(verify=True))
+
+
+def test_gc(dirs):
+    """Blobs are removed once nothing links to them"""
+    models.dedupe(min_size=SIZE)
+    for path in dirs:
+        path.unlink()
+
+    assert models.gc(dry_run=True)[1] == SIZE
+    removed, freed = models.gc()
+    assert len(removed) == 1 and freed == SIZE
+    assert len(models.list_blobs()) == 1
+
+
+def test_models_cli(dirs):
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "models", "dedupe", "--min-size=4K"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "2 duplicates linked" in result.stdout
+
+    result = subprocess.run([sys.executable, "-m", "undockit", "models", "ls"], capture_output=True, text=True)
+    assert result.returncode == 0 and "base.pt" in result.stdout
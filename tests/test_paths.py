@@ -0,0 +1,67 @@
+"""
+Tests for host path translation
+"""
+
+import subprocess
+import sys
+import uuid
+
+from undockit.paths import enabled, translate_arg, translate_args, translate_path
+
+HOST = {"/", "/data", "/data/big.wav", "/home/user"}
+
+
+def exists(path):
+    return path in HOST
+
+
+def test_translate_path():
+    """Existing files, and new ones in existing directories, move under /host"""
+    assert translate_path("/data/big.wav", exists) == "/host/data/big.wav"
+    assert translate_path("/data/out.wav", exists) == "/host/data/out.wav"
+    assert translate_path("/data/", exists) == "/host/data/"
+
+
+def test_translate_path_leaves_others():
+    """Relative paths, paths already in /host and things that only look like paths stay"""
+    assert translate_path("big.wav", exists) == "big.wav"
+    assert translate_path("/host/data/big.wav", exists) == "/host/data/big.wav"
+    assert translate_path("/nowhere/at/all", exists) == "/nowhere/at/all"
+
+
+def test_translate_arg_options():
+    """--option=/path always, key=/path only for the tool's keys"""
+    assert translate_arg("--input=/data/big.wav", [], exists) == "--input=/host/data/big.wav"
+    assert translate_arg("source=/data/big.wav", [], exists) == "source=/data/big.wav"
+    assert translate_arg("source=/data/big.wav", ["source"], exists) == "source=/host/data/big.wav"
+    assert translate_arg("--lang=en", [], exists) == "--lang=en"
+
+
+def test_translate_arg_raw():
+    """raw: opts an argument out"""
+    assert translate_arg("raw:/data/big.wav", [], exists) == "/data/big.wav"
+    assert translate_arg("raw:source=/data", ["source"], exists) == "source=/data"
+
+
+def test_translate_args():
+    args = ["-o", "/data/out.txt", "/data/big.wav", "model=base"]
+    assert translate_args(args, ["model"], exists) == ["-o", "/host/data/out.txt", "/host/data/big.wav", "model=base"]
+
+
+def test_enabled():
+    assert enabled(True, {})
+    assert not enabled(False, {})
+    assert enabled(False, {"UNDOCKIT_HOST_PATHS": "1"})
+
+
+def test_run_translates_paths(fake_podman, tmp_path):
+    """A tool with --host-paths gets its arguments rewritten, other tools don't"""
+    data = tmp_path / "input.wav"
+    data.write_text("x")
+    cases = (["--host-paths"], f"/host{data} /kept\n"), ([], f"{data} raw:/kept\n")
+    for flags, expected in cases:
+        tool = tmp_path / f"tool-{uuid.uuid4().hex[:8]}"
+        tool.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+        argv = [sys.executable, "-m", "undockit", "run", *flags, str(tool), str(data), "raw:/kept"]
+        result = subprocess.run(argv, capture_output=True, text=True, timeout=60)
+        assert result.stdout == expected, result.stderr
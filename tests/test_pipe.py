@@ -0,0 +1,162 @@
+"""
+Tests for tool pipelines
+"""
+
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+from undockit.pipe import expand_args, parse_spec, pipeline_values, run_pipeline
+
+
+def test_parse_spec_order():
+    """Stages come after what they wait for and what they read from"""
+    data = {
+        "stages": {
+            "shout": {"tool": "tr", "stdin": "transcribe"},
+            "transcribe": {"tool": "whisper", "after": ["split"]},
+            "split": {"tool": "demucs", "args": ["{1}"]},
+        }
+    }
+    stages = parse_spec(data)
+    assert [stage["name"] for stage in stages] == ["split", "transcribe", "shout"]
+    assert stages[0] == {"name": "split", "tool": "demucs", "args": ["{1}"], "after": [], "stdin": None}
+
+
+@pytest.mark.parametrize(
+    "stages",
+    [
+        {},
+        {"a": {}},
+        {"a": {"tool": "x", "args": "no"}},
+        {"a": {"tool": "x", "after": ["b"]}},
+        {"a": {"tool": "x", "stdin": "b"}},
+        {"a": {"tool": "x", "after": ["b"]}, "b": {"tool": "x", "stdin": "a"}},
+        {"a": {"tool": "x"}, "b": {"tool": "x", "stdin": "a"}, "c": {"tool": "x", "stdin": "a"}},
+    ],
+)
+def test_parse_spec_invalid(stages):
+    with pytest.raises(ValueError):
+        parse_spec({"stages": stages})
+
+
+@pytest.mark.parametrize(
+    "stages",
+    [
+        {"a": {"tool": "x"}, "b": {"tool": "x", "stdin": "a", "after": ["a"]}},
+        {"a": {"tool": "x"}, "b": {"tool": "x", "after": ["a"]}, "c": {"tool": "x", "stdin": "a", "after": ["b"]}},
+    ],
+)
+def test_parse_spec_waits_for_reader(stages):
+    """A stage can't wait for the stage it reads from, which would block writing to it"""
+    with pytest.raises(ValueError, match="which it reads from"):
+        parse_spec({"stages": stages})
+
+
+def test_expand_args():
+    values = {"work": "/host/run/pipes/1", "1": "/host/data/in.wav"}
+    assert expand_args(["-o", "{work}/out", "{1}", "{2}"], values) == [
+        "-o",
+        "/host/run/pipes/1/out",
+        "/host/data/in.wav",
+        "{2}",
+    ]
+
+
+def test_pipeline_values(tmp_path):
+    """Existing files are rewritten for the containers, other arguments aren't"""
+    data = tmp_path / "in.wav"
+    data.write_text("x")
+    values = pipeline_values("/run/pipes/1", [str(data), "en"], exists=lambda path: True)
+    assert values == {"work": "/host/run/pipes/1", "1": f"/host{data}", "2": "en"}
+
+
+class FakeBackend:
+    """Runs commands on the host, with /host taken off their paths"""
+
+    def __init__(self):
+        self.starts = []
+
+    def clone(self):
+        return self
+
+    def get_image(self, path):
+        return path.name
+
+    def name(self, image_id):
+        return f"undockit-{image_id}"
+
+    def ensure_running(self, container_name, image_id, timeout):
+        self.starts.append((time.monotonic(), threading.get_ident()))
+        time.sleep(0.2)
+        return True
+
+    def command(self, image_id):
+        return {"write": ["sh", "-c", 'echo "$0" > "$1"'], "read": ["cat"], "upper": ["tr", "a-z", "A-Z"]}[image_id]
+
+    def exec(self, container_name, argv, stdio=None):
+        argv = [arg.replace("/host/", "/", 1) if arg.startswith("/host/") else arg for arg in argv]
+        stdin, stdout, stderr = stdio
+        return subprocess.run(argv, stdin=stdin, stdout=stdout, stderr=stderr).returncode
+
+
+def test_run_pipeline(tmp_path, monkeypatch, capfd):
+    """Files go through the work dir, streams through pipes, and containers start together"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    for name in ("write", "read", "upper"):
+        (tmp_path / name).write_text("FROM scratch\n")
+    stages = parse_spec(
+        {
+            "stages": {
+                "write": {"tool": "./write", "args": ["{1}", "{work}/note"]},
+                "read": {"tool": "./read", "args": ["{work}/note"], "after": ["write"]},
+                "upper": {"tool": "./upper", "stdin": "read"},
+            }
+        }
+    )
+    backend = FakeBackend()
+    results = run_pipeline(backend, stages, tmp_path, ["hello"])
+
+    assert capfd.readouterr().out == "HELLO\n"
+    assert [result["returncode"] for result in results] == [0, 0, 0]
+    assert len({ident for _, ident in backend.starts}) == 3
+    assert max(start for start, _ in backend.starts) - min(start for start, _ in backend.starts) < 0.15
+    assert list((tmp_path / "run" / "undockit" / "pipes").iterdir()) == []
+
+
+def test_run_pipeline_failure(tmp_path, monkeypatch):
+    """Stages after a failed one are skipped"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    for name in ("write", "read"):
+        (tmp_path / name).write_text("FROM scratch\n")
+    stages = parse_spec(
+        {
+            "stages": {
+                "write": {"tool": "./write", "args": ["x", "/nowhere/at/all"]},
+                "read": {"tool": "./read", "args": ["{work}/note"], "after": ["write"]},
+            }
+        }
+    )
+    results = run_pipeline(FakeBackend(), stages, tmp_path, [])
+    assert results[0]["returncode"] != 0 and results[1]["returncode"] is None
+
+
+def test_pipe(fake_podman, tmp_path):
+    """Stages stream through the real run path"""
+    for name, entrypoint in (("say", '["echo"]'), ("upper", '["tr", "a-z", "A-Z"]')):
+        (tmp_path / name).write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT {entrypoint}\n')
+    spec = tmp_path / "pipeline.toml"
+    spec.write_text(
+        '[stages.say]\ntool = "./say"\nargs = ["hello", "{1}"]\n\n[stages.upper]\ntool = "./upper"\nstdin = "say"\n'
+    )
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "pipe", str(spec), "world"], capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "HELLO WORLD\n"
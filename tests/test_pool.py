@@ -0,0 +1,100 @@
+"""
+Tests for warm container pools
+"""
+
+import pytest
+
+from undockit.backend import state
+from undockit.pool import choose_replica, count_sessions, pick_replica, replica_name
+
+
+def test_replica_name():
+    """First replica keeps the plain container name"""
+    assert replica_name("undockit-1000-abc", 0) == "undockit-1000-abc"
+    assert replica_name("undockit-1000-abc", 2) == "undockit-1000-abc-2"
+
+
+def test_choose_replica_idle():
+    """Lowest idle running replica wins"""
+    assert choose_replica([2, 0, 0]) == (1, False)
+
+
+def test_choose_replica_scale_up():
+    """All running replicas busy, so start the first free slot"""
+    assert choose_replica([1, None, 3, None]) == (1, True)
+
+
+def test_choose_replica_cold():
+    """Nothing running starts the first replica"""
+    assert choose_replica([None, None]) == (0, True)
+
+
+def test_choose_replica_full():
+    """Full pool shares the least loaded replica"""
+    assert choose_replica([3, 1, 2]) == (1, False)
+
+
+def test_choose_replica_single():
+    """A pool of one always uses its one replica"""
+    assert choose_replica([5]) == (0, False)
+    assert choose_replica([None]) == (0, True)
+
+
+@pytest.fixture
+def control_root(tmp_path, monkeypatch):
+    root = tmp_path / "undockit"
+    monkeypatch.setattr(state, "CONTROL_ROOT", root)
+    return root
+
+
+def add_sessions(control_root, name, count):
+    pid_dir = control_root / name / "pid"
+    pid_dir.mkdir(parents=True)
+    for pid in range(count):
+        (pid_dir / str(1000 + pid)).touch()
+
+
+def test_count_sessions(control_root):
+    """Sessions are counted from pid files"""
+    assert count_sessions("undockit-x") == 0
+    add_sessions(control_root, "undockit-x", 3)
+    assert count_sessions("undockit-x") == 3
+
+
+class FakeBackend:
+    def __init__(self, running):
+        self.running = running
+        self.checked = []
+
+    def is_running(self, container_name):
+        self.checked.append(container_name)
+        return container_name in self.running
+
+
+def test_pick_replica_routes_to_least_loaded(control_root, monkeypatch):
+    """Busy first replica sends the run to an idle second one"""
+    running = {"undockit-x", "undockit-x-1"}
+    monkeypatch.setattr(state, "is_known_running", lambda name: name in running)
+    add_sessions(control_root, "undockit-x", 2)
+
+    backend = FakeBackend(running)
+    assert pick_replica(backend, "undockit-x", 3) == ("undockit-x-1", False)
+    assert backend.checked == []
+
+
+def test_pick_replica_scales_up(control_root, monkeypatch):
+    """Busy pool with a free slot starts a new replica"""
+    monkeypatch.setattr(state, "is_known_running", lambda name: name == "undockit-x")
+    add_sessions(control_root, "undockit-x", 1)
+
+    backend = FakeBackend({"undockit-x"})
+    assert pick_replica(backend, "undockit-x", 2) == ("undockit-x-1", True)
+    assert backend.checked == ["undockit-x-1"]
+
+
+def test_pick_replica_confirms_before_start(control_root, monkeypatch):
+    """A replica running without a state record isn't restarted"""
+    monkeypatch.setattr(state, "is_known_running", lambda name: False)
+
+    backend = FakeBackend({"undockit-x"})
+    assert pick_replica(backend, "undockit-x", 2) == ("undockit-x", False)
@@ -0,0 +1,117 @@
+"""
+Tests for resource profiles
+"""
+
+import pytest
+
+from undockit.backend.podman import PodmanBackend
+from undockit.resources import (
+    api_spec,
+    format_cpulist,
+    make_labels,
+    numa_nodes,
+    parse_cpulist,
+    parse_profile,
+    place,
+    podman_flags,
+    replica_index,
+    resolve,
+)
+
+
+def test_cpulist_round_trip():
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpulist([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+    for text in ("", "3-1", "x", "-1"):
+        with pytest.raises(ValueError):
+            parse_cpulist(text)
+
+
+def test_parse_profile():
+    labels = {
+        "undockit.cpus": "1.5",
+        "undockit.cpuset": "3,0-1",
+        "undockit.memory": "8G",
+        "undockit.shm-size": "512M",
+        "undockit.timeout": "60",
+    }
+    assert parse_profile(labels) == {"cpus": 1.5, "cpuset": "0-1,3", "memory": 8 * 1024**3, "shm_size": 512 * 1024**2}
+    assert parse_profile({"undockit.cpuset": "auto"}) == {"cpuset": "auto"}
+    assert parse_profile({}) == {}
+
+
+@pytest.mark.parametrize("labels", [{"undockit.cpus": "0"}, {"undockit.cpus": "many"}, {"undockit.memory": "0"}])
+def test_parse_profile_invalid(labels):
+    with pytest.raises(ValueError):
+        parse_profile(labels)
+
+
+def test_make_labels():
+    assert make_labels({"cpus": 4, "memory": None}) == {"undockit.cpus": "4"}
+    with pytest.raises(ValueError):
+        make_labels({"gpus": "1"})
+
+
+def test_replica_index():
+    assert replica_index("undockit-1-abc", "undockit-1-abc") == 0
+    assert replica_index("undockit-1-abc-3", "undockit-1-abc") == 3
+    assert replica_index("undockit-1-abc-bench", "undockit-1-abc") == 0
+
+
+def test_place_across_nodes():
+    """Replicas alternate between nodes, taking memory from the one they run on"""
+    nodes = [(0, [0, 1, 2, 3]), (1, [4, 5, 6, 7])]
+    assert [place(nodes, index) for index in range(3)] == [([0, 1, 2, 3], 0), ([4, 5, 6, 7], 1), ([0, 1, 2, 3], 0)]
+
+
+def test_place_slices():
+    """With a CPU count, replicas sharing a node get their own cores, wrapping round"""
+    nodes = [(None, [0, 1, 2, 3, 4, 5, 6, 7])]
+    assert [place(nodes, index, cpus=3)[0] for index in range(3)] == [[0, 1, 2], [3, 4, 5], [0, 1, 2]]
+    assert place(nodes, 0, cpus=64)[0] == list(range(8))
+
+
+def test_resolve_and_flags():
+    profile = {"cpus": 2.0, "cpuset": "auto", "shm_size": 1024}
+    limits = resolve(profile, [(0, [0, 1]), (1, [2, 3])], 1)
+    assert limits == {"cpus": 2.0, "shm_size": 1024, "cpuset_cpus": "2-3", "cpuset_mems": "1"}
+    assert podman_flags(limits) == ["--cpus=2", "--cpuset-cpus=2-3", "--cpuset-mems=1", "--shm-size=1024"]
+    assert api_spec(limits) == {
+        "resource_limits": {"cpu": {"period": 100000, "quota": 200000, "cpus": "2-3", "mems": "1"}},
+        "shm_size": 1024,
+    }
+    assert resolve({"cpuset": "0-1"}, [], 5) == {"cpuset_cpus": "0-1"}
+    assert podman_flags({}) == [] and api_spec({}) == {}
+
+
+def test_numa_nodes(tmp_path, monkeypatch):
+    """Memory-only nodes and CPUs outside our affinity are left out"""
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: {0, 1, 2, 4, 5})
+    for node, cpulist in (("node0", "0-3"), ("node1", "\n"), ("node10", "4-7")):
+        (tmp_path / node).mkdir()
+        (tmp_path / node / "cpulist").write_text(cpulist)
+    assert numa_nodes(tmp_path) == [(0, [0, 1, 2]), (10, [4, 5])]
+    assert numa_nodes(tmp_path / "missing") == [(None, [0, 1, 2, 4, 5])]
+
+
+def test_start_applies_profile(fake_podman, tmp_path):
+    """Labels in the wrapper become podman run flags, different for each replica"""
+    dockerfile = tmp_path / "tool"
+    labels = make_labels({"cpus": "1", "cpuset": "auto", "shm-size": "2G"})
+    lines = [f'LABEL {key}="{value}"' for key, value in labels.items()]
+    dockerfile.write_text("\n".join(["FROM scratch", *lines, 'ENTRYPOINT ["true"]', ""]))
+    backend = PodmanBackend()
+    image_id = backend.get_image(dockerfile)
+    name = backend.name(image_id)
+    try:
+        backend.start(name, image_id)
+        backend.start(f"{name}-1", image_id)
+    finally:
+        fake_podman.cleanup()
+
+    first, second = fake_podman.calls("run")
+    assert f"--shm-size={2 * 1024**3}" in first and "--cpus=1" in first
+    cpusets = [next(arg for arg in call if arg.startswith("--cpuset-cpus=")) for call in (first, second)]
+    nodes = numa_nodes()
+    if len(nodes) > 1 or len(nodes[0][1]) > 1:
+        assert cpusets[0] != cpusets[1]
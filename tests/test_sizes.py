@@ -0,0 +1,16 @@
+"""
+Tests for size parsing
+"""
+
+import pytest
+
+from undockit.sizes import parse_size
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("512M") == 512 * 1024**2
+    assert parse_size("1.5g") == int(1.5 * 1024**3)
+    assert parse_size("2GiB") == 2 * 1024**3
+    with pytest.raises(ValueError):
+        parse_size("lots")
@@ -0,0 +1,75 @@
+"""
+Startup cost of the run path, which every shebang-launched tool pays
+"""
+
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from undockit import __version__
+
+# What a tool invocation imports before it touches podman
+RUN_PATH = "import undockit.main, undockit.client, undockit.backend"
+
+# About 40ms on a slow machine. importlib.metadata alone would add ~50ms
+IMPORT_BUDGET_MS = 100
+
+# Only needed by other subcommands, or not at all
+UNWANTED_MODULES = [
+    "importlib.metadata",
+    "zipapp",
+    "zipfile",
+    "tempfile",
+    "shutil",
+    "tarfile",
+    "email",
+    "http.client",
+    "typing",
+    "undockit.deploy",
+    "undockit.install",
+]
+
+
+def run_python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    """Run some code in a fresh interpreter that's allowed to cache bytecode"""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, env=env, check=True)
+
+
+def run_path_import_ms() -> float:
+    """Measure the cumulative import time of the run path"""
+    result = run_python(RUN_PATH, "-X", "importtime")
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if match and not match.group(2) and match.group(3).startswith("undockit"):
+            total_us += int(match.group(1))
+
+    return total_us / 1000
+
+
+def test_run_path_skips_unneeded_modules():
+    """The run path doesn't import modules that only other subcommands use"""
+    result = run_python(f"{RUN_PATH}; import sys; print('\\n'.join(sys.modules))")
+    loaded = set(result.stdout.split())
+    assert [module for module in UNWANTED_MODULES if module in loaded] == []
+
+
+def test_run_path_import_budget():
+    """The run path imports within budget"""
+    # Warm up the bytecode cache, then take the best of a few runs to dodge noise
+    run_python(RUN_PATH)
+    best = min(run_path_import_ms() for _ in range(3))
+    assert best < IMPORT_BUDGET_MS, f"run path took {best:.1f}ms to import, budget is {IMPORT_BUDGET_MS}ms"
+
+
+def test_version_matches_pyproject():
+    """The hardcoded version is the one being released"""
+    pyproject = Path(__file__).parent.parent / "pyproject.toml"
+    match = re.search(r'^version\s*=\s*"([^"]+)"', pyproject.read_text(), re.MULTILINE)
+    assert match.group(1) == __version__
@@ -0,0 +1,138 @@
+"""
+Tests for container state records
+"""
+
+import pytest
+
+from undockit.backend import state
+
+IMAGE_ID = "ab" * 32
+NAME = f"undockit-1000-{IMAGE_ID[:12]}"
+CONTAINER_ID = "cd" * 32
+
+
+@pytest.fixture
+def control_root(tmp_path, monkeypatch):
+    root = tmp_path / "undockit"
+    monkeypatch.setattr(state, "CONTROL_ROOT", root)
+    return root
+
+
+def fake_process(proc_root, pid, cgroup="0::/user.slice\n", cmdline=b"sleep\x00", status="S"):
+    """Make a /proc/<pid> entry"""
+    process = proc_root / str(pid)
+    process.mkdir(parents=True)
+    (process / "stat").write_text(f"{pid} (some proc) {status} 1 2 3")
+    (process / "cgroup").write_text(cgroup)
+    (process / "cmdline").write_bytes(cmdline)
+
+
+@pytest.fixture
+def running(tmp_path, control_root):
+    """A container whose processes and exec script all exist"""
+    proc_root = tmp_path / "proc"
+    fake_process(proc_root, 100, cgroup=f"0::/user.slice/libpod-{CONTAINER_ID}.scope/container\n")
+    fake_process(proc_root, 99, cmdline=f"/usr/bin/conmon\x00-c\x00{CONTAINER_ID}\x00".encode())
+
+    record = state.make_state(NAME, IMAGE_ID, CONTAINER_ID, 100, 99)
+    state.write_state(record)
+    (control_root / NAME / "exec").write_text("#!/bin/sh\n")
+    return record, proc_root
+
+
+def test_control_dir(control_root):
+    """Control dir is named after the container"""
+    assert state.control_dir(NAME) == control_root / NAME
+
+
+def test_write_read_state(running):
+    """State records round trip"""
+    record, _ = running
+    assert state.read_state(NAME) == record
+
+
+def test_read_state_missing(control_root):
+    """No record reads as None"""
+    assert state.read_state(NAME) is None
+
+
+def test_read_state_corrupt(control_root):
+    """A corrupt record reads as None"""
+    (control_root / NAME).mkdir(parents=True)
+    (control_root / NAME / "state.json").write_text("{")
+    assert state.read_state(NAME) is None
+
+
+def test_clear_state(running):
+    """Cleared records are gone, and clearing twice is fine"""
+    state.clear_state(NAME)
+    state.clear_state(NAME)
+    assert state.read_state(NAME) is None
+
+
+def test_is_alive(running):
+    """Live processes with matching markers are alive"""
+    record, proc_root = running
+    assert state.is_alive(record, NAME, proc_root) is True
+
+
+def test_is_alive_wrong_name(running):
+    """A record for another container isn't trusted"""
+    record, proc_root = running
+    assert state.is_alive(record, "undockit-1000-000000000000", proc_root) is False
+
+
+def test_is_alive_no_exec_script(running, control_root):
+    """Container that hasn't deployed its exec script isn't ready"""
+    record, proc_root = running
+    (control_root / NAME / "exec").unlink()
+    assert state.is_alive(record, NAME, proc_root) is False
+
+
+def test_is_alive_dead_process(running):
+    """Container whose main process has gone is dead"""
+    record, proc_root = running
+    record["pid"] = 12345
+    assert state.is_alive(record, NAME, proc_root) is False
+
+
+def test_is_alive_reused_pid(running, tmp_path):
+    """A pid reused by an unrelated process isn't the container"""
+    record, proc_root = running
+    fake_process(proc_root, 200)
+    record["pid"] = 200
+    assert state.is_alive(record, NAME, proc_root) is False
+
+
+def test_is_alive_cmdline_marker(running):
+    """Main process can be recognised by the container name in its script"""
+    record, proc_root = running
+    fake_process(proc_root, 300, cmdline=f"/bin/sh\x00-c\x00mkdir -p /tmp/undockit/{NAME}/pid".encode())
+    record["pid"] = 300
+    assert state.is_alive(record, NAME, proc_root) is True
+
+
+def test_is_alive_zombie(running):
+    """A zombie main process means the container has exited"""
+    record, proc_root = running
+    fake_process(proc_root, 400, cgroup=f"0::/libpod-{CONTAINER_ID}.scope\n", status="Z")
+    record["pid"] = 400
+    assert state.is_alive(record, NAME, proc_root) is False
+
+
+def test_is_alive_conmon_gone(running):
+    """Container is dead if its conmon has gone"""
+    record, proc_root = running
+    record["conmon_pid"] = 12345
+    assert state.is_alive(record, NAME, proc_root) is False
+
+
+def test_is_alive_garbage():
+    """Malformed records are never alive"""
+    assert state.is_alive({}, NAME) is False
+    assert state.is_alive({"name": NAME, "image_id": None}, NAME) is False
+
+
+def test_is_known_running_no_record(control_root):
+    """No record means we don't know, so not running"""
+    assert state.is_known_running(NAME) is False
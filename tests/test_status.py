@@ -0,0 +1,153 @@
+"""
+Tests for status and stop
+"""
+
+import json
+import subprocess
+import sys
+import uuid
+
+from undockit.backend.podman import parse_container_list
+from undockit.status import (
+    cgroup_path,
+    cpu_percent,
+    format_bytes,
+    format_table,
+    parse_flat_keyed,
+    read_usage,
+    seconds_left,
+    tool_containers,
+)
+
+
+def test_parse_container_list():
+    """podman ps --format json, as the CLI and API give it"""
+    entries = [
+        {
+            "Names": ["undockit-1-abc"],
+            "Id": "c1",
+            "ImageID": "sha256:abc",
+            "Pid": 42,
+            "Labels": {"undockit.timeout": "60"},
+            "StartedAt": 1700000000,
+        }
+    ]
+    assert parse_container_list(entries) == [
+        {
+            "name": "undockit-1-abc",
+            "id": "c1",
+            "image_id": "abc",
+            "pid": 42,
+            "labels": {"undockit.timeout": "60"},
+            "started": 1700000000,
+            "running": True,
+        }
+    ]
+    assert parse_container_list([{**entries[0], "State": "exited"}])[0]["running"] is False
+    assert parse_container_list(None) == []
+
+
+def test_cgroup_path():
+    """The container's own cgroup, on cgroup v2 only"""
+    scope = "/user.slice/user-1000.slice/user@1000.service/user.slice/libpod-abc.scope"
+    assert cgroup_path(f"0::{scope}/container\n") == scope
+    assert cgroup_path(f"0::{scope}\n") == scope
+    assert cgroup_path("12:memory:/docker/abc\n") is None
+
+
+def test_parse_flat_keyed():
+    assert parse_flat_keyed("anon 4096\nfile 8192\nbad line\n") == {"anon": 4096, "file": 8192}
+
+
+def test_seconds_left():
+    """Only idle containers with a known timeout are counting down"""
+    assert seconds_left(100.0, 60, 0, 130.0) == 30.0
+    assert seconds_left(100.0, 60, 0, 200.0) == 0.0
+    assert seconds_left(100.0, 60, 2, 130.0) is None
+    assert seconds_left(None, 60, 0, 130.0) is None
+    assert seconds_left(100.0, None, 0, 130.0) is None
+
+
+def test_cpu_percent():
+    assert cpu_percent(1.0, 1.5, 1.0) == 50.0
+    assert cpu_percent(None, 1.5, 1.0) is None
+
+
+def test_format_bytes():
+    assert format_bytes(None) == "-"
+    assert format_bytes(512) == "512B"
+    assert format_bytes(3 * 1024 * 1024) == "3.0M"
+    assert format_bytes(5 * 1024**4) == "5120.0G"
+
+
+def test_tool_containers():
+    """A tool's container and its replicas, not other tools with a longer name"""
+    names = ["undockit-1-abc", "undockit-1-abc-1", "undockit-1-abcdef", "undockit-1-xyz"]
+    assert tool_containers(names, "undockit-1-abc") == ["undockit-1-abc", "undockit-1-abc-1"]
+
+
+def test_read_usage(tmp_path):
+    """Memory and CPU come from the container's cgroup"""
+    (tmp_path / "proc" / "42").mkdir(parents=True)
+    (tmp_path / "proc" / "42" / "cgroup").write_text("0::/machine/libpod-abc.scope/container\n")
+    group = tmp_path / "cgroup" / "machine" / "libpod-abc.scope"
+    group.mkdir(parents=True)
+    (group / "memory.current").write_text("8192\n")
+    (group / "memory.stat").write_text("anon 4096\nfile 4096\n")
+    (group / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\n")
+
+    usage = read_usage(42, tmp_path / "cgroup", tmp_path / "proc")
+    assert usage == {"rss": 4096, "memory": 8192, "cpu_seconds": 2.5}
+    assert read_usage(43, tmp_path / "cgroup", tmp_path / "proc") == {"rss": None, "memory": None, "cpu_seconds": None}
+
+
+def test_format_table():
+    row = {
+        "name": "undockit-1-abc",
+        "tool": "jq",
+        "sessions": 0,
+        "idle_seconds": 12.0,
+        "seconds_left": 48.0,
+        "rss": 2048,
+        "cpu_seconds": 1.25,
+    }
+    assert format_table([row]).splitlines()[1].split() == ["jq", "undockit-1-abc", "0", "12s", "48s", "2.0K", "1.2s"]
+
+
+def undockit(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "undockit", *args], capture_output=True, text=True, timeout=60)
+
+
+def make_tool(directory, name):
+    path = directory / name
+    path.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["true"]\n')
+    return path
+
+
+def test_status_and_stop(fake_podman, tmp_path):
+    """Status lists every warm container in one podman call, and stop tears them down"""
+    tools = [make_tool(tmp_path, name) for name in ("one", "two", "three")]
+    for tool in tools:
+        assert undockit("run", "--timeout=120", str(tool)).returncode == 0
+
+    before = len(fake_podman.calls())
+    result = undockit("status", "--json")
+    assert result.returncode == 0, result.stderr
+    assert len(fake_podman.calls()) == before + 1
+
+    rows = json.loads(result.stdout)
+    assert [row["tool"] for row in rows] == ["one", "three", "two"]
+    assert all(row["sessions"] == 0 and row["timeout"] == 120 for row in rows)
+    assert all(0 < row["seconds_left"] <= 120 for row in rows)
+
+    result = undockit("stop", str(tools[0]), str(tools[1]))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.count("Stopped") == 2
+    assert [row["tool"] for row in json.loads(undockit("status", "--json").stdout)] == ["three"]
+
+    result = undockit("stop", str(tools[0]))
+    assert "one isn't running" in result.stdout
+
+    assert undockit("stop", "--all").returncode == 0
+    assert json.loads(undockit("status", "--json").stdout) == []
+    assert undockit("stop").returncode == 1
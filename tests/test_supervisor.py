@@ -0,0 +1,189 @@
+"""
+Tests for the container supervisor's idle shutdown, run on the host with /bin/sh
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+from undockit.backend.podman import render_startup_script
+
+# Commands the startup script needs from the image, apart from mkfifo
+COMMANDS = ["mkdir", "touch", "rm", "cat", "chmod", "mv", "stat", "date", "sleep"]
+
+
+class Supervisor:
+    """A startup script running on the host, with a log of its wakeups"""
+
+    def __init__(self, tmp_path: Path, timeout: int, fifo: bool = True, sweep: int | None = None):
+        self.name = f"undockit-test-{uuid.uuid4().hex[:12]}"
+        self.control_dir = Path("/tmp/undockit") / self.name
+        self.log = tmp_path / "wakeups.log"
+
+        env = dict(os.environ, UNDOCKIT_SUPERVISOR_LOG=str(self.log))
+        if sweep:
+            env["UNDOCKIT_SWEEP_SECONDS"] = str(sweep)
+        if not fifo:
+            # Simulate an image without mkfifo
+            bin_dir = tmp_path / "bin"
+            bin_dir.mkdir()
+            for command in COMMANDS:
+                (bin_dir / command).symlink_to(shutil.which(command))
+            env["PATH"] = str(bin_dir)
+
+        self.exec_socket = tmp_path / "exec.sock"
+        script = render_startup_script(self.name, timeout, str(self.exec_socket))
+        # Own process group, so the exec server can be cleaned up with it
+        self.process = subprocess.Popen(["/bin/sh", "-c", script], env=env, start_new_session=True)
+        self.started = time.monotonic()
+
+        # Wait for the exec script, which is written just before supervising
+        while not (self.control_dir / "exec").exists():
+            time.sleep(0.01)
+
+    @property
+    def wakeups(self) -> list[str]:
+        return self.log.read_text().splitlines() if self.log.exists() else []
+
+    def notify(self, event: str):
+        """Send an event like the exec script does"""
+        with open(self.control_dir / "ctl", "w") as ctl:
+            ctl.write(f"{event}\n")
+
+    def wait(self) -> float:
+        """Wait for the supervisor to exit, returning when it did"""
+        self.process.wait(timeout=10)
+        return time.monotonic()
+
+    def close(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def supervisors(tmp_path):
+    started = []
+
+    def start(timeout: int, fifo: bool = True, sweep: int | None = None) -> Supervisor:
+        supervisor = Supervisor(tmp_path, timeout, fifo, sweep)
+        started.append(supervisor)
+        return supervisor
+
+    yield start
+    for supervisor in started:
+        supervisor.close()
+
+
+def test_idle_exits_on_time(supervisors):
+    """An unused container stops at the timeout, waking up only once"""
+    supervisor = supervisors(timeout=1)
+    elapsed = supervisor.wait() - supervisor.started
+
+    assert supervisor.process.returncode == 0
+    assert 0.9 <= elapsed < 1.8
+    assert supervisor.wakeups == ["wake timeout"]
+
+
+def test_timer_starts_when_session_ends(supervisors):
+    """A long exec session holds the container, then the timer runs from its end"""
+    supervisor = supervisors(timeout=1)
+
+    # Pretend to be an exec session, with a live pid
+    session = subprocess.Popen(["sleep", "30"])
+    pidfile = supervisor.control_dir / "pid" / str(session.pid)
+    try:
+        pidfile.touch()
+        supervisor.notify("start")
+
+        # Longer than the timeout, but the session is live
+        time.sleep(1.5)
+        assert supervisor.process.poll() is None
+
+        pidfile.unlink()
+        supervisor.notify("end")
+        ended = time.monotonic()
+    finally:
+        session.kill()
+        session.wait()
+
+    elapsed = supervisor.wait() - ended
+    assert 0.9 <= elapsed < 1.8
+    assert supervisor.wakeups == ["wake start", "wake end", "wake timeout"]
+
+
+def test_stale_pidfile_ignored(supervisors):
+    """A pid file left by a killed session doesn't keep the container alive"""
+    supervisor = supervisors(timeout=1)
+
+    session = subprocess.Popen(["true"])
+    session.wait()
+    pidfile = supervisor.control_dir / "pid" / str(session.pid)
+    pidfile.touch()
+    supervisor.notify("start")
+
+    supervisor.wait()
+    assert supervisor.process.returncode == 0
+    assert not pidfile.exists()
+
+
+def test_killed_session_swept(supervisors):
+    """A session killed before it can say it's ended doesn't keep the container alive"""
+    supervisor = supervisors(timeout=1, sweep=1)
+
+    session = subprocess.Popen(["sleep", "30"])
+    (supervisor.control_dir / "pid" / str(session.pid)).touch()
+    supervisor.notify("start")
+    time.sleep(0.5)
+    session.kill()
+    session.wait()
+    killed = time.monotonic()
+
+    elapsed = supervisor.wait() - killed
+    assert supervisor.process.returncode == 0
+    assert elapsed < 2.8
+    assert supervisor.wakeups[0] == "wake start"
+    assert supervisor.wakeups[-2:] == ["wake sweep", "wake timeout"]
+
+
+def test_poll_fallback_without_mkfifo(supervisors):
+    """Images without mkfifo poll, but still stop close to the timeout"""
+    supervisor = supervisors(timeout=1, fifo=False)
+    assert not (supervisor.control_dir / "ctl").exists()
+
+    elapsed = supervisor.wait() - supervisor.started
+    assert supervisor.process.returncode == 0
+    # stat only has whole seconds, so allow for rounding
+    assert elapsed < 2.5
+    assert len(supervisor.wakeups) <= 2
+
+
+def test_exec_server_lives_with_supervisor(supervisors):
+    """The exec server is started with the container and stopped when it idles out"""
+    supervisor = supervisors(timeout=1)
+    sock = supervisor.exec_socket
+    deadline = time.monotonic() + 5
+    while not sock.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sock.exists()
+
+    supervisor.wait()
+    time.sleep(0.1)
+    left = subprocess.run(["ps", "-o", "stat=", "-g", str(supervisor.process.pid)], capture_output=True, text=True)
+    assert [status for status in left.stdout.split() if not status.startswith("Z")] == []
+
+
+def test_no_exec_server_without_python(supervisors):
+    """Images without python3 go without an exec server"""
+    supervisor = supervisors(timeout=1, fifo=False)
+    supervisor.wait()
+    assert not supervisor.exec_socket.exists()
@@ -0,0 +1,189 @@
+"""
+Tests for installing toolsets from a manifest
+"""
+
+import json
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from undockit.backend.podman import PodmanBackend
+from undockit.toolset import install_toolset, locked_reference, make_lock, parse_manifest
+
+DIGEST_A = "sha256:" + "a" * 64
+DIGEST_B = "sha256:" + "b" * 64
+
+
+def test_parse_manifest():
+    """Tools by image string or table, with defaults filled in"""
+    data = {
+        "defaults": {"timeout": 900},
+        "tools": {"jq": "jq:1.7", "whisper": {"image": "org/whisper", "replicas": 2, "timeout": 60}},
+    }
+    assert parse_manifest(data, timeout=600, replicas=1) == [
+        {
+            "name": "jq",
+            "image": "jq:1.7",
+            "timeout": 900,
+            "replicas": 1,
+            "host_paths": False,
+            "path_options": [],
+            "resources": {},
+        },
+        {
+            "name": "whisper",
+            "image": "org/whisper",
+            "timeout": 60,
+            "replicas": 2,
+            "host_paths": False,
+            "path_options": [],
+            "resources": {},
+        },
+    ]
+
+
+def test_parse_manifest_host_paths():
+    data = {"tools": {"yolo": {"image": "yolo", "host_paths": True, "path_options": ["source"]}}}
+    [tool] = parse_manifest(data)
+    assert tool["host_paths"] and tool["path_options"] == ["source"]
+
+
+def test_parse_manifest_resources():
+    """Resource limits come from the tool or the defaults, under shm_size rather than shm-size"""
+    data = {"defaults": {"shm_size": "1G"}, "tools": {"whisper": {"image": "whisper", "cpus": 4, "cpuset": "auto"}}}
+    [tool] = parse_manifest(data)
+    assert tool["resources"] == {"cpus": 4, "cpuset": "auto", "shm-size": "1G"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"tools": {}},
+        {"tools": {"jq": {}}},
+        {"tools": {"jq": 5}},
+        {"tools": {"../jq": "jq"}},
+        {"tools": {"jq": {"image": "jq", "timeout": "soon"}}},
+        {"tools": {"jq": {"image": "jq", "replicas": 0}}},
+        {"tools": {"jq": {"image": "jq", "host_paths": "yes"}}},
+        {"tools": {"jq": {"image": "jq", "path_options": "source"}}},
+        {"tools": {"jq": {"image": "jq", "memory": "lots"}}},
+        {"tools": {"jq": {"image": "jq", "cpus": [1]}}},
+    ],
+)
+def test_parse_manifest_invalid(data):
+    """Malformed manifests are refused before anything's installed"""
+    with pytest.raises(ValueError):
+        parse_manifest(data)
+
+
+def test_locked_reference():
+    """A lock entry only counts for the image it was made from"""
+    lock = {"tools": {"jq": {"image": "jq:1.7", "pinned": f"jq@{DIGEST_A}"}}}
+    assert locked_reference(lock, {"name": "jq", "image": "jq:1.7"}) == f"jq@{DIGEST_A}"
+    assert locked_reference(lock, {"name": "jq", "image": "jq:1.8"}) is None
+    assert locked_reference({}, {"name": "jq", "image": "jq:1.7"}) is None
+
+
+def test_make_lock_keeps_failed():
+    """A failed tool keeps its old pin rather than losing it"""
+    old = {"tools": {"jq": {"image": "jq", "pinned": "jq@old"}}}
+    results = [{"name": "jq", "image": "jq", "error": "offline"}, {"name": "yq", "image": "yq", "pinned": "yq@new"}]
+    assert make_lock(results, old)["tools"] == {
+        "jq": {"image": "jq", "pinned": "jq@old"},
+        "yq": {"image": "yq", "pinned": "yq@new"},
+    }
+
+
+def install(manifest, *args):
+    return subprocess.run(
+        [sys.executable, "-m", "undockit", "install", "--no-undockit", "-f", str(manifest), *args],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+@pytest.fixture
+def toolset(fake_podman, tmp_path):
+    registry = tmp_path / "podman" / "registry.json"
+    registry.parent.mkdir(exist_ok=True)
+    registry.write_text(json.dumps({"jq:1.7": DIGEST_A, "yq:latest": DIGEST_A}))
+
+    manifest = tmp_path / "toolset.toml"
+    manifest.write_text('[defaults]\ntimeout = 60\n\n[tools]\njq = "jq:1.7"\nyq = { image = "yq", replicas = 2 }\n')
+    return fake_podman, registry, manifest, tmp_path / "prefix"
+
+
+def test_install_toolset(toolset):
+    """Every tool is pulled up front, and its wrapper pinned to the digest"""
+    fake_podman, _, manifest, prefix = toolset
+
+    result = install(manifest, "--prefix", str(prefix))
+    assert result.returncode == 0, result.stderr
+    assert len(fake_podman.calls("pull")) == 2
+
+    jq = (prefix / "bin" / "jq").read_text()
+    assert jq.startswith("#!/usr/bin/env -S undockit run --timeout=60\n")
+    assert f"FROM registry.test/jq@{DIGEST_A}\n" in jq
+    assert "--replicas=2" in (prefix / "bin" / "yq").read_text()
+
+    lock = json.loads((manifest.parent / "toolset.lock").read_text())
+    assert lock["tools"]["yq"] == {"image": "yq", "pinned": f"registry.test/yq@{DIGEST_A}"}
+
+
+def test_install_toolset_locked(toolset):
+    """Later installs stick to the locked digest, until asked to update"""
+    fake_podman, registry, manifest, prefix = toolset
+    assert install(manifest, "--prefix", str(prefix)).returncode == 0
+
+    # The tag moves on, but the lock holds and the image is already here
+    registry.write_text(json.dumps({"jq:1.7": DIGEST_B, "yq:latest": DIGEST_B}))
+    result = install(manifest, "--prefix", str(prefix))
+    assert result.returncode == 0, result.stderr
+    assert "(locked)" in result.stdout
+    assert len(fake_podman.calls("pull")) == 2
+    assert DIGEST_A in (prefix / "bin" / "jq").read_text()
+
+    result = install(manifest, "--prefix", str(prefix), "--update")
+    assert result.returncode == 0, result.stderr
+    assert len(fake_podman.calls("pull")) == 4
+    assert DIGEST_B in (prefix / "bin" / "jq").read_text()
+
+
+def test_install_toolset_reports_from_caller(toolset):
+    """Results are reported from the calling thread, so output can't interleave"""
+    _, _, manifest, prefix = toolset
+    reported = []
+    results = install_toolset(
+        PodmanBackend(), manifest, prefix=prefix, on_result=lambda result: reported.append(threading.current_thread())
+    )
+    assert [result["name"] for result in results] == ["jq", "yq"]
+    assert reported == [threading.main_thread()] * 2
+
+
+def test_install_toolset_failure(toolset):
+    """A tool that can't be pulled fails alone"""
+    fake_podman, registry, manifest, prefix = toolset
+    registry.write_text(json.dumps({"jq:1.7": DIGEST_A}))
+
+    result = install(manifest, "--prefix", str(prefix))
+    assert result.returncode == 1
+    assert "yq: Pull of yq failed" in result.stderr
+    assert (prefix / "bin" / "jq").exists()
+    assert not (prefix / "bin" / "yq").exists()
+
+
+def test_install_toolset_unwritable(toolset):
+    """A wrapper that can't be written fails that tool alone, and the lock is still saved"""
+    _, _, manifest, prefix = toolset
+    (prefix / "bin" / "yq").mkdir(parents=True)
+
+    result = install(manifest, "--prefix", str(prefix))
+    assert result.returncode == 1
+    assert "Error: yq: " in result.stderr
+    assert (prefix / "bin" / "jq").exists()
+    lock = json.loads((manifest.parent / "toolset.lock").read_text())
+    assert list(lock["tools"]) == ["jq"]
@@ -0,0 +1,124 @@
+"""
+Tests for tracing
+"""
+
+import json
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+from undockit import trace
+
+
+def test_describe():
+    """Simple values are kept, long ones cut, objects left out"""
+    assert trace.describe(["podman", Path("/x"), 3]) == ["podman", "/x", 3]
+    assert trace.describe("x" * 300) == "x" * 200 + "..."
+    assert trace.describe(object()) is None
+    assert trace.describe_args(("name", object(), 5)) == ["name", 5]
+
+
+def test_pop_trace_arg():
+    """Only a leading --trace is taken"""
+    assert trace.pop_trace_arg(["--trace=t.json", "run", "x"]) == ("t.json", ["run", "x"])
+    assert trace.pop_trace_arg(["--trace", "t.json", "run"]) == ("t.json", ["run"])
+    assert trace.pop_trace_arg(["run", "--trace=t.json"]) == (None, ["run", "--trace=t.json"])
+    assert trace.pop_trace_arg([]) == (None, [])
+
+
+def test_trace_path():
+    assert trace.trace_path("/tmp/run-{pid}.json", 42) == "/tmp/run-42.json"
+
+
+def test_parse_start_ticks():
+    """Command names with spaces and parens don't throw the fields off"""
+    stat = "123 (my (odd) cmd) S 1 123 123 0 -1 4194560 100 0 0 0 1 2 0 0 20 0 1 0 98765 1000 200"
+    assert trace.parse_start_ticks(stat) == 98765
+
+
+def test_chrome_events():
+    """Spans become complete events in microseconds"""
+    spans = [{"name": "build", "start": 1.0, "end": 1.5, "tid": 7, "args": {"args": ["x"]}}]
+    events = trace.chrome_events(spans, 42)["traceEvents"]
+    assert events[1] == {
+        "name": "build",
+        "ph": "X",
+        "ts": 1000000.0,
+        "dur": 500000.0,
+        "pid": 42,
+        "tid": 7,
+        "args": {"args": ["x"]},
+    }
+
+
+def test_off_costs_nothing():
+    """With tracing off, spans are a shared no-op and nothing is wrapped"""
+
+    class Thing:
+        def work(self):
+            return 1
+
+    work = Thing.work
+    trace.instrument(Thing, "work")
+    assert Thing.work is work
+    assert trace.span("anything") is trace.NO_SPAN
+    assert not trace.enabled()
+
+
+@pytest.fixture
+def dockerfile(tmp_path):
+    path = tmp_path / "tool"
+    path.write_text(f'FROM scratch\nLABEL test="{uuid.uuid4()}"\nENTRYPOINT ["echo"]\n')
+    return path
+
+
+def test_trace_run(fake_podman, dockerfile, tmp_path, monkeypatch):
+    """A run's trace covers startup, backend calls and podman subprocesses"""
+    path = tmp_path / "trace-{pid}.json"
+    monkeypatch.setenv("UNDOCKIT_TRACE", str(path))
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "run", str(dockerfile), "hi"], capture_output=True, text=True, timeout=60
+    )
+    assert result.stdout == "hi\n", result.stderr
+
+    [trace_file] = tmp_path.glob("trace-*.json")
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    names = {event["name"] for event in events}
+    assert {"startup", "main", "Backend.get_image", "PodmanBackend.build", "Backend.ensure_running"} <= names
+    assert {"PodmanBackend.exec", "FileLock.acquire"} <= names
+
+    builds = [
+        event["args"] for event in events if event["name"] == "subprocess" and event["args"]["argv"][1] == "build"
+    ]
+    assert builds[0]["argv"][0] == "podman" and builds[0]["returncode"] == 0
+
+    # Including the cold start's overlapped checks, which don't go through subprocess.run
+    commands = [event["args"]["argv"][1] for event in events if event["name"] == "subprocess"]
+    assert {"ps", "image", "run", "exec"} <= set(commands)
+    assert "aio.ensure_running" in names
+
+    # Everything nests inside the main span
+    [main] = [event for event in events if event["name"] == "main"]
+    for event in events:
+        if event["name"] not in ("main", "startup", "process_name"):
+            assert main["ts"] <= event["ts"] and event["ts"] + event["dur"] <= main["ts"] + main["dur"] + 1
+
+
+def test_trace_jsonl(fake_podman, dockerfile, tmp_path):
+    """--trace with .jsonl appends a line per span, so runs can share a file"""
+    path = tmp_path / "trace.jsonl"
+    for _ in range(2):
+        result = subprocess.run(
+            [sys.executable, "-m", "undockit", f"--trace={path}", "run", str(dockerfile)],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len({span["pid"] for span in spans}) == 2
+    assert all(span["end"] >= span["start"] for span in spans)
@@ -0,0 +1,130 @@
+"""
+Tests for prewarming installed tools
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+from undockit.backend.podman import PodmanBackend
+from undockit.install import make_dockerfile
+from undockit.warm import find_tools, format_report, parse_shebang, warm as warm_tools
+
+
+def test_parse_shebang_installed():
+    """The shebang install writes"""
+    head = make_dockerfile("alpine", timeout=60, replicas=3).encode()
+    options = parse_shebang(head, Path("/bin/tool"))
+    assert (options["timeout"], options["replicas"], options["dockerfile"]) == (60, 3, "/bin/tool")
+
+
+def test_parse_shebang_direct():
+    """undockit run as the interpreter, without env"""
+    options = parse_shebang(b"#!/home/me/.local/bin/undockit run\nFROM alpine\n", Path("/bin/tool"))
+    assert options["timeout"] == 600
+
+
+def test_parse_shebang_others():
+    """Scripts and plain dockerfiles aren't tools"""
+    path = Path("/bin/tool")
+    assert parse_shebang(b"#!/bin/sh\necho undockit run\n", path) is None
+    assert parse_shebang(b"FROM alpine\n", path) is None
+    assert parse_shebang(b"#!/usr/bin/env undockit build\n", path) is None
+    assert parse_shebang(b"\x7fELF\x02\x01", path) is None
+
+
+def test_find_tools(tmp_path):
+    """Only undockit tools are found, in name order"""
+    (tmp_path / "b").write_text(make_dockerfile("alpine"))
+    (tmp_path / "a").write_text(make_dockerfile("debian"))
+    (tmp_path / "script").write_text("#!/bin/sh\n")
+    (tmp_path / "dir").mkdir()
+    assert [path.name for path in find_tools(tmp_path)] == ["a", "b"]
+    assert find_tools(tmp_path / "missing") == []
+
+
+def test_format_report():
+    """One row per tool"""
+    report = format_report([{"tool": "jq", "build": 1.0, "start": 0.25, "total": 1.25, "status": "started"}])
+    assert report.splitlines()[1].split() == ["jq", "1.00s", "0.25s", "1.25s", "started"]
+
+
+def make_tool(bin_dir: Path, name: str) -> Path:
+    path = bin_dir / name
+    path.write_text(f'{make_dockerfile("scratch", timeout=30)}LABEL test="{uuid.uuid4()}"\n')
+    path.chmod(0o755)
+    return path
+
+
+def test_warm(fake_podman, tmp_path):
+    """Every tool in the bin dir is built and started once, and ready to use"""
+    prefix = tmp_path / "prefix"
+    bin_dir = prefix / "bin"
+    bin_dir.mkdir(parents=True)
+    tools = [make_tool(bin_dir, name) for name in ("one", "two", "three")]
+
+    def warm():
+        return subprocess.run(
+            [sys.executable, "-m", "undockit", "warm", "--prefix", str(prefix), "-j", "3"],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+    result = warm()
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.count("started") == 3
+    assert len(fake_podman.calls("build")) == 3
+    assert len(fake_podman.calls("run")) == 3
+
+    # All warm already, so nothing more to do
+    result = warm()
+    assert result.stdout.count("already warm") == 3
+    assert len(fake_podman.calls("run")) == 3
+
+    # And a run only has to exec
+    run = subprocess.run(
+        [sys.executable, "-m", "undockit", "run", str(tools[0]), "true"], capture_output=True, timeout=60
+    )
+    assert run.returncode == 0, run.stderr
+    assert len(fake_podman.calls("run")) == 3
+
+
+def test_warm_reports_from_caller(fake_podman, tmp_path):
+    """Results are reported from the calling thread, so output can't interleave"""
+    paths = [make_tool(tmp_path, name) for name in ("one", "two")]
+    reported = []
+    results = warm_tools(
+        PodmanBackend(), paths, jobs=2, on_result=lambda result: reported.append(threading.current_thread())
+    )
+    assert [result["status"] for result in results] == ["started", "started"]
+    assert reported == [threading.main_thread()] * 2
+
+
+def test_warm_named(fake_podman, tmp_path, monkeypatch):
+    """Tools can be named by path or looked up on PATH"""
+    tool = make_tool(tmp_path, "tool")
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "warm", "--keep", "5", "tool", "missing"],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 1
+    assert "missing not found" in result.stderr
+
+    result = subprocess.run(
+        [sys.executable, "-m", "undockit", "warm", "tool", str(tmp_path / "plain")],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 1
+    assert "started" in result.stdout
+    assert "not an undockit tool" in result.stdout
+    assert tool.exists()